@@ -1,15 +1,20 @@
 #!/usr/bin/env python
 
-from pypes.util.async import AsyncContextManager, sleep
-from pypes.globals.async import get_async_manager
+from types import GeneratorType
+
+from pypes.util.async import AsyncContextManager, sleep, timestamp
+from pypes.globals.async import get_async_manager, DEFAULT_BATCH_SIZE, DEFAULT_BATCH_TIMEOUT, DEFAULT_YIELD_BUDGET, DEFAULT_YIELD_INTERVAL, DEFAULT_SEND_TIMEOUT, DEFAULT_OFFLOAD_SIZE
 from pypes.event import Event, BaseEvent
 from pypes.metas.actor import ActorMeta
 from pypes.util import ignored, fixed_returns
-from pypes.util.queue import QueuePool, Queue
+from pypes.util.queue import QueuePool, Queue, RingQueue
+from gevent.queue import Channel
 from pypes.util.logger import Logger
+from pypes.globals.logger import DEFAULT_LOG_SAMPLE_INTERVAL
+from pypes.util.metrics import ActorMetrics
+from pypes.util.offload import create_offloader
 from pypes.util.errors import (QueueConnected, InvalidActorOutput, QueueEmpty, InvalidEventConversion, InvalidActorInput, QueueFull, PypesException)
-import time
-from pypes.globals.event import get_event_manager
+from pypes.globals.event import get_event_manager, get_id_generator
 
 __all__ = [
     "Actor"
@@ -24,17 +29,46 @@ class Actor(AsyncContextManager):
 
     REQUIRED_EVENT_ATTRIBUTES = None
 
+    #stateless actors that may be run inline by the actor feeding them (see Director)
+    FUSABLE = False
+
     def __init__(self,
             name,
             size=0,
             convert_output=False,
+            batch_size=DEFAULT_BATCH_SIZE,
+            batch_timeout=DEFAULT_BATCH_TIMEOUT,
+            concurrency=None,
+            queue_class=None,
+            yield_budget=DEFAULT_YIELD_BUDGET,
+            yield_interval=DEFAULT_YIELD_INTERVAL,
+            send_timeout=DEFAULT_SEND_TIMEOUT,
+            offload=None,
+            offload_size=DEFAULT_OFFLOAD_SIZE,
+            log_level=None,
             *args,
             **kwargs):
         self.name = name
-        self.__pool = QueuePool(size)
-        self.__logger = Logger(name, self.pool.logs)
+        self.__pool = QueuePool(size, queue_class=queue_class)
+        self.__logger = Logger(name, self.pool.logs, level=log_level)
+        self.__metrics = ActorMetrics(pool=self.pool)
         self.convert_output = convert_output
+        self.batch_size = batch_size
+        self.batch_timeout = batch_timeout
+        self.yield_budget = yield_budget
+        self.yield_interval = yield_interval
+        self.send_timeout = send_timeout
+        self.__concurrency = concurrency
+        self.__work = None
+        self.__fused = {}
+        self.__offloader = create_offloader(mode=offload, size=offload_size)
         super(Actor, self).__init__(self, *args, **kwargs)
+        if not concurrency is None:
+            if concurrency < 1:
+                raise ValueError("Actor concurrency must be a positive integer")
+            self.__work = Channel()
+            for _ in xrange(concurrency):
+                self.spawn_thread(run=self.__worker)
 
     @property
     def pool(self):
@@ -44,14 +78,36 @@ class Actor(AsyncContextManager):
     def logger(self):
         return self.__logger
 
+    @property
+    def metrics(self):
+        return self.__metrics
+
     @property
     def size(self):
         return self.__pool.size
 
-    def __connect_queue(self, source_queue_name="outbox", destination=None, destination_queue_name="inbox", pool_scope=None, check_existing=True):
+    @property
+    def concurrency(self):
+        return self.__concurrency
+
+    @property
+    def offloader(self):
+        return self.__offloader
+
+    def offload(self, func, *args, **kwargs):
+        '''Runs <func> through this actor's offloader (see the 'offload' init option) and returns its result.
+        Only the calling greenlet waits on offloaded work'''
+        return self.__offloader.run(func, *args, **kwargs)
+
+    @property
+    def batched(self):
+        return hasattr(self, "consume_batch")
+
+    def __connect_queue(self, source_queue_name="outbox", destination=None, destination_queue_name="inbox", pool_scope=None, check_existing=True, queue_class=None, queue_kwargs=None):
         """Connects the <source_queue_name> queue to the <destination> queue.
         If the destination queue already exists, the source queue is changed to be a reference to that queue, as Many to One connections
-        are supported, but One to Many is not"""
+        are supported, but One to Many is not.
+        A new queue is an instance of <queue_class> (built with <queue_kwargs>) when given, otherwise of the pool's queue class"""
 
         source_queue = pool_scope.get(source_queue_name, None)
         destination_queue = destination.pool.inbound.get(destination_queue_name, None)
@@ -64,7 +120,10 @@ class Actor(AsyncContextManager):
 
         if source_queue is None:
             if destination_queue is None:
-                source_queue = pool_scope.add(name=source_queue_name)
+                queue = None
+                if not queue_class is None:
+                    queue = queue_class(source_queue_name, maxsize=(None if self.size <= 0 else self.size), **(queue_kwargs or {}))
+                source_queue = pool_scope.add(name=source_queue_name, queue=queue)
                 destination.__register_consumer(queue_name=destination_queue_name, queue=source_queue)
             elif destination_queue:
                 pool_scope.add(name=source_queue_name, queue=destination_queue)
@@ -83,26 +142,42 @@ class Actor(AsyncContextManager):
         self.spawn_thread(run=self.__consumer, origin_queue=queue)
 
     def __loop_send(self, event, destination_queues):
-        event_func = lambda event: event
+        with ignored(AttributeError):
+            destination_queues = destination_queues.values()
+        events = [event]
         if len(destination_queues) > 1:
             event.splits.append(self.__generate_split_id(event=event))
-            event_func = lambda event: event.clone()
-        
-        with ignored(AttributeError):
-            destination_queues = destination_queues.itervalues()
-        for queue in destination_queues:
-            queue.put(element=event_func(event))
+            events = event.fork(count=len(destination_queues))
+
+        for queue, event in zip(destination_queues, events):
+            destination = self.__fused.get(queue, None)
+            if destination is None:
+                queue.put(element=event, block=True, timeout=self.send_timeout)
+            else:
+                destination.__do_consume(event=event, origin_queue=queue)
+
+    #intended to be used by Director
+    def _fuse(self, queue, destination):
+        """Events sent to <queue> are consumed by <destination> directly in the sending greenlet instead of being queued"""
+        self.__fused[queue] = destination
+        self.logger.info("Fused queue '{queue_name}' with '{destination_name}'".format(queue_name=queue.name, destination_name=destination.name))
 
     def __generate_split_id(self, event):
-        raw = hash("%s%s%s" % (event.event_id, self.name, str(time.time())))
-        return hash(raw)
+        return get_id_generator().next()
 
     def __consumer(self, origin_queue, timeout=10, *args, **kwargs):
-        #run loop
+        #run loop: only blocks while the queue is empty, otherwise yields to the hub once the budget is spent
+        consumed, started = 0, timestamp()
         while self.is_running():
             origin_queue.wait_until_content()
-            self.__try_spawn_consume(origin_queue=origin_queue, timeout=timeout)
-            sleep()
+            if self.batched:
+                self.__try_spawn_consume_batch(origin_queue=origin_queue)
+            else:
+                self.__try_spawn_consume(origin_queue=origin_queue, timeout=timeout)
+            consumed += 1
+            if consumed >= self.yield_budget or timestamp() - started >= self.yield_interval:
+                sleep(0)
+                consumed, started = 0, timestamp()
         sleep()
 
     def __try_spawn_consume(self, origin_queue, timeout=None):
@@ -111,15 +186,36 @@ class Actor(AsyncContextManager):
         except QueueEmpty:
             pass
         else:
-            self.spawn_thread(run=self.__do_consume, event=event, origin_queue=origin_queue, graceful_restart=False, irregular_restart=False)
+            self.__dispatch(run=self.__do_consume, event=event, origin_queue=origin_queue)
+
+    def __try_spawn_consume_batch(self, origin_queue):
+        events = origin_queue.get_batch(max_size=self.batch_size, timeout=self.batch_timeout)
+        if len(events) > 0:
+            self.__dispatch(run=self.__do_consume_batch, events=events, origin_queue=origin_queue)
+
+    def __dispatch(self, run, **kwargs):
+        """Runs <run> in a new greenlet or, if a concurrency is defined, hands it to the next free worker.
+        Handing off blocks until a worker is free, so the calling consumer stops draining its inbound queue"""
+        if self.__work is None:
+            self.spawn_thread(run=run, graceful_restart=False, irregular_restart=False, **kwargs)
+        else:
+            self.__work.put((run, kwargs))
+
+    def __worker(self):
+        while self.is_running():
+            run, kwargs = self.__work.get()
+            run(**kwargs)
 
     def __consume_pre_processing(self, event, origin_queue):
         try:
 
-            if not get_event_manager().is_instance(event=event, convert_to=self.input):
-                new_event = get_event_manager().convert(event=event, convert_to=self.input)
-                self.logger.warning("Incoming event was of type '{_type}' when type {input} was expected. Converted to {converted}".format(
-                    _type=type(event), input=self.input, converted=type(new_event)), event=event)
+            plan = get_event_manager().get_conversion_plan(source=event.__class__, target=self.input)
+            if not plan.compatible:
+                new_event = plan.convert(event=event)
+                self.__metrics.converted += 1
+                #converted on every event of a misconfigured flow, the metric counts every conversion
+                self.logger.warning("Incoming event was of type '{_type}' when type {input} was expected. Converted to {converted}",
+                    event=event, sample_interval=DEFAULT_LOG_SAMPLE_INTERVAL, _type=type(event), input=self.input, converted=type(new_event))
                 event = new_event
         except InvalidEventConversion as err:
             self.logger.error("Event was of type '{_type}', expected '{input}'".format(_type=type(event), input=self.input))
@@ -137,14 +233,16 @@ class Actor(AsyncContextManager):
 
     def __consume_post_processing(self, event, destination_queues):
         event.post_consume_hooks(actor_name=self.name)
-        if not get_event_manager().is_instance(event=event, convert_to=self.output):
+        plan = get_event_manager().get_conversion_plan(source=event.__class__, target=self.output)
+        if not plan.compatible:
             raise_error = True
             if self.convert_output:
                 raise_error = False
                 try:
-                    new_event = get_event_manager().convert(event=event, convert_to=self.output)
-                    self.logger.warning("Outgoing event was of type '{_type}' when type {output} was expected. Converted to {converted}".format(
-                        _type=type(event), output=self.output, converted=type(new_event)), event=event)
+                    new_event = plan.convert(event=event)
+                    self.__metrics.converted += 1
+                    self.logger.warning("Outgoing event was of type '{_type}' when type {output} was expected. Converted to {converted}",
+                        event=event, sample_interval=DEFAULT_LOG_SAMPLE_INTERVAL, _type=type(event), output=self.output, converted=type(new_event))
                     event = new_event
                 except InvalidEventConversion:
                     raise_error = True
@@ -154,6 +252,11 @@ class Actor(AsyncContextManager):
 
     def __consume_wrapper(self, event, origin_queue):
         value = self.consume(event=event, origin_queue=origin_queue)
+        if isinstance(value, GeneratorType):
+            return value, None
+        return self.__format_returns(value=value)
+
+    def __format_returns(self, value):
         event, queues = fixed_returns(actual_return=value, num_returns=2)
         return self.__format_event(event=event), self.__format_queues(queues=queues)
 
@@ -166,11 +269,11 @@ class Actor(AsyncContextManager):
     def __format_queues(self, queues):
         queues = queues.values() if isinstance(queues, dict) else queues
         queues = list(queues) if isinstance(queues, tuple) else queues
-        queues = [queues] if isinstance(queues, Queue) else queues
+        queues = [queues] if isinstance(queues, (Queue, RingQueue)) else queues
         try:
             if isinstance(queues, list):
                 for queue in queues:
-                    if not isinstance(queue, Queue):
+                    if not isinstance(queue, (Queue, RingQueue)):
                         raise TypeError()
             elif not queues is None:
                 raise TypeError()
@@ -180,26 +283,116 @@ class Actor(AsyncContextManager):
         return queues
 
     def __do_consume(self, event, origin_queue):
+        received = event
+        self.__metrics.in_flight += 1
         try:
             event = self.__consume_pre_processing(event=event, origin_queue=origin_queue)
-            event, destination_queues = self.__consume_wrapper(event=event, origin_queue=origin_queue)
-            event = self.__consume_post_processing(event=event, destination_queues=destination_queues)
-            if not event is None:
+            started = timestamp()
+            result, destination_queues = self.__consume_wrapper(event=event, origin_queue=origin_queue)
+            if isinstance(result, GeneratorType):
+                #yielded events are sent as they are generated, so latency covers the whole generator
+                self.__send_generated(generated=result)
+                result = None
+            self.__metrics.latency.record(timestamp() - started)
+            self.__metrics.consumed += 1
+            if not result is None:
+                event = self.__consume_post_processing(event=result, destination_queues=destination_queues)
                 self.__send_event(event=event, destination_queues=destination_queues)
         except QueueFull as err:
-            origin_queue.wait_until_free()
-            origin_queue.put(element=event)
+            self.__process_queue_full(event=event, error=err)
         except Exception as err:
             event.error = err
             self.__send_error(event=event)
+        finally:
+            self.__metrics.in_flight -= 1
+        #not reached if the greenlet was killed mid-consume, so durable queues replay the event
+        origin_queue.ack(received)
+
+    def __do_consume_batch(self, events, origin_queue):
+        self.__metrics.in_flight += 1
+        try:
+            self.__consume_batch(events=events, origin_queue=origin_queue)
+        finally:
+            self.__metrics.in_flight -= 1
+        for event in events:
+            origin_queue.ack(event)
+
+    def __consume_batch(self, events, origin_queue):
+        accepted = []
+        for event in events:
+            try:
+                accepted.append(self.__consume_pre_processing(event=event, origin_queue=origin_queue))
+            except Exception as err:
+                event.error = err
+                self.__send_error(event=event)
+        if len(accepted) == 0:
+            return
+
+        try:
+            started = timestamp()
+            value = self.consume_batch(events=accepted, origin_queue=origin_queue)
+            self.__metrics.latency.record(timestamp() - started)
+            self.__metrics.consumed += len(accepted)
+            results, destination_queues = fixed_returns(actual_return=value, num_returns=2)
+            destination_queues = self.__format_queues(queues=destination_queues)
+        except Exception as err:
+            for event in accepted:
+                event.error = err
+                self.__send_error(event=event)
+            return
+
+        for event in (results or []):
+            try:
+                event = self.__format_event(event=event)
+                event = self.__consume_post_processing(event=event, destination_queues=destination_queues)
+                if not event is None:
+                    self.__send_event(event=event, destination_queues=destination_queues)
+            except QueueFull as err:
+                self.__process_queue_full(event=event, error=err)
+            except Exception as err:
+                event.error = err
+                self.__send_error(event=event)
+
+    def __send_generated(self, generated):
+        """Sends each event yielded by <generated> as soon as it is yielded, so that consume can emit events lazily.
+        Items are returned the way consume returns them: an event or an (event, destination_queues) tuple. An error raised
+        while processing a single yielded event is sent on with that event, an error raised by the generator ends it"""
+        for index, value in enumerate(generated, 1):
+            event, destination_queues = self.__format_returns(value=value)
+            if not event is None:
+                try:
+                    event = self.__consume_post_processing(event=event, destination_queues=destination_queues)
+                    self.__send_event(event=event, destination_queues=destination_queues)
+                except QueueFull as err:
+                    self.__process_queue_full(event=event, error=err)
+                except Exception as err:
+                    event.error = err
+                    self.__send_error(event=event)
+            if index % self.yield_budget == 0:
+                sleep(0)
+
+    def __process_queue_full(self, event, error):
+        self.logger.error("Queue '{queue_name}' remained full for {timeout} seconds".format(queue_name=error.queue.name, timeout=self.send_timeout), event=event)
+        event.error = error
+        self.__send_error(event=event)
 
     def __send_event(self, event, destination_queues=None):
         destination_queues = self.pool.outbound if destination_queues is None else destination_queues
+        self.__metrics.emitted += 1
         self.__loop_send(event=event, destination_queues=destination_queues)
 
     def __send_error(self, event):
+        self.__metrics.errored += 1
         self.__loop_send(event=event, destination_queues=self.pool.error)
 
+    def send_event(self, event, destination_queues=None):
+        '''Sends <event> from outside of consume, ie: from a greenlet spawned by this actor'''
+        self.__send_event(event=event, destination_queues=destination_queues)
+
+    def send_error(self, event):
+        '''Sends <event> to the error queues from outside of consume'''
+        self.__send_error(event=event)
+
     def create_event(self, *args, **kwargs):
         try:
             return self.output(**kwargs)
@@ -226,4 +419,8 @@ class Actor(AsyncContextManager):
         if hasattr(self, "post_hook"):
             self.logger.debug("Executing post_hook()")
             self.post_hook()
-        super(Actor, self).stop()
\ No newline at end of file
+        self.__offloader.close()
+        super(Actor, self).stop()
+        #nothing consumes the inbound queues anymore, so spill files are deleted and pending acks committed
+        for queue in self.pool.inbound.values():
+            queue.close()
\ No newline at end of file
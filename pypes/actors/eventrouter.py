@@ -267,6 +267,9 @@ class EventFilter(object):
                     current_step = current_step[scope_step]
                 elif isinstance(current_step, object):
                     # This is confusing, as everything is an object, so this is always True. Leaving in for now.
+                    if scope_step == "data" and hasattr(current_step, "data_view"):
+                        # filters only read the data, so it is not copied away from the events it was forked with
+                        scope_step = "data_view"
                     current_step = getattr(current_step, scope_step, None)
         except Exception as err:
             current_step = None
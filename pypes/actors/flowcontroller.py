@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from uuid import uuid4 as uuid
+from pypes.globals.event import get_id_generator
 
 from compy.actor import Actor
 from compy.event import XMLEvent, JSONEvent
@@ -12,6 +12,8 @@ __all__ = [
 ]
 
 class _Flow(Actor):
+    FUSABLE = True
+
     def consume(self, event, *args, **kwargs):
         self.send_event(event)
 
@@ -25,6 +27,8 @@ class FlowController(Actor):
 
     '''
 
+    FUSABLE = True
+
     def __init__(self, name, trigger_errors=False, generate_fresh_ids=False, *args, **kwargs):
         self.trigger_errors = trigger_errors
         self.generate_fresh_ids = generate_fresh_ids
@@ -32,7 +36,7 @@ class FlowController(Actor):
 
     def consume(self, event, *args, **kwargs):
         if self.generate_fresh_ids:
-            event._event_id = uuid().get_hex()
+            event._event_id = get_id_generator().next()
             event.meta_id = event._event_id
         if event.error and self.trigger_errors:
             self.send_error(event)
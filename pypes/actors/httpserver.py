@@ -14,6 +14,7 @@ from gevent.queue import Queue
 from compy.actor import Actor
 from compy.errors import InvalidEventDataModification, MalformedEventData, ResourceNotFound
 from compy.event import HttpEvent, JSONHttpEvent, XMLHttpEvent, HTTPStatuses
+from pypes.util.environment import HttpEnvironment
 
 BaseRequest.MEMFILE_MAX = 1024 * 1024 # (or whatever you want)
 
@@ -223,40 +224,13 @@ class HTTPServer(Actor, Bottle):
         else:
             self.logger.warning("Received event response for an unknown event ID. The request might have already received a response", event=event)
 
-    def __format_env(self, environ):
-        return {
-            "request": {
-                "headers": {key: value for key, value in request.headers.iteritems()},
-                "method": environ["REQUEST_METHOD"],
-                "url":{
-                    "scheme": environ["bottle.request.urlparts"].scheme,
-                    "domain": environ["bottle.request.urlparts"].netloc,
-                    "query": environ["bottle.request.urlparts"].query,
-                    "path": environ["PATH_INFO"],
-                    "path_args": {key: value for key, value in environ["route.url_args"].iteritems()},
-                    "query_args": {key: value for key, value in environ["bottle.request"].query.iteritems()}
-                }
-            },
-            "remote": {
-                "address": environ["REMOTE_ADDR"],
-                "port": environ["REMOTE_PORT"]
-            },
-            "server": {
-                "name": environ["SERVER_NAME"],
-                "port": environ["SERVER_PORT"],
-                "protocol": environ["SERVER_PROTOCOL"]
-            },
-            "accepted_methods": self.accepted_methods
-       }
-
-
     def callback(self, queue=None, *args, **kwargs):
         try:
             data = request.body.read()
             data = data if len(data) > 0 else None
         except Exception:
             data = None
-        event = HttpEvent(environment=self.__format_env(request.environ), forms=dict(request.forms), data=data)
+        event = HttpEvent(environment=HttpEnvironment(environ=request.environ, accepted_methods=self.accepted_methods), forms=dict(request.forms), data=data)
 
         response_queue = Queue()
         self.responders.update({event.event_id: response_queue})
@@ -5,9 +5,17 @@ import json
 
 from jsonschema import FormatChecker, ValidationError, SchemaError
 
-from compy.actor import Actor
-from compy.event import JSONEvent
-from compy.errors import MalformedEventData
+from pypes.actor import Actor
+from pypes.event import JSONEvent
+from pypes.util.errors import MalformedEventData
+
+__all__ = [
+    "JSONValidator",
+    "validate_json"
+]
+
+#compiled per process, as offload workers cannot share the actor's validator
+__validators = {}
 
 def _required(validator, required, instance, schema):
     """Validate 'required' properties.
@@ -29,10 +37,17 @@ def _required(validator, required, instance, schema):
             error.schema_path.append(index)
             yield error
 
+def validate_json(actor_class, schema, data):
+    '''Validates <data> against the JSON string <schema>, with the validator built by <actor_class>. Returns the error reasons'''
+    validator = __validators.get((actor_class, schema), None)
+    if validator is None:
+        validator = __validators[(actor_class, schema)] = actor_class._build_validator(schema=json.loads(schema))
+    return actor_class.format_error_response(validator.iter_errors(data))
 
 class JSONValidator(Actor):
     input = JSONEvent
     output = JSONEvent
+    FUSABLE = True
 
     '''**A simple module which applies a provided jsonschema to an incoming event JSON data**
 
@@ -48,21 +63,15 @@ class JSONValidator(Actor):
     def __init__(self, name, schema=None, *args, **kwargs):
         super(JSONValidator, self).__init__(name, *args, **kwargs)
         self.schema = schema
+        self.schema_string = None
         if self.schema:
-            formatter = self._build_formatter()
-            Validator = jsonschema.validators.extend(
-                validator=jsonschema.Draft4Validator,
-                validators={
-                    'required': _required
-                }
-            )
-
             try:
                 if isinstance(self.schema, str):
                     self.schema = json.loads(self.schema)
 
                 if isinstance(self.schema, dict):
-                    self.schema = Validator(self.schema, format_checker=formatter)
+                    self.schema_string = json.dumps(self.schema, sort_keys=True)
+                    self.schema = self._build_validator(schema=self.schema)
                 else:
                     raise ValueError("Schema must be of type str or dict. Instead received type '{type}'".format(type=type(self.schema)))
             except Exception as err:
@@ -70,19 +79,35 @@ class JSONValidator(Actor):
                 self.schema = None
 
     def consume(self, event, *args, **kwargs):
-        try:
-            if self.schema:
-                self.schema.validate(event.data)
-
-            self.logger.info("Incoming JSON successfully validated", event=event)
-            self.send_event(event)
-
-        except (SchemaError, ValidationError):
-            message = self.format_error_response(self.schema.iter_errors(event.data))
-            self.process_error(message, event)
-
+        if self.schema:
+            try:
+                if self.offloader.serializes:
+                    message = self.offload(validate_json, self.__class__, self.schema_string, event.data_view)
+                else:
+                    message = self.offload(self.validate, event.data_view)
+            except SchemaError as err:
+                message = [err.message]
+            if len(message) > 0:
+                self.process_error(message, event)
+
+        self.logger.info("Incoming JSON successfully validated", event=event)
+        return event
+
+    def validate(self, data):
+        return self.format_error_response(self.schema.iter_errors(data))
+
+    @classmethod
+    def _build_validator(cls, schema):
+        Validator = jsonschema.validators.extend(
+            validator=jsonschema.Draft4Validator,
+            validators={
+                'required': _required
+            }
+        )
+        return Validator(schema, format_checker=cls._build_formatter())
 
-    def format_error_response(self, errors):
+    @staticmethod
+    def format_error_response(errors):
         error_reasons = []
         for error in errors:
             err_message = ""
@@ -0,0 +1,12 @@
+from pypes.metas import force_derivative_attr
+from pypes.metas.actor import ActorMeta
+
+class _RecordSplitterMeta(ActorMeta):
+    def __new__(cls, name, bases, body):
+        force_derivative_attr(name=name, body=body, bases=bases, root_class_name="_RecordSplitter", attr_name="_detach")
+        return ActorMeta.__new__(cls, name, bases, body)
+
+class _RecordAggregatorMeta(ActorMeta):
+    def __new__(cls, name, bases, body):
+        force_derivative_attr(name=name, body=body, bases=bases, root_class_name="_RecordAggregator", attr_name="_assemble")
+        return ActorMeta.__new__(cls, name, bases, body)
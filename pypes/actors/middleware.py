@@ -121,6 +121,8 @@ class _HTTPInterpretorMixin():
 		return converted_type, event_class, data_source
 
 class RequestInterpretor(_HTTPInterpretorMixin, Actor):
+	FUSABLE = True
+
 	def consume(self, event, *args, **kwargs):
 		raw_mime_type = event.environment["request"]["headers"].get("Content-Type", "").split(';')[0]
 		interpreted_mime_type, event_class, data_source = self._interpret_mime_type(raw_mime=raw_mime_type)
@@ -138,6 +140,7 @@ class RequestInterpretor(_HTTPInterpretorMixin, Actor):
 			self.send_event(event)
 
 class ResponseInterpretor(_HTTPInterpretorMixin, Actor):
+	FUSABLE = True
 
 	def try_convert(self, event, event_class, ignore_data=False):
 		if not event.isInstance(event_class):
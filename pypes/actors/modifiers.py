@@ -12,6 +12,7 @@ __all__ = [
 
 class _BaseEventModifier(_ModifyMixin, Actor):
     _internal_error_message = "Invalid modification"
+    FUSABLE = True
 
     def __init__(self,
             name,
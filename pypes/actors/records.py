@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+
+from lxml import etree
+
+from pypes.actor import Actor
+from pypes.actors.metas.records import _RecordSplitterMeta, _RecordAggregatorMeta
+from pypes.actors.util.records import detach_json_records, assemble_json_records, detach_xml_records, assemble_xml_records, ExpiredParents
+from pypes.event import XMLEvent, JSONEvent
+from pypes.util.async import sleep, timestamp
+from pypes.util.errors import ActorTimeout
+
+__all__ = [
+    "JSONRecordSplitter",
+    "XMLRecordSplitter",
+    "JSONRecordAggregator",
+    "XMLRecordAggregator"
+]
+
+class _RecordSplitter(Actor):
+    '''**Sends one event per record of the incoming event, so that records can be processed in parallel**
+
+    Every record event carries the event_id of the incoming event as 'record_parent' and its position as
+    'record_index'. Records are sent as they are read, one record behind, so that the last one can also carry
+    'record_count', the number of records the incoming event held.
+
+    The records are detached from the incoming event while it is split, by the _detach(event) of each splitter, which
+    returns an iterable of the records and removes each from the event data as it is iterated. Once all records are
+    sent, the remainder of the incoming event is sent on the outbound queue named after <parent_queue>, if one is
+    connected, and records are sent to every other outbound queue. An event without records is only passed on through
+    that queue.
+
+    Parameters:
+
+        name (str):
+            | The instance name.
+        parent_queue (Optional[str]):
+            | The name of the outbound queue the remainder of the incoming event is sent to
+            | Default: "parents"
+
+    '''
+
+    __metaclass__ = _RecordSplitterMeta
+
+    def __init__(self, name, parent_queue="parents", *args, **kwargs):
+        super(_RecordSplitter, self).__init__(name, *args, **kwargs)
+        self.parent_queue = parent_queue
+
+    def consume(self, event, *args, **kwargs):
+        records = self._detach(event=event)
+        return self.__split(event=event, records=records)
+
+    def __split(self, event, records):
+        parent_queues = [queue for name, queue in self.pool.outbound.iteritems() if name == self.parent_queue]
+        record_queues = [queue for name, queue in self.pool.outbound.iteritems() if name != self.parent_queue] if parent_queues else None
+        record, count = None, 0
+        for count, data in enumerate(records, 1):
+            if not record is None:
+                yield record, record_queues
+            record = self.create_event(data=data, service=event.service, record_parent=event.event_id, record_index=count - 1)
+        if not record is None:
+            record.record_count = count
+            yield record, record_queues
+        self.logger.info("Split event into {count} records", event=event, count=count)
+        if parent_queues:
+            event.record_parent, event.record_count = event.event_id, count
+            yield event, parent_queues
+
+class JSONRecordSplitter(_RecordSplitter):
+    '''**Splits the list at <key_chain> into one event per item**
+
+    Parameters:
+
+        key_chain (Optional[list]):
+            | The keys, or list indexes, leading to the list of records. The data itself is the list if empty
+            | Default: []
+
+    Input:
+        JSONEvent
+
+    Output:
+        JSONEvent
+
+    '''
+
+    input = JSONEvent
+    output = JSONEvent
+
+    def __init__(self, name, key_chain=None, *args, **kwargs):
+        super(JSONRecordSplitter, self).__init__(name, *args, **kwargs)
+        self.key_chain = key_chain or []
+
+    def _detach(self, event):
+        return detach_json_records(event=event, key_chain=self.key_chain)
+
+class XMLRecordSplitter(_RecordSplitter):
+    '''**Splits the elements matching <xpath>, or named <record_tag>, into one event per element**
+
+    Records are reinserted by XMLRecordAggregator under the element that held the first record, which is recorded on
+    the incoming event as 'record_container'.
+
+    Data assigned as an XMLStream is split with <record_tag> while it is being parsed, so that only the current record
+    is ever held in memory. The remainder sent on <parent_queue> then only holds the elements leading to the records.
+
+    Parameters:
+
+        xpath (Optional[str]):
+            | The XPath selecting the records
+        record_tag (Optional[str]):
+            | The tag of the records. Exactly one of xpath and record_tag must be defined
+
+    Input:
+        XMLEvent
+
+    Output:
+        XMLEvent
+
+    '''
+
+    input = XMLEvent
+    output = XMLEvent
+
+    def __init__(self, name, xpath=None, record_tag=None, *args, **kwargs):
+        super(XMLRecordSplitter, self).__init__(name, *args, **kwargs)
+        if (xpath is None) == (record_tag is None):
+            raise TypeError("Exactly one of 'xpath' or 'record_tag' must be defined")
+        self.xpath = None if xpath is None else etree.XPath(xpath)
+        self.record_tag = record_tag
+
+    def _detach(self, event):
+        return detach_xml_records(event=event, xpath=self.xpath, record_tag=self.record_tag)
+
+class _RecordGroup(object):
+    '''The records of a single split event received so far'''
+
+    def __init__(self, service):
+        self.service = service
+        self.created = timestamp()
+        self.records = {}
+        self.count = None
+        self.parent = None
+
+class _RecordAggregator(Actor):
+    '''**Rebuilds events split by a record splitter once all of their records have arrived**
+
+    Records are collected by their 'record_parent' until the number of records in 'record_count' has arrived, along with
+    the remainder of the split event if an inbound queue named after <parent_queue> is connected. The rebuilt event is
+    the remainder of the split event with the records placed back in order, or a new event with the event_id of the
+    split event if no remainder is expected. Its 'record_count' is set to the number of records it holds. Its data is
+    built by the _assemble(parent, records) of each aggregator, which returns the data of the remainder, or new data
+    if there is none, holding the records.
+
+    Parameters:
+
+        name (str):
+            | The instance name.
+        timeout (Optional[float]):
+            | If set, the number of seconds after its first record arrived that an incomplete event is sent on with
+            | the records received so far, as an error. Records that errored on the way never arrive, so events
+            | would otherwise be held forever. Records arriving after their event was sent this way are dropped
+            | Default: None
+        expired_size (Optional[int]):
+            | The number of timed out events whose late records are recognized and dropped
+            | Default: 1000
+        parent_queue (Optional[str]):
+            | The name of the inbound queue the remainder of split events arrive on
+            | Default: "parents"
+
+    '''
+
+    __metaclass__ = _RecordAggregatorMeta
+
+    REQUIRED_EVENT_ATTRIBUTES = ["record_parent"]
+
+    def __init__(self, name, timeout=None, parent_queue="parents", expired_size=1000, *args, **kwargs):
+        super(_RecordAggregator, self).__init__(name, *args, **kwargs)
+        self.timeout = timeout
+        self.parent_queue = parent_queue
+        self.__groups = {}
+        self.__expired = ExpiredParents(size=expired_size)
+
+    def pre_hook(self):
+        if not self.timeout is None and self.timeout > 0:
+            self.spawn_thread(run=self.__expire)
+
+    def consume(self, event, origin_queue=None, *args, **kwargs):
+        if event.record_parent in self.__expired:
+            self.logger.warning("Dropped a record of an event that timed out", event=event)
+            return
+        group = self.__groups.get(event.record_parent, None)
+        if group is None:
+            group = self.__groups[event.record_parent] = _RecordGroup(service=event.service)
+
+        if not origin_queue is None and origin_queue is self.pool.inbound.get(self.parent_queue, None):
+            group.parent, group.count = event, event.record_count
+        else:
+            group.records[event.record_index] = event.data
+            if not event.get("record_count", None) is None:
+                group.count = event.record_count
+
+        if self.__complete(group=group):
+            del self.__groups[event.record_parent]
+            return self.__rebuild(parent_id=event.record_parent, group=group)
+
+    def __complete(self, group):
+        if group.count is None or len(group.records) < group.count:
+            return False
+        return not group.parent is None or self.pool.inbound.get(self.parent_queue, None) is None
+
+    def __rebuild(self, parent_id, group):
+        records = [group.records[index] for index in sorted(group.records)]
+        event = group.parent
+        if event is None:
+            event = self.create_event(service=group.service)
+            event.event_id = parent_id
+        event.data = self._assemble(parent=group.parent, records=records)
+        event.record_count = len(records)
+        return event
+
+    def __expire(self):
+        while self.is_running():
+            sleep(self.timeout)
+            expired = [parent_id for parent_id, group in self.__groups.items() if group.created + self.timeout <= timestamp()]
+            for parent_id in expired:
+                group = self.__groups.pop(parent_id)
+                self.__expired.add(parent_id)
+                event = self.__rebuild(parent_id=parent_id, group=group)
+                event.error = ActorTimeout("Only {received} of {count} records arrived within {timeout} seconds".format(
+                    received=len(group.records), count="?" if group.count is None else group.count, timeout=self.timeout))
+                self.logger.warning("Sending incomplete event: {error}".format(error=event.error.message[0]), event=event)
+                self.send_error(event)
+
+class JSONRecordAggregator(_RecordAggregator):
+    '''**Places records back into the list at <key_chain>**
+
+    Parameters:
+
+        key_chain (Optional[list]):
+            | The keys, or list indexes, leading to the list of records, as given to JSONRecordSplitter. New events
+            | are built as nested dicts along the keys
+            | Default: []
+
+    Input:
+        JSONEvent
+
+    Output:
+        JSONEvent
+
+    '''
+
+    input = JSONEvent
+    output = JSONEvent
+
+    def __init__(self, name, key_chain=None, *args, **kwargs):
+        super(JSONRecordAggregator, self).__init__(name, *args, **kwargs)
+        self.key_chain = key_chain or []
+
+    def _assemble(self, parent, records):
+        return assemble_json_records(parent=parent, records=records, key_chain=self.key_chain)
+
+class XMLRecordAggregator(_RecordAggregator):
+    '''**Places records back under the element they were split from**
+
+    Parameters:
+
+        root_tag (Optional[str]):
+            | The tag of the root element of new events, which hold the records directly
+            | Default: "records"
+
+    Input:
+        XMLEvent
+
+    Output:
+        XMLEvent
+
+    '''
+
+    input = XMLEvent
+    output = XMLEvent
+
+    def __init__(self, name, root_tag="records", *args, **kwargs):
+        super(XMLRecordAggregator, self).__init__(name, *args, **kwargs)
+        self.root_tag = root_tag
+
+    def _assemble(self, parent, records):
+        return assemble_xml_records(parent=parent, records=records, root_tag=self.root_tag)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+
+import collections
+from copy import deepcopy
+
+from lxml import etree
+
+from pypes.util.errors import MalformedEventData
+
+__all__ = [
+    "detach_json_records",
+    "assemble_json_records",
+    "detach_xml_records",
+    "assemble_xml_records",
+    "ExpiredParents"
+]
+
+def detach_json_records(event, key_chain):
+    '''Returns an iterable of the items of the list at <key_chain> in the data of <event>, which is left holding an empty
+    list. Items are popped off the list as they are iterated'''
+    records = node = event.data
+    try:
+        for key in key_chain:
+            node, records = records, records[key]
+    except (KeyError, IndexError, TypeError):
+        raise MalformedEventData("Event data has no value at {key_chain}".format(key_chain=key_chain))
+    if not isinstance(records, list):
+        raise MalformedEventData("Expected a list of records at {key_chain}, found '{_type}'".format(key_chain=key_chain, _type=type(records)))
+
+    if key_chain:
+        node[key_chain[-1]] = []
+    else:
+        event.data = []
+    return _pop(records=records)
+
+def _pop(records):
+    records.reverse()
+    while records:
+        yield records.pop()
+
+def assemble_json_records(parent, records, key_chain):
+    '''Returns the data of <parent>, or new nested dicts along <key_chain> if <parent> is None, holding <records> at
+    <key_chain>'''
+    if not key_chain:
+        return records
+    if parent is None:
+        data = node = collections.OrderedDict()
+        for key in key_chain[:-1]:
+            node = node.setdefault(key, collections.OrderedDict())
+    else:
+        data = node = parent.data
+        for key in key_chain[:-1]:
+            node = node[key]
+    node[key_chain[-1]] = records
+    return data
+
+def detach_xml_records(event, xpath=None, record_tag=None):
+    '''Returns an iterable of the elements of the data of <event> selected by <xpath> (a compiled etree.XPath), or
+    named <record_tag>, removing each from the data as it is iterated. The path of the element holding the first
+    record is set on <event> as 'record_container'.
+
+    Data not parsed into a tree yet is streamed with <record_tag>, and the data of <event> is replaced, once every
+    record has been iterated, by a copy of the elements leading to the records'''
+    if xpath is None:
+        stream = event.data_stream
+        if not isinstance(stream.source, etree._Element):
+            return _stream(event=event, stream=stream, record_tag=record_tag)
+        records = list(stream.source.iter(tag=record_tag))
+    else:
+        records = [record for record in xpath(event.data) if isinstance(record, etree._Element)]
+
+    if records:
+        if records[0].getparent() is None:
+            raise MalformedEventData("The root element cannot be split into records")
+        event.record_container = records[0].getroottree().getpath(records[0].getparent())
+    return _remove(records=records)
+
+def _remove(records):
+    for record in records:
+        record.getparent().remove(record)
+        record.tail = None
+        yield record
+
+def _stream(event, stream, record_tag):
+    shell = None
+    for record in stream.records(tag=record_tag):
+        if shell is None:
+            if record.getparent() is None:
+                raise MalformedEventData("The root element cannot be split into records")
+            container = None
+            for element in reversed([record.getparent()] + list(record.getparent().iterancestors())):
+                container = _copy(element=element, parent=container)
+            shell = container.getroottree().getroot()
+            event.record_container = container.getroottree().getpath(container)
+        yield deepcopy(record)
+    event.data = _copy(element=stream.root, parent=None) if shell is None else shell
+
+def _copy(element, parent):
+    if parent is None:
+        copy = etree.Element(element.tag, attrib=dict(element.attrib), nsmap=element.nsmap)
+    else:
+        copy = etree.SubElement(parent, element.tag, attrib=dict(element.attrib), nsmap=element.nsmap)
+    copy.text = element.text
+    return copy
+
+def assemble_xml_records(parent, records, root_tag):
+    '''Returns the data of <parent> holding <records> under its 'record_container', or a new <root_tag> element holding
+    them if <parent> is None'''
+    if parent is None:
+        root = container = etree.Element(root_tag)
+    else:
+        root = parent.data
+        path = parent.get("record_container", None)
+        containers = [] if path is None else root.getroottree().xpath(path)
+        container = containers[0] if containers else root
+    container.extend(records)
+    return root
+
+class ExpiredParents(object):
+    '''The ids of the last <size> split events that timed out before all of their records arrived'''
+
+    def __init__(self, size):
+        self.size = size
+        self.__ids = collections.OrderedDict()
+
+    def add(self, parent_id):
+        self.__ids[parent_id] = None
+        while len(self.__ids) > self.size:
+            self.__ids.popitem(last=False)
+
+    def __contains__(self, parent_id):
+        return parent_id in self.__ids
+
+    def __len__(self):
+        return len(self.__ids)
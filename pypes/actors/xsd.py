@@ -2,16 +2,35 @@
 
 from lxml import etree
 
-from compy.actor import Actor
-from compy.event import XMLEvent, JSONEvent
-from compy.errors import MalformedEventData
+from pypes.actor import Actor
+from pypes.event import XMLEvent, JSONEvent
+from pypes.util.errors import MalformedEventData
+from pypes.util.offload import PerThread
 
 __all__ = [
     "XSD",
     "XMLXSD",
-    "JSONXSD"
+    "JSONXSD",
+    "validate_string"
 ]
 
+#compiled per process, as offload workers cannot share the actor's schema
+__schemas = {}
+
+def _invalid_messages(schema, etree_element):
+    try:
+        schema.assertValid(etree_element)
+    except etree.DocumentInvalid as xml_errors:
+        return [message.message for message in xml_errors.error_log.filter_levels([1, 2])]
+    return []
+
+def validate_string(xsd, data):
+    '''Validates the XML string <data> against the <xsd> schema. Returns the validation error messages'''
+    schema = __schemas.get(xsd, None)
+    if schema is None:
+        schema = __schemas[xsd] = etree.XMLSchema(etree.XML(xsd))
+    return _invalid_messages(schema=schema, etree_element=etree.fromstring(data))
+
 class _XSD(Actor):
     '''**A simple actor which applies a provided XSD to an incoming event XML data. If no XSD is defined, it will validate XML format correctness**
 
@@ -34,23 +53,34 @@ class _XSD(Actor):
 
     def __init__(self, name, xsd=None, *args, **kwargs):
         super(_XSD, self).__init__(name, *args, **kwargs)
+        self.xsd = xsd
+        self.__schemas = None
         if xsd:
-            self.schema = etree.XMLSchema(etree.XML(xsd))
-        else:
-            self.schema = None
+            self.__schemas = PerThread(factory=lambda: etree.XMLSchema(etree.XML(xsd)))
+            self.__schemas.get()
+
+    @property
+    def schema(self):
+        '''The schema compiled for the calling thread'''
+        return None if self.__schemas is None else self.__schemas.get()
 
     def consume(self, event, *args, **kwargs):
         try:
-
+            messages = []
             if self.schema:
-                self.schema.assertValid(event.data)
-            self.logger.info("Incoming XML successfully validated", event=event)
-            self.send_event(event)
-        except etree.DocumentInvalid as xml_errors:
-            messages = [message.message for message in xml_errors.error_log.filter_levels([1, 2])]
-            self.process_error(messages, event)
+                if self.offloader.serializes:
+                    messages = self.offload(validate_string, self.xsd, event.data_string)
+                else:
+                    messages = self.offload(self.validate, event.data_view)
         except Exception as error:
             self.process_error(error, event)
+        if len(messages) > 0:
+            self.process_error(messages, event)
+        self.logger.info("Incoming XML successfully validated", event=event)
+        return event
+
+    def validate(self, etree_element):
+        return _invalid_messages(schema=self.schema, etree_element=etree_element)
 
     def process_error(self, message, event):
         self.logger.error("Error validating incoming XML: {0}".format(message), event=event)
@@ -63,4 +93,4 @@ class XMLXSD(XSD):
     pass
 
 class JSONXSD(_XSD):
-    output = JSONEvent
\ No newline at end of file
+    output = JSONEvent
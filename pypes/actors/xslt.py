@@ -1,20 +1,36 @@
 #!/usr/bin/env python
 
+import tempfile
 import traceback
 
 from lxml import etree
 from lxml.etree import XSLTApplyError #TODO Don't need this and generic etree import
 
-from compy.actor import Actor
-from compy.event import XMLEvent, JSONEvent
-from compy.errors import MalformedEventData
+from pypes.actor import Actor
+from pypes.event import XMLEvent, JSONEvent
+from pypes.util.errors import MalformedEventData
+from pypes.util.offload import PerThread
+from pypes.util.stream import XMLStream
+from pypes.globals.event import DEFAULT_SPOOL_SIZE
 
 __all__ = [
     "XSLT",
     "JSONXSLT",
-    "XMLXSLT"
+    "XMLXSLT",
+    "StreamXSLT",
+    "transform_string"
 ]
 
+#compiled per process, as offload workers cannot share the actor's template
+__templates = {}
+
+def transform_string(xslt, data):
+    '''Applies the <xslt> stylesheet to the XML string <data> and returns the result as a string'''
+    template = __templates.get(xslt, None)
+    if template is None:
+        template = __templates[xslt] = etree.XSLT(etree.XML(xslt))
+    return etree.tostring(template(etree.fromstring(data)))
+
 class _XSLT(Actor):
     '''**A sample module which applies a provided XSLT to an incoming event XML data**
 
@@ -41,15 +57,25 @@ class _XSLT(Actor):
         if xslt is None and not isinstance(xslt, str):
             raise TypeError("Invalid xslt defined. {_type} is not a valid xslt. Expected 'str'".format(_type=type(xslt)))
         else:
-            self.template = etree.XSLT(etree.XML(xslt))
+            self.xslt = xslt
+            self.__templates = PerThread(factory=lambda: etree.XSLT(etree.XML(xslt)))
+            self.__templates.get()
+
+    @property
+    def template(self):
+        '''The template compiled for the calling thread'''
+        return self.__templates.get()
 
     def consume(self, event, *args, **kwargs):
         try:
-            self.logger.debug("In: {data}".format(data=event.data_string().replace('\n', '')), event=event)
-            event.data = self.transform(event.data)
-            self.logger.debug("Out: {data}".format(data=event.data_string().replace('\n', '')), event=event)
+            self.logger.debug(lambda: "In: {data}".format(data=event.data_string.replace('\n', '')), event=event)
+            if self.offloader.serializes:
+                event.data = self.offload(transform_string, self.xslt, event.data_string)
+            else:
+                event.data = self.offload(self.transform, event.data_view)
+            self.logger.debug(lambda: "Out: {data}".format(data=event.data_string.replace('\n', '')), event=event)
             self.logger.info("Successfully transformed XML", event=event)
-            self.send_event(event)
+            return event
         except XSLTApplyError as err:
             # This is a legacy functionality that was implemented due to the specifics of a single implementation.
             # I'm looking for a way around this, internally
@@ -72,4 +98,75 @@ class XMLXSLT(XSLT):
     pass
 
 class JSONXSLT(_XSLT):
-    output = JSONEvent
\ No newline at end of file
+    output = JSONEvent
+
+class StreamXSLT(_XSLT):
+    '''**Applies the XSLT to each repeating record of an XML document, one record at a time**
+
+    The document is read through XMLEvent.data_stream, so data assigned as an XMLStream, a string or a file is never
+    parsed into a full tree. Transformed records are written out as they are produced, under a copy of the source root element, to a file
+    that is spooled to disk once it outgrows <spool_size>. The output event holds that file as an XMLStream.
+
+    The XSLT sees each record as its document root. Records are transformed in the calling greenlet, or in a thread
+    when offload is "thread". Process offload is not used, as streams cannot be sent to another process.
+
+    Parameters:
+
+        name (str):
+            | The instance name.
+        xslt (str):
+            | The xslt to apply to each record
+        record_tag (str):
+            | The tag of the repeating record elements, as accepted by etree.iterparse. ie: '{namespace}record'
+        spool_size (Optional[int]):
+            | The size in bytes above which the transformed output is spooled to a temporary file
+            | Default: DEFAULT_SPOOL_SIZE
+
+    Input:
+        XMLEvent
+
+    Output:
+        XMLEvent
+
+    '''
+
+    output = XMLEvent
+
+    def __init__(self, name, xslt=None, record_tag=None, spool_size=DEFAULT_SPOOL_SIZE, *args, **kwargs):
+        super(StreamXSLT, self).__init__(name, xslt=xslt, *args, **kwargs)
+        if record_tag is None:
+            raise TypeError("A record_tag is required to stream records")
+        self.record_tag = record_tag
+        self.spool_size = spool_size
+
+    def consume(self, event, *args, **kwargs):
+        try:
+            if self.offloader.serializes:
+                output = self.transform_stream(event.data_stream)
+            else:
+                output = self.offload(self.transform_stream, event.data_stream)
+            event.data = XMLStream(source=output)
+            self.logger.info("Successfully transformed XML records", event=event)
+            return event
+        except Exception as err:
+            self._process_error(traceback.format_exc(), event)
+
+    def transform_stream(self, stream):
+        '''Returns a file holding the transformed records of <stream> under a copy of its root element'''
+        output = tempfile.SpooledTemporaryFile(max_size=self.spool_size)
+        records = stream.records(tag=self.record_tag)
+        first = next(records, None)
+        root = stream.root
+        with etree.xmlfile(output) as xml_file:
+            with xml_file.element(root.tag, attrib=dict(root.attrib), nsmap=root.nsmap):
+                if not first is None:
+                    self.__write(xml_file=xml_file, record=first)
+                for record in records:
+                    self.__write(xml_file=xml_file, record=record)
+        output.seek(0)
+        return output
+
+    def __write(self, xml_file, record):
+        result = self.template(record).getroot()
+        if not result is None:
+            xml_file.write(result)
@@ -2,15 +2,23 @@
 
 import signal
 import os
+import shutil
+import tempfile
 import traceback
 
+import gevent
+import gevent.os
 from gevent import signal as gsignal, event
 
 from pypes.actor import Actor
 from pypes.actors.null import Null
 from pypes.actors.stdout import STDOUT
 from pypes.actors.eventlogger import EventLogger
-from pypes.util.errors import ActorInitFailure
+from pypes.util.errors import ActorInitFailure, SetupError
+from pypes.util.process import QueueSender, QueueReceiver, queue_endpoint
+from pypes.util.logger import LogSink
+from pypes.globals.logger import DEFAULT_LOG_BUFFER_SIZE
+from pypes.globals.async import get_async_manager
 from pypes.decorators.async import AsyncContextManager
 
 __all__ = [
@@ -25,15 +33,30 @@ def get_default_log_actor():
         __default_log_actor = STDOUT("default_stdout")
     return __default_log_actor
 
+#the process the Director was started in, which also runs the log and error actors
+MAIN_PROCESS = "main"
+
 @AsyncContextManager
 class Director(object):
 
-    def __init__(self, size=500, name="default", default_log_actor=None, default_error_actor=None, *args, **kwargs):
+    def __init__(self, size=500, name="default", default_log_actor=None, default_error_actor=None, log_level=None, log_sink_policy=None,
+            log_sink_size=DEFAULT_LOG_BUFFER_SIZE, *args, **kwargs):
         self.name = name
+        self.log_level = log_level
+        #actors of the main process hand their messages directly to the log actor through a LogSink if a policy is set
+        self.log_sink_policy = log_sink_policy
+        self.log_sink_size = log_sink_size
+        self.__log_sink = None
         self.__actors = {}
         self.__size = size
         self.log_actor = None
         self.error_actor = None
+        self.__placements = {}
+        self.__process_keys = []
+        self.__process = MAIN_PROCESS
+        self.__workers = {}
+        self.__bridges = []
+        self.__ipc_directory = None
 
     @property
     def size(self):
@@ -42,7 +65,17 @@ class Director(object):
     @property
     def actors(self):
         return self.__actors
-    
+
+    @property
+    def process(self):
+        '''The label of the process this Director instance runs in (MAIN_PROCESS or a worker label)'''
+        return self.__process
+
+    def metrics(self):
+        '''Returns a snapshot of the metrics of every actor running in this process, keyed by actor name'''
+        actors = [actor for actor in self.__all_actors() if self.__process in self.__locations(actor=actor)]
+        return {actor.name: actor.metrics.snapshot() for actor in actors}
+
     def get_actor(self, name):
         actor = self.__actors.get(name, None)
         if not actor:
@@ -77,6 +110,9 @@ class Director(object):
 
         Both syntaxes may be used interchangeably, such as in:
             director.connect_queue(test_event, (stdout, "custom_inbox_name"))
+
+        The queue class may be chosen per connection, such as a write-ahead logged queue:
+            director.connect_queue(test_event, std_out, queue_class=PersistentQueue, queue_kwargs={"directory": "/var/lib/pypes/test_event"})
         '''
         #TODO: This is currently unsupported (weird formatting to hook into pycharm 'TODO' tracker)
         '''
@@ -127,11 +163,20 @@ class Director(object):
 
         return (actor_name, queue_name)
 
-    def register_actor(self, actor, name=None, *args, **kwargs):
+    def register_actor(self, actor, name=None, process=None, replicas=1, *args, **kwargs):
+        '''Registers an actor. Actors sharing a <process> key are run together in <replicas> worker processes (the
+        largest value given for that key), and events are spread round-robin over the replicas. Actors without a
+        <process> run in the main process alongside the log and error actors'''
         if not isinstance(actor, Actor):
             actor = self.__create_actor(actor, name, *args, **kwargs)
 
         self.__actors[actor.name] = actor
+        if not process is None:
+            if replicas < 1:
+                raise ValueError("Actor replicas must be a positive integer")
+            if not process in self.__process_keys:
+                self.__process_keys.append(process)
+            self.__placements[actor.name] = (process, replicas)
         return actor
 
     def register_log_actor(self, actor, name, *args, **kwargs):
@@ -160,25 +205,152 @@ class Director(object):
         self.error_actor.connect_log_queue(source_queue_name="logs", destination=self.log_actor, check_existing=False)
 
 
-    def start(self):
-        '''Starts all registered actors.'''
-        self.__setup_default_connections()
-
+    def __fuse_actors(self):
+        '''Fuses every queue that connects exactly one fusable producer with exactly one fusable consumer, so that
+        chains of stateless actors are run inline by the first actor of the chain'''
+        producers, consumers = {}, {}
         for actor in self.__actors.itervalues():
-            actor.start()
+            for queue in actor.pool.outbound.values():
+                producers.setdefault(queue, []).append(actor)
+            for queue in actor.pool.inbound.values():
+                consumers.setdefault(queue, []).append(actor)
+
+        for queue, queue_producers in producers.iteritems():
+            queue_consumers = consumers.get(queue, [])
+            if len(queue_producers) == 1 and len(queue_consumers) == 1:
+                producer, consumer = queue_producers[0], queue_consumers[0]
+                if producer.FUSABLE and consumer.FUSABLE and not consumer.batched and consumer.concurrency is None and not queue.DURABLE \
+                        and self.__locations(actor=producer) == self.__locations(actor=consumer):
+                    producer._fuse(queue=queue, destination=consumer)
+
+    def __all_actors(self):
+        actors = self.__actors.values()
+        for actor in (self.log_actor, self.error_actor):
+            if not actor is None and not actor in actors:
+                actors.append(actor)
+        return actors
+
+    def __replicas(self, process):
+        return max(replicas for (key, replicas) in self.__placements.itervalues() if key == process)
+
+    def __worker_processes(self):
+        return ["{0}.{1}".format(index, replica) for index, process in enumerate(self.__process_keys) for replica in xrange(self.__replicas(process=process))]
+
+    def __locations(self, actor):
+        '''Returns the labels of the processes running <actor>'''
+        placement = self.__placements.get(actor.name, None)
+        if placement is None:
+            return [MAIN_PROCESS]
+        index = self.__process_keys.index(placement[0])
+        return ["{0}.{1}".format(index, replica) for replica in xrange(self.__replicas(process=placement[0]))]
+
+    def __edges(self):
+        '''Maps every queue to the sets of processes producing to and consuming from it'''
+        edges = {}
+        for actor in self.__all_actors():
+            locations = self.__locations(actor=actor)
+            for queue in actor.pool.outbound.values() + actor.pool.error.values() + actor.pool.logs.values():
+                edges.setdefault(queue, (set(), set()))[0].update(locations)
+            for queue in actor.pool.inbound.values():
+                edges.setdefault(queue, (set(), set()))[1].update(locations)
+
+        for queue, (producers, consumers) in edges.iteritems():
+            if queue.DURABLE and len(producers | consumers) > 1:
+                raise SetupError("Durable queue '{0}' cannot be shared between processes".format(queue.name))
+        return edges
+
+    def __fork_workers(self):
+        '''Forks one worker process per worker label. Returns the label of the calling process'''
+        processes = self.__worker_processes()
+        if len(processes) > 0:
+            self.__ipc_directory = tempfile.mkdtemp(prefix="pypes-")
+        for process in processes:
+            pid = gevent.fork()
+            if pid == 0:
+                self.__workers = {}
+                return process
+            self.__workers[process] = pid
+        return MAIN_PROCESS
+
+    def __local_actor(self, queue, inbound):
+        '''Returns the actor of this process consuming (or producing to, if not <inbound>) <queue>'''
+        for actor in self.__all_actors():
+            if self.__process in self.__locations(actor=actor):
+                queues = actor.pool.inbound.values() if inbound else actor.pool.outbound.values() + actor.pool.error.values() + actor.pool.logs.values()
+                if queue in queues:
+                    return actor
+
+    def __create_bridges(self, edges):
+        '''Cross-process edges are pushed over ipc sockets, in-process edges keep using their queues'''
+        bridges = []
+        for queue, (producers, consumers) in edges.iteritems():
+            if self.__process in producers and not self.__process in consumers and len(consumers) > 0:
+                endpoints = [queue_endpoint(directory=self.__ipc_directory, queue=queue, process=process) for process in sorted(consumers)]
+                bridges.append(QueueSender(queue=queue, endpoints=endpoints, actor=self.__local_actor(queue=queue, inbound=False)))
+            elif self.__process in consumers and len(producers - consumers) > 0:
+                endpoint = queue_endpoint(directory=self.__ipc_directory, queue=queue, process=self.__process)
+                bridges.append(QueueReceiver(queue=queue, endpoint=endpoint, actor=self.__local_actor(queue=queue, inbound=True)))
+        return bridges
 
+    def start(self):
+        '''Starts all registered actors, forking the worker processes first if any actor was placed in one.'''
         if self.log_actor is None:
             self.log_actor = get_default_log_actor()
         if self.error_actor is None:
             self.error_actor = get_default_log_actor()
 
-        self.log_actor.start()
-        self.error_actor.start()
+        self.__setup_default_connections()
+        self.__fuse_actors()
+        edges = self.__edges()
+        self.__process = self.__fork_workers()
+
+        local = []
+        for actor in self.__all_actors():
+            if self.__process in self.__locations(actor=actor):
+                local.append(actor)
+            else:
+                get_async_manager().remove_context_manager(key=actor._async_hidden_key)
+
+        self.__bridges = self.__create_bridges(edges=edges)
+        for bridge in self.__bridges:
+            bridge.start()
+
+        if self.__process == MAIN_PROCESS and not self.log_sink_policy is None:
+            self.__log_sink = LogSink(actor=self.log_actor, size=self.log_sink_size, policy=self.log_sink_policy)
+
+        for actor in local:
+            if not self.log_level is None and actor.logger.level is None:
+                actor.logger.level = self.log_level
+            actor.logger.sink = self.__log_sink
+            actor.start()
+
+        if not self.__log_sink is None:
+            self.__log_sink.start()
 
     def stop(self):
-        '''Stops all input actors.'''
+        '''Stops all input actors, and the worker processes when called in the main process.'''
 
         for actor in self.__actors.itervalues():
-            actor.stop()
-
-        self.log_actor.stop()
\ No newline at end of file
+            if self.__process in self.__locations(actor=actor):
+                actor.stop()
+
+        for bridge in self.__bridges:
+            bridge.stop()
+
+        if self.__process == MAIN_PROCESS:
+            if not self.__log_sink is None:
+                self.__log_sink.stop()
+            self.log_actor.stop()
+            for pid in self.__workers.itervalues():
+                os.kill(pid, signal.SIGTERM)
+            for pid in self.__workers.itervalues():
+                gevent.os.waitpid(pid, 0)
+            self.__workers = {}
+            if not self.__ipc_directory is None:
+                shutil.rmtree(self.__ipc_directory, ignore_errors=True)
+
+        #queues are closed once every actor of this process has stopped, since actors share them
+        for actor in self.__all_actors():
+            if self.__process in self.__locations(actor=actor):
+                for queue in actor.pool.inbound.values() + actor.pool.outbound.values():
+                    queue.close()
\ No newline at end of file
@@ -2,24 +2,32 @@ import logging
 import collections
 import itertools
 from pypes.mixins.event import EventFormatMixin, XMLEventFormatMixin, JSONEventFormatMixin, StringEventFormatMixin, TimingEventMixin, LogEventMixin, HttpEventMixin
-from uuid import uuid4 as uuid
 from pypes.util.async import timestamp
 from pypes.util import ignored
 from copy import deepcopy
-from pypes.globals.event import get_event_manager
-from pypes.util.errors import PypesException
+from pypes.globals.event import get_event_manager, get_id_generator
+from pypes.util.event import EventData, XMLType, JSONType
+from pypes.util.errors import PypesException, InvalidEventModification
 
 class BaseEvent(object):
     __pickled_xml_attr = "pickled_xml_attrs"
 
+    #core fields and mixin state are slotted. Mixin state and the event id are only set once used, and the instance
+    #__dict__ is only allocated for arbitrary attributes
+    __state_slots = ("_service", "_event_id", "_data", "_error", "splits", "_created", "_timing", "_logging", "_environment")
+    __slots__ = __state_slots + ("__dict__", "__weakref__")
+
     def __init__(self, data=None, service=None, *args, **kwargs):
         self._service = service
-        self._event_id = uuid().get_hex()
-        self._data = data
+        self._data = EventData(value=data)
         self._error = None
         self.splits = list()
         self._created = timestamp()
-        self.__dict__.update(kwargs)
+        for key, value in kwargs.iteritems():
+            try:
+                setattr(self, key, value)
+            except AttributeError:
+                self.__dict__[key] = value
 
     def __new__(cls, *args, **kwargs):
         instance = super(BaseEvent, cls).__new__(cls)
@@ -58,13 +66,20 @@ class BaseEvent(object):
     def service(self, service):
         self._service = DEFAULT_SERVICE if service is None else service
 
+    #data is held as is and only converted to the format of the event on access, see EventData
     @property
     def data(self):
-        return self._data
+        '''The event data in the format of the event, which may be modified. A forked event gets its own copy of data
+        it shares once it reads a mutable representation (a dict or an XML tree) here'''
+        convert = get_event_manager().get_converter(format_type=self._format_type)
+        if self._data.references > 1 and EventData.mutable(self._data.get(format_type=self._format_type, convert=convert)):
+            self._data = self._data.release()
+        return self._data.checkout(format_type=self._format_type, convert=convert)
 
     @data.setter
     def data(self, data):
-        self._data = get_event_manager().ensure_formating(event=self, new_value=data)
+        self._data.references -= 1
+        self._data = EventData(value=data)
 
     @property
     def created(self):
@@ -79,11 +94,15 @@ class BaseEvent(object):
 
     @property
     def event_id(self):
-        return self._event_id
+        try:
+            return self._event_id
+        except AttributeError:
+            self._event_id = get_id_generator().next()
+            return self._event_id
 
     @event_id.setter
     def event_id(self, id):
-        if not self._event_id is None:
+        if not getattr(self, "_event_id", None) is None:
             raise InvalidEventModification(message="Cannot alter event_id once it has been set.")
         else:
             self._event_id = id
@@ -103,17 +122,45 @@ class BaseEvent(object):
     def format_error(self):
         return get_event_manager().format_error(event=self)
 
+    @property
+    def data_view(self):
+        '''The event data in the format of the event, for reading only. Forked events keep sharing it, so it must not be
+        modified'''
+        return self._data.get(format_type=self._format_type, convert=get_event_manager().get_converter(format_type=self._format_type))
+
     @property
     def data_string(self):
-        return get_event_manager().stringify(new_value=self._data)
+        return get_event_manager().get_data_string(data=self._data, format_type=self._format_type)
+
+    def _get_state(self):
+        '''Returns every attribute set on this event, slotted or not, keyed by attribute name'''
+        self.event_id
+        state = {}
+        for key in BaseEvent.__state_slots:
+            with ignored(AttributeError):
+                state[key] = object.__getattribute__(self, key)
+        state.update(self.__dict__)
+        return state
+
+    def _set_state(self, state):
+        for key, value in state.iteritems():
+            if key in BaseEvent.__state_slots:
+                object.__setattr__(self, key, value)
+            else:
+                self.__dict__[key] = value
 
     def __getstate__(self):
-        pickle_dict = dict(self.__dict__)
+        pickle_dict = self._get_state()
         pickled_xml_attrs = []
         for key, value in pickle_dict.iteritems():
+            if isinstance(value, EventData):
+                value = pickle_dict[key] = value.value
             if get_event_manager().is_xml_type(clazz=value.__class__):
                 pickled_xml_attrs.append(key)
-                pickle_dict[key] = get_event_manager().convert_to_string(value=value)
+                if key == "_data":
+                    pickle_dict[key] = get_event_manager().get_data_string(data=self._data, format_type=XMLType)
+                else:
+                    pickle_dict[key] = get_event_manager().convert_to_string(value=value)
         pickle_dict[BaseEvent.__pickled_xml_attr] = pickled_xml_attrs
         return pickle_dict
 
@@ -122,7 +169,10 @@ class BaseEvent(object):
         del state[BaseEvent.__pickled_xml_attr]
         for key in pickled_xml_attrs:
             state[key] = get_event_manager().convert_to_xml(value=state[key])
-        self.__dict__ = state
+        data = state.get("_data", None)
+        owned_format = JSONType if self._format_type is JSONType and isinstance(data, (dict, list)) else None
+        state["_data"] = EventData(value=data, format_type=owned_format)
+        self._set_state(state=state)
 
     def __str__(self):
         return str(self.__getstate__())
@@ -130,18 +180,29 @@ class BaseEvent(object):
     def clone(self):
         return deepcopy(self)
 
+    def fork(self, count):
+        """Returns <count> events, starting with this one, that share a single copy of the event data.
+        Reading 'data' as a dict or an XML tree copies it for that event, the last one to do so receiving the original.
+        Events that only read 'data_view' (or string data) keep sharing it without copying"""
+        if count < 2:
+            return [self]
+        shared = self._data
+        shared.references += count - 1
+        events, state = [self], self._get_state()
+        for _ in xrange(count - 1):
+            event = object.__new__(self.__class__)
+            event._set_state(state=deepcopy(state, {id(shared): shared}))
+            events.append(event)
+        return events
+
 __event_mixin_hooks = collections.defaultdict(lambda: {},
     {
         TimingEventMixin: {
-            "_build_hooks": ["build_timing"],
             "_pre_consume_hooks": ["set_started", "timeout_check"],
             "_post_consume_hooks": ["set_ended", "timeout_check"]
         },
         LogEventMixin: {
             "_build_hooks": ["build_logging"]
-        },
-        HttpEventMixin: {
-            "_build_hooks": ["build_environment"]
         }
     }
 )
@@ -186,6 +247,7 @@ for data_mixin, descriptor in __data_format_mixins.iteritems():
                 class_name, 
                 parent_classes, 
                 {
+                    "__slots__": (),
                     "_build_hooks": build,
                     "_pre_consume_hooks": pre,
                     "_post_consume_hooks": post,
@@ -1,5 +1,14 @@
+import multiprocessing
+
 
 DEFAULT_SLEEP_INTERVAL = 0.001
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_BATCH_TIMEOUT = 0.01
+DEFAULT_YIELD_BUDGET = 100
+DEFAULT_YIELD_INTERVAL = 0.005
+DEFAULT_SEND_TIMEOUT = 30
+#number of worker processes (or threads) an offloading actor runs its work on
+DEFAULT_OFFLOAD_SIZE = multiprocessing.cpu_count()
 
 __async_manager = None
 __restart_pool = None
@@ -6,7 +6,7 @@ from pypes.util.errors import (ResourceNotModified, MalformedEventData, InvalidE
     UnauthorizedEvent, ForbiddenEvent, ResourceNotFound, EventCommandNotAllowed, ActorTimeout, ResourceConflict,
     ResourceGone, UnprocessableEventData, EventRateExceeded, PypesException, ServiceUnavailable)
 from pypes import import_restriction
-from pypes.util.event import EventManager
+from pypes.util.event import EventManager, IDGenerator
 __all__ = []
 
 if __name__.startswith(import_restriction):
@@ -14,14 +14,18 @@ if __name__.startswith(import_restriction):
         "DEFAULT_SERVICE",
         "DEFAULT_STATUS_CODE",
         "DEFAULT_LOG_FILENAME",
+        "DEFAULT_SPOOL_SIZE",
         "HTTPStatusMap",
         "HTTPStatuses",
-        "get_event_manager"
+        "get_event_manager",
+        "get_id_generator",
+        "set_id_generator"
     ]
 
 DEFAULT_SERVICE = "default"
 DEFAULT_STATUS_CODE = 200
 DEFAULT_LOG_FILENAME = "compysition.log"
+DEFAULT_SPOOL_SIZE = 16 * 1024 * 1024
 
 HTTPStatusMap = collections.defaultdict(lambda: {"status": 500},
     {
@@ -80,4 +84,17 @@ def get_event_manager():
     global __event_manager
     if __event_manager is None:
         __event_manager = EventManager()
-    return __event_manager
\ No newline at end of file
+    return __event_manager
+
+__id_generator = None
+
+def get_id_generator():
+    global __id_generator
+    if __id_generator is None:
+        __id_generator = IDGenerator()
+    return __id_generator
+
+def set_id_generator(generator):
+    '''Replaces the generator of event and split ids. <generator> only needs a next() method returning a unique string'''
+    global __id_generator
+    __id_generator = generator
\ No newline at end of file
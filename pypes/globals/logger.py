@@ -0,0 +1,19 @@
+import logging
+
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "DEFAULT_LOG_LEVEL",
+        "DEFAULT_LOG_SAMPLE_INTERVAL",
+        "DEFAULT_LOG_BUFFER_SIZE"
+    ]
+
+#the level below which a Logger drops messages, unless a level is set for its actor or Director
+DEFAULT_LOG_LEVEL = logging.DEBUG
+#repetitive per event messages are sent at most once per interval (in seconds)
+DEFAULT_LOG_SAMPLE_INTERVAL = 1.0
+#the number of records a LogSink holds until its drainer catches up
+DEFAULT_LOG_BUFFER_SIZE = 10000
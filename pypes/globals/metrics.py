@@ -0,0 +1,11 @@
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "DEFAULT_LATENCY_BUCKETS"
+    ]
+
+#upper bounds (in seconds) of the consume latency histogram buckets
+DEFAULT_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
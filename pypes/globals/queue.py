@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "DEFAULT_SEGMENT_SIZE",
+        "DEFAULT_SPILL_DIRECTORY",
+        "DEFAULT_COMMIT_INTERVAL",
+        "DEFAULT_COMMIT_SIZE"
+    ]
+
+#size (in bytes) after which a segmented file store starts a new segment file
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+DEFAULT_SPILL_DIRECTORY = os.path.join(tempfile.gettempdir(), "pypes-spill")
+#a write-ahead logged queue fsyncs at most once per interval (in seconds), or as soon as this many records are pending
+DEFAULT_COMMIT_INTERVAL = 0.005
+DEFAULT_COMMIT_SIZE = 1000
@@ -16,9 +16,9 @@ class ActorMeta(AsyncMeta):
 	def __new__(cls, name, bases, body):
 		force_derivative_funcs = ["consume"]
 		ignore_derivative_funcs = ["_Actor__connect_queue", "_Actor__register_consumer", "_Actor__loop_send", 
-		"_Actor__generate_split_id", "_Actor__consumer", "_Actor__try_spawn_consume", "_Actor__consume_pre_processing",
-		"_Actor__consume_post_processing", "_Actor__consume_wrapper", "_Actor__do_consume", "_Actor__send_event", "_Actor__send_error",
-		"_Actor__format_event", "_Actor__format_queues", "create_event", "connect_error_queue", "connect_log_queue", "connect_queue", 
+		"_Actor__generate_split_id", "_Actor__consumer", "_Actor__try_spawn_consume", "_Actor__try_spawn_consume_batch", "_Actor__dispatch", "_Actor__worker", "_Actor__consume_pre_processing",
+		"_Actor__consume_post_processing", "_Actor__consume_wrapper", "_Actor__do_consume", "_Actor__do_consume_batch", "_Actor__consume_batch", "_Actor__process_queue_full", "_Actor__send_event", "_Actor__send_error", "_Actor__send_generated",
+		"_Actor__format_event", "_Actor__format_queues", "_Actor__format_returns", "_fuse", "offload", "create_event", "connect_error_queue", "connect_log_queue", "connect_queue", 
 		"start", "stop"]
 
 		#force derivative implementations
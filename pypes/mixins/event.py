@@ -12,6 +12,8 @@ from decimal import Decimal
 from xml.parsers import expat
 
 from pypes.util.xpath import XPathLookup
+from pypes.util.stream import XMLStream
+from pypes.util.environment import HttpEnvironment
 from pypes.util.errors import InvalidEventConversion, ActorTimeout
 from pypes import import_restriction
 from pypes.globals.event import get_event_manager
@@ -39,6 +41,17 @@ class EventFormatMixin:
 class XMLEventFormatMixin(EventFormatMixin):
     _format_type = XMLType
 
+    @property
+    def data_stream(self):
+        '''The data as an XMLStream. Streams, strings and files assigned as data are streamed as is, without ever being
+        parsed into a tree, unless one was already built'''
+        value = self._data.value
+        if isinstance(value, XMLStream):
+            return value
+        if (isinstance(value, basestring) or hasattr(value, "read")) and self._data.cached(XMLType) is None:
+            return XMLStream(source=value)
+        return XMLStream(source=self.data)
+
 class JSONEventFormatMixin(EventFormatMixin):
     _format_type = JSONType
 
@@ -47,25 +60,36 @@ class StringEventFormatMixin(EventFormatMixin):
 
 class TimingEventMixin:
 
+    #the timing dict is only allocated once something is recorded
     def build_timing(self):
-        self._timing = dict()
+        try:
+            return self._timing
+        except AttributeError:
+            self._timing = dict()
+            return self._timing
+
+    def __get_timing(self):
+        try:
+            return self._timing
+        except AttributeError:
+            return {}
 
     #properties
     @property
     def elapsed(self):
-        return self._timing.get("elapsed", None)
+        return self.__get_timing().get("elapsed", None)
 
     @property
     def timeout(self):
-        return self._timing.get("timeout", None)
+        return self.__get_timing().get("timeout", None)
 
     @timeout.setter
     def timeout(self, timeout):
-        self._timing["timeout"] = timeout
+        self.build_timing()["timeout"] = timeout
     
     #internal funcs
     def __set_elapsed(self, timestamp):
-        self._timing["elapsed"] = self.__calc_elapsed(start=self.created, end=timestamp)
+        self.build_timing()["elapsed"] = self.__calc_elapsed(start=self.created, end=timestamp)
 
     def __calc_elapsed(self, start=None, end=None):
         if not start is None and not end is None:
@@ -78,26 +102,20 @@ class TimingEventMixin:
         return self.__calc_elapsed(start=self.get_started(actor_name=actor_name), end=self.get_ended(actor_name=actor_name))
 
     def get_started(self, actor_name):
-        return self._timing.get("actors", {}).get(actor_name, {}).get("started", None)
+        return self.__get_timing().get("actors", {}).get(actor_name, {}).get("started", None)
     
     def get_ended(self, actor_name):
-        return self._timing.get("actors", {}).get(actor_name, {}).get("ended", None)
+        return self.__get_timing().get("actors", {}).get(actor_name, {}).get("ended", None)
     
     def set_ended(self, actor_name, *args, **kwargs):
-        timestamp = timestamp()
-        self._timing["actors"] = self._timing.get("actors", {})
-        actor_obj = self._timing["actors"].get(actor_name, {})
-        actor_obj["ended"] = timestamp
-        self._timing["actors"][actor_name] = actor_obj
-        self.__set_elapsed(timestamp=timestamp)
+        now = timestamp()
+        self.build_timing().setdefault("actors", {}).setdefault(actor_name, {})["ended"] = now
+        self.__set_elapsed(timestamp=now)
 
     def set_started(self, actor_name, *args, **kwargs):
-        timestamp = timestamp()
-        self._timing["actors"] = self._timing.get("actors", {})
-        actor_obj = self._timing["actors"].get(actor_name, {})
-        actor_obj["started"] = timestamp
-        self._timing["actors"][actor_name] = actor_obj
-        self.__set_elapsed(timestamp=timestamp)
+        now = timestamp()
+        self.build_timing().setdefault("actors", {}).setdefault(actor_name, {})["started"] = now
+        self.__set_elapsed(timestamp=now)
 
     #misc funcs
     def timeout_check(self, *args, **kwargs):
@@ -107,7 +125,7 @@ class TimingEventMixin:
 
 class LogEventMixin:
 
-    def build_logging(self, log_level=logging.DEBUG, log_origin_actor=None, log_filename=DEFAULT_LOG_FILENAME, message="", *args, **kwargs):
+    def build_logging(self, log_level=logging.DEBUG, log_origin_actor=None, log_filename=DEFAULT_LOG_FILENAME, log_message="", *args, **kwargs):
         self._logging = {"time": datetime.now().strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]}
         self.log_level = log_level
         self.log_origin_actor = log_origin_actor
@@ -120,7 +138,7 @@ class LogEventMixin:
 
     @log_level.setter
     def log_level(self, level):
-        self._logging.set("level", level if isinstance(level, (logging.CRITICAL, logging.ERROR, logging.WARN, logging.INFO)) else logging.DEBUG)
+        self._logging["level"] = level if level in (logging.CRITICAL, logging.ERROR, logging.WARN, logging.INFO) else logging.DEBUG
 
     @property
     def log_origin_actor(self):
@@ -128,7 +146,7 @@ class LogEventMixin:
 
     @log_origin_actor.setter
     def log_origin_actor(self, actor):
-        self._logging.set("origin_actor", actor)
+        self._logging["origin_actor"] = actor
 
     @property
     def log_filename(self):
@@ -136,7 +154,7 @@ class LogEventMixin:
 
     @log_filename.setter
     def log_filename(self, actor):
-        self._logging.set("filename", actor)
+        self._logging["filename"] = actor
 
     @property
     def log_message(self):
@@ -144,67 +162,54 @@ class LogEventMixin:
 
     @log_message.setter
     def log_message(self, actor):
-        self._logging.set("message", actor)
+        self._logging["message"] = actor
 
     @property
     def log_time(self):
         return self._logging.get("time", None)
+
+    @log_time.setter
+    def log_time(self, logged):
+        #a timestamp, for messages that were logged before their event was built
+        self._logging["time"] = logged if isinstance(logged, basestring) else datetime.fromtimestamp(logged).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
     
 class HttpEventMixin:
 
+    #the environment is only allocated on first access, and its sections once they are accessed
     def build_environment(self, *args, **kwargs):
-        self._environment = {
-                "request": {
-                    "headers": {},
-                    "method": None,
-                    "url":{
-                        "scheme": None,
-                        "domain": None,
-                        "query": None,
-                        "path": None,
-                        "path_args": {},
-                        "query_args": {}
-                    }
-                },
-                "response": {
-                    "headers": {},
-                    "status": DEFAULT_STATUS_CODE
-                },
-                "remote": {
-                    "address": None,
-                    "port": None
-                },
-                "server": {
-                    "name": None,
-                    "port": None,
-                    "protocol": None
-                },
-                "accepted_methods": []
-            }
+        self._environment = HttpEnvironment()
 
     @property
     def environment(self):
-        return self._environment
+        try:
+            return self._environment
+        except AttributeError:
+            self.build_environment()
+            return self._environment
+
+    @environment.setter
+    def environment(self, environment):
+        self._environment = environment
     
     @property
     def request_headers(self):
-        return self._environment.get("request", {}).get("headers", {})
+        return self.environment.get("request", {}).get("headers", {})
 
     @request_headers.setter
     def request_headers(self, headers):
-        self._environment["request"]["headers"] = headers
+        self.environment["request"]["headers"] = headers
 
     @property
     def response_headers(self):
-        return self._environment.get("response", {}).get("headers", {})
+        return self.environment.get("response", {}).get("headers", {})
 
     @response_headers.setter
     def response_headers(self, headers):
-        self._environment["response"]["headers"] = headers
+        self.environment["response"]["headers"] = headers
 
     @property
     def status(self):
-        return self._environment["response"]["status"]
+        return self.environment["response"]["status"]
 
     @status.setter
     def status(self, status):
@@ -215,7 +220,7 @@ class HttpEventMixin:
         except KeyError, AttributeError:
             raise InvalidEventModification("Unrecognized status code")
         else:
-            self._environment["response"]["status"] = status
+            self.environment["response"]["status"] = status
 
     def _set_error(self, exception):
         if exception is not None:
@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import collections
+import json
+import struct
+
+from lxml import etree
+
+import pypes.event
+import pypes.util.errors
+from pypes.event import BaseEvent
+from pypes.util.event import EventData, XMLType, JSONType, StringType, DefaultType, _decimal_default
+from pypes.util.stream import XMLStream
+from pypes.util.errors import EventCodecError, PypesException
+from pypes.globals.event import get_event_manager
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "EventCodec",
+        "CODEC_VERSION"
+    ]
+
+CODEC_VERSION = 1
+
+class EventCodec(object):
+    """
+    **Encodes events to a versioned binary format, without pickle**
+
+    An encoded event is made of three frames:
+        header:     magic, version, format type, payload kind, created, then the event class, id and service
+        metadata:   every other event attribute as JSON (timing, logging, environment, error, splits...)
+        payload:    the event data in its native string form (raw bytes, utf-8 text, serialized XML or JSON)
+
+    encode_frames/decode_frames work on the frames themselves, so that they can be sent as a zmq multipart message
+    without copying the payload. encode/decode join them into a single length-prefixed buffer.
+
+    Only event classes from pypes.event and exceptions from pypes.util.errors are ever instantiated when decoding, and
+    XML is parsed without entity resolution, so decoding data from another trust domain is safe.
+    """
+
+    __magic = "PYEV"
+    __header = struct.Struct(">4sBBBd")
+    __string_length = struct.Struct(">H")
+    __frame_length = struct.Struct(">I")
+
+    __format_types = {DefaultType: 0, XMLType: 1, JSONType: 2, StringType: 3}
+
+    PAYLOAD_NONE, PAYLOAD_BYTES, PAYLOAD_TEXT, PAYLOAD_XML, PAYLOAD_JSON = range(5)
+
+    __core_attributes = ("_data", "_event_id", "_service", "_created")
+    __xml_key = "__pypes_xml__"
+    __error_key = "__pypes_error__"
+
+    __parser = etree.XMLParser(resolve_entities=False, no_network=True)
+
+    def __encode_payload(self, event):
+        data = event._data.value
+        if data is None:
+            return EventCodec.PAYLOAD_NONE, ""
+        if isinstance(data, str):
+            return EventCodec.PAYLOAD_BYTES, data
+        if isinstance(data, unicode):
+            return EventCodec.PAYLOAD_TEXT, data.encode("utf-8")
+        if isinstance(data, XMLStream):
+            return EventCodec.PAYLOAD_BYTES, data.read()
+        if get_event_manager().is_xml_type(clazz=data.__class__):
+            return EventCodec.PAYLOAD_XML, get_event_manager().get_data_string(data=event._data, format_type=XMLType)
+        return EventCodec.PAYLOAD_JSON, self.__dumps(data)
+
+    def __decode_payload(self, kind, payload):
+        if kind == EventCodec.PAYLOAD_NONE:
+            return None
+        if kind == EventCodec.PAYLOAD_BYTES:
+            return payload
+        if kind == EventCodec.PAYLOAD_TEXT:
+            return payload.decode("utf-8")
+        if kind == EventCodec.PAYLOAD_XML:
+            return etree.fromstring(payload, parser=EventCodec.__parser)
+        if kind == EventCodec.PAYLOAD_JSON:
+            return self.__loads(payload)
+        raise EventCodecError("Unknown payload kind {0}".format(kind))
+
+    def __default(self, value):
+        if get_event_manager().is_xml_type(clazz=value.__class__):
+            return {EventCodec.__xml_key: etree.tostring(value)}
+        if isinstance(value, PypesException):
+            return {EventCodec.__error_key: value.__class__.__name__, "message": value.message}
+        if isinstance(value, collections.Mapping):
+            #lazily built mappings, such as HttpEnvironment, are only built in full here
+            return dict(value.iteritems())
+        #Decimals are encoded as floats, as EventManager serializes them
+        return _decimal_default(value)
+
+    def __object_hook(self, obj):
+        if EventCodec.__xml_key in obj:
+            return etree.fromstring(obj[EventCodec.__xml_key], parser=EventCodec.__parser)
+        if EventCodec.__error_key in obj:
+            error_class = getattr(pypes.util.errors, obj[EventCodec.__error_key], None)
+            if not isinstance(error_class, type) or not issubclass(error_class, PypesException):
+                error_class = PypesException
+            return error_class(message=obj["message"])
+        return obj
+
+    def __dumps(self, value):
+        try:
+            return json.dumps(value, default=self.__default, separators=(",", ":"))
+        except (TypeError, ValueError) as err:
+            raise EventCodecError("Unable to encode event: {0}".format(err))
+
+    def __loads(self, value):
+        return json.loads(value, object_hook=self.__object_hook)
+
+    def __pack_string(self, value):
+        value = "" if value is None else value.encode("utf-8") if isinstance(value, unicode) else str(value)
+        return EventCodec.__string_length.pack(len(value)) + value
+
+    def __unpack_strings(self, frame, offset, count):
+        strings = []
+        for _ in xrange(count):
+            length, = EventCodec.__string_length.unpack_from(frame, offset)
+            offset += EventCodec.__string_length.size
+            strings.append(frame[offset:offset + length])
+            offset += length
+        return strings
+
+    def encode_frames(self, event):
+        '''Returns the [header, metadata, payload] frames of <event>'''
+        kind, payload = self.__encode_payload(event=event)
+        metadata = dict((key, value) for key, value in event._get_state().iteritems() if not key in EventCodec.__core_attributes)
+        header = EventCodec.__header.pack(EventCodec.__magic, CODEC_VERSION, EventCodec.__format_types.get(event._format_type, 0), kind, event.created or 0.0)
+        header += self.__pack_string(event.__class__.__name__) + self.__pack_string(event.event_id) + self.__pack_string(event.service)
+        return [header, self.__dumps(metadata), payload]
+
+    def decode_frames(self, frames):
+        '''Rebuilds an event from the frames produced by encode_frames'''
+        try:
+            header, metadata, payload = frames
+            magic, version, format_type, kind, created = EventCodec.__header.unpack_from(header)
+        except (ValueError, struct.error):
+            raise EventCodecError("Malformed event frames")
+        if magic != EventCodec.__magic or version != CODEC_VERSION:
+            raise EventCodecError("Unsupported event encoding (version {0})".format(version))
+        class_name, event_id, service = self.__unpack_strings(frame=header, offset=EventCodec.__header.size, count=3)
+        event_class = getattr(pypes.event, class_name, None)
+        if not isinstance(event_class, type) or not issubclass(event_class, BaseEvent):
+            raise EventCodecError("Unknown event class '{0}'".format(class_name))
+
+        try:
+            state = dict((str(key), value) for key, value in self.__loads(metadata).iteritems())
+            data = self.__decode_payload(kind=kind, payload=payload)
+        except (ValueError, etree.XMLSyntaxError) as err:
+            raise EventCodecError("Malformed event frames: {0}".format(err))
+        owned_format = event_class._format_type if kind == EventCodec.PAYLOAD_JSON and event_class._format_type is JSONType else None
+        state.update(_data=EventData(value=data, format_type=owned_format), _event_id=event_id, _service=service or None, _created=created)
+        event = object.__new__(event_class)
+        event._set_state(state=state)
+        return event
+
+    def encode(self, event):
+        '''Returns <event> encoded as a single buffer'''
+        return "".join(EventCodec.__frame_length.pack(len(frame)) + frame for frame in self.encode_frames(event=event))
+
+    def decode(self, data):
+        '''Rebuilds an event from the buffer produced by encode'''
+        frames, offset = [], 0
+        try:
+            while offset < len(data):
+                length, = EventCodec.__frame_length.unpack_from(data, offset)
+                offset += EventCodec.__frame_length.size
+                frames.append(data[offset:offset + length])
+                offset += length
+        except struct.error:
+            raise EventCodecError("Malformed event buffer")
+        return self.decode_frames(frames=frames)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+import collections
+import urlparse
+from copy import deepcopy
+
+from pypes import import_restriction
+from pypes.globals.event import DEFAULT_STATUS_CODE
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "LazyMapping",
+        "WSGIHeaders",
+        "HttpEnvironment"
+    ]
+
+class LazyMapping(collections.MutableMapping):
+    """
+    **A mapping whose values are only built once they are first accessed**
+
+    Every key of <builders> maps to the callable building its value. Values that are set replace their builder, and
+    deleted keys are dropped without being built. Copies keep the values that were not built yet lazy, while pickling
+    and str() take a snapshot of every value.
+
+    Parameters:
+        builders (dict):
+            | The callables building the value of each key
+    """
+
+    def __init__(self, builders):
+        self.__builders = dict(builders)
+        self.__values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self.__values[key]
+        except KeyError:
+            builder = self.__builders.pop(key)
+            value = self.__values[key] = builder()
+            return value
+
+    def __setitem__(self, key, value):
+        self.__builders.pop(key, None)
+        self.__values[key] = value
+
+    def __delitem__(self, key):
+        if self.__builders.pop(key, None) is None:
+            del self.__values[key]
+
+    def __iter__(self):
+        for key in self.__values.keys() + self.__builders.keys():
+            yield key
+
+    def __len__(self):
+        return len(self.__values) + len(self.__builders)
+
+    def __contains__(self, key):
+        return key in self.__values or key in self.__builders
+
+    @property
+    def built(self):
+        '''The keys whose values have been built or set so far'''
+        return self.__values.keys()
+
+    def snapshot(self):
+        '''Returns every value, built and nested lazy mappings included, as plain dicts'''
+        return dict((key, value.snapshot() if hasattr(value, "snapshot") else value) for key, value in self.iteritems())
+
+    def __deepcopy__(self, memo):
+        copy = self.__class__.__new__(self.__class__)
+        copy.__builders = dict(self.__builders)
+        copy.__values = deepcopy(self.__values, memo)
+        return copy
+
+    def __reduce__(self):
+        return (dict, (self.snapshot(),))
+
+    def __repr__(self):
+        return repr(self.snapshot())
+
+class WSGIHeaders(collections.MutableMapping):
+    """
+    **The request headers of a WSGI environ, read from the environ on access**
+
+    Header names are case insensitive. The headers are copied out of the environ, which is never modified, on the first
+    write.
+
+    Parameters:
+        environ (dict):
+            | The WSGI environ of the request
+    """
+
+    __unprefixed = ("CONTENT_TYPE", "CONTENT_LENGTH")
+
+    def __init__(self, environ):
+        self.__environ = environ
+        self.__headers = None
+
+    def __key(self, name):
+        key = name.replace("-", "_").upper()
+        return key if key in WSGIHeaders.__unprefixed else "HTTP_" + key
+
+    def __name(self, name):
+        return name.replace("_", "-").title()
+
+    def __materialize(self):
+        if self.__headers is None:
+            self.__headers = dict(self.iteritems())
+        return self.__headers
+
+    def __getitem__(self, name):
+        if self.__headers is None:
+            return self.__environ[self.__key(name)]
+        return self.__headers[self.__name(name)]
+
+    def __setitem__(self, name, value):
+        self.__materialize()[self.__name(name)] = value
+
+    def __delitem__(self, name):
+        del self.__materialize()[self.__name(name)]
+
+    def __iter__(self):
+        if not self.__headers is None:
+            for name in self.__headers.keys():
+                yield name
+            return
+        for key in self.__environ.keys():
+            if key.startswith("HTTP_"):
+                yield self.__name(key[5:])
+            elif key in WSGIHeaders.__unprefixed:
+                yield self.__name(key)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __contains__(self, name):
+        if self.__headers is None:
+            return self.__key(name) in self.__environ
+        return self.__name(name) in self.__headers
+
+    def snapshot(self):
+        return dict(self.iteritems())
+
+    def __deepcopy__(self, memo):
+        copy = WSGIHeaders(environ=self.__environ)
+        copy.__headers = deepcopy(self.__headers, memo)
+        return copy
+
+    def __reduce__(self):
+        return (dict, (self.snapshot(),))
+
+    def __repr__(self):
+        return repr(self.snapshot())
+
+class HttpEnvironment(LazyMapping):
+    """
+    **The environment of an HTTP event, built section by section as it is accessed**
+
+    The sections are those HTTP events have always held (request, response, remote, server and accepted_methods). When
+    created for a request, they are read from its WSGI environ only once accessed, URL and query included, the way
+    Bottle parses them. Request headers are read from the environ header by header (see WSGIHeaders).
+
+    Parameters:
+        environ (Optional[dict]):
+            | The WSGI environ of the request. Without it, every section holds its defaults
+        accepted_methods (Optional[list]):
+            | The methods accepted by the route of the request
+    """
+
+    def __init__(self, environ=None, accepted_methods=None):
+        self.__environ = {} if environ is None else environ
+        self.__accepted_methods = accepted_methods
+        super(HttpEnvironment, self).__init__(builders={
+            "request": self.__build_request,
+            "response": self.__build_response,
+            "remote": self.__build_remote,
+            "server": self.__build_server,
+            "accepted_methods": self.__build_accepted_methods
+        })
+
+    def __deepcopy__(self, memo):
+        copy = super(HttpEnvironment, self).__deepcopy__(memo)
+        copy.__environ, copy.__accepted_methods = self.__environ, self.__accepted_methods
+        return copy
+
+    def __build_request(self):
+        if not self.__environ:
+            return {"headers": {}, "method": None, "url": self.__build_url()}
+        return LazyMapping(builders={
+            "headers": lambda: WSGIHeaders(environ=self.__environ),
+            "method": lambda: self.__environ.get("REQUEST_METHOD", None),
+            "url": self.__build_url
+        })
+
+    def __build_url(self):
+        if not self.__environ:
+            return {"scheme": None, "domain": None, "query": None, "path": None, "path_args": {}, "query_args": {}}
+        return LazyMapping(builders={
+            "scheme": lambda: self.__urlparts().scheme,
+            "domain": lambda: self.__urlparts().netloc,
+            "query": lambda: self.__urlparts().query,
+            "path": lambda: self.__environ.get("PATH_INFO", None),
+            "path_args": lambda: dict(self.__environ.get("route.url_args", {})),
+            "query_args": self.__build_query_args
+        })
+
+    def __urlparts(self):
+        #the Bottle request stored in the environ is local to the greenlet that served the request, so only what it
+        #cached in the environ is used
+        urlparts = self.__environ.get("bottle.request.urlparts", None)
+        if urlparts is None:
+            scheme = self.__environ.get("HTTP_X_FORWARDED_PROTO", None) or self.__environ.get("wsgi.url_scheme", "http")
+            host = self.__environ.get("HTTP_X_FORWARDED_HOST", None) or self.__environ.get("HTTP_HOST", None)
+            if not host:
+                host, port = self.__environ.get("SERVER_NAME", "127.0.0.1"), self.__environ.get("SERVER_PORT", None)
+                if port and port != ("80" if scheme == "http" else "443"):
+                    host += ":" + port
+            urlparts = urlparse.SplitResult(scheme, host, self.__environ.get("PATH_INFO", ""), self.__environ.get("QUERY_STRING", ""), "")
+        return urlparts
+
+    def __build_query_args(self):
+        return dict(urlparse.parse_qsl(self.__environ.get("QUERY_STRING", ""), keep_blank_values=True))
+
+    def __build_response(self):
+        return {"headers": {}, "status": DEFAULT_STATUS_CODE}
+
+    def __build_remote(self):
+        return {"address": self.__environ.get("REMOTE_ADDR", None), "port": self.__environ.get("REMOTE_PORT", None)}
+
+    def __build_server(self):
+        return {"name": self.__environ.get("SERVER_NAME", None), "port": self.__environ.get("SERVER_PORT", None),
+            "protocol": self.__environ.get("SERVER_PROTOCOL", None)}
+
+    def __build_accepted_methods(self):
+        return list(self.__accepted_methods or [])
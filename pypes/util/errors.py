@@ -30,7 +30,8 @@ if __name__.startswith(import_restriction):
         "UnprocessableEventData",
         "EventRateExceeded",
         "ServiceUnavailable",
-        "EventAttributeError"
+        "EventAttributeError",
+        "EventCodecError"
     ]
 
 class PypesException(Exception):
@@ -152,4 +153,11 @@ class ServiceUnavailable(PypesException):
 
 class EventAttributeError(PypesException):
     """**An event attribute necessary to the proper processing of the event was missing**"""
-    pass
\ No newline at end of file
+    pass
+
+
+class EventCodecError(PypesException):
+    """**An event could not be encoded to, or decoded from, the binary event format**"""
+
+    def __str__(self):
+        return "; ".join(str(message) for message in self.message)
@@ -1,10 +1,17 @@
 #!/usr/bin/env python
 import collections
+import functools
+import itertools
 import json
+import os
+from copy import deepcopy
+from decimal import Decimal
 from lxml import etree
 
 from pypes import import_restriction
 from pypes.util.errors import InvalidEventDataModification, InvalidEventConversion
+from pypes.util.xmljson import XMLJSONConverter
+from pypes.util.stream import XMLStream
 '''
 __all__ = []
 
@@ -14,38 +21,267 @@ if __name__.startswith(import_restriction):
         "get_conversion_methods"
     ]
 '''
+class IDGenerator(object):
+    """
+    **Generates event ids from a random per-process prefix and a counter**
+
+    The prefix is 64 random bits, so ids stay unique across processes and nodes without calling uuid4 for every
+    event. It is regenerated as soon as the generator is used in a forked child.
+    """
+
+    def __init__(self):
+        self.__reset()
+
+    def __reset(self):
+        self.__pid = os.getpid()
+        self.__prefix = os.urandom(8).encode("hex")
+        self.__counter = itertools.count()
+
+    def next(self):
+        if os.getpid() != self.__pid:
+            self.__reset()
+        return "%s%016x" % (self.__prefix, next(self.__counter))
+
 #event data type definitions
 class JSONType: pass
 class XMLType: pass
 class StringType: pass
 class DefaultType: pass
 
-class EventManager:
+class EventData(object):
+    """**Event data held in the representation it was assigned in, converted to other representations on demand**
+
+    Each derived representation is cached until the data changes. Handing out a mutable representation (a dict or an
+    XML tree) for an event to modify counts as a change: it becomes the data itself and every other cached
+    representation is dropped. Forked events share a single EventData, which is only copied once one of them asks
+    for a mutable representation. The last holder to do so receives the data itself, and copies keep the
+    representation they were copied from, so they are not converted again. Immutable representations (strings and
+    numbers) are never copied.
+
+    Parameters:
+        value (object):
+            | The event data, in any supported representation
+        references (Optional[int]):
+            | The number of events currently holding this data
+            | Default: 1
+        format_type (Optional[class]):
+            | The format <value> is already a private representation of, if any. It is then never converted to it
+            | Default: None
+    """
+
+    __immutable_types = (basestring, int, long, float, bool, type(None))
+
+    def __init__(self, value, references=1, format_type=None):
+        self.value = value
+        self.references = references
+        self.__cache = {} if format_type is None else {format_type: value}
+
+    def get(self, format_type, convert):
+        '''Returns the <format_type> representation for reading only. <convert> builds it from the data if not cached'''
+        if format_type is DefaultType:
+            return self.value
+        try:
+            return self.__cache[format_type]
+        except KeyError:
+            representation = self.__cache[format_type] = convert(self.value)
+            return representation
+
+    def cached(self, format_type):
+        '''Returns the <format_type> representation if it has been built, None otherwise'''
+        return self.__cache.get(format_type, None)
+
+    def get_string(self, format_type, convert, stringify):
+        '''Returns the <format_type> representation serialized by <stringify>'''
+        key = (format_type, StringType)
+        try:
+            return self.__cache[key]
+        except KeyError:
+            string = self.__cache[key] = stringify(self.get(format_type=format_type, convert=convert))
+            return string
+
+    @staticmethod
+    def mutable(representation):
+        '''Returns whether <representation> can be modified in place by the holder it is checked out to'''
+        return not isinstance(representation, EventData.__immutable_types)
+
+    def checkout(self, format_type, convert):
+        '''Returns the <format_type> representation to a holder that may modify it'''
+        representation = self.get(format_type=format_type, convert=convert)
+        if EventData.mutable(representation):
+            self.value = representation
+            self.__cache = {format_type: representation}
+        return representation
+
+    def release(self):
+        '''Gives up one holder's share. Returns the EventData that holder now owns alone'''
+        self.references -= 1
+        if self.references > 0:
+            return self.__copy(value=deepcopy(self.value))
+        self.references = 1
+        return self
+
+    def __copy(self, value):
+        data = EventData(value=value)
+        for key, cached in self.__cache.iteritems():
+            if cached is self.value:
+                data.__cache[key] = value
+            elif isinstance(cached, basestring):
+                data.__cache[key] = cached
+        return data
+
+    def __deepcopy__(self, memo):
+        return self.__copy(value=deepcopy(self.value, memo))
+
+def _decimal_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    raise TypeError("{0} is not JSON serializable".format(type(obj)))
+
+_json_scalar_types = (basestring, int, long, float, bool, type(None))
+_json_keys = {True: "true", False: "false", None: "null"}
+
+def _json_key(key):
+    if isinstance(key, basestring):
+        return key
+    if isinstance(key, bool) or key is None:
+        return _json_keys[key]
+    if isinstance(key, (int, long)):
+        return str(key)
+    if isinstance(key, float):
+        return repr(key)
+    raise TypeError("JSON keys must be strings, not {0}".format(type(key)))
+
+def _copy_json(value):
+    '''Returns a structural copy of <value> with the types json.loads(json.dumps(value)) would give, without serializing'''
+    if isinstance(value, _json_scalar_types):
+        return value
+    if isinstance(value, dict):
+        copy = collections.OrderedDict() if isinstance(value, collections.OrderedDict) else {}
+        for key, item in value.iteritems():
+            copy[_json_key(key)] = item if isinstance(item, _json_scalar_types) else _copy_json(item)
+        return copy
+    if isinstance(value, (list, tuple)):
+        return [item if isinstance(item, _json_scalar_types) else _copy_json(item) for item in value]
+    return _decimal_default(value)
+
+def _validate_json(value):
+    '''Checks that <value> is JSON compatible without copying it. Decimals, tuples and non string keys are replaced in place'''
+    if isinstance(value, _json_scalar_types):
+        return value
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if not isinstance(key, basestring):
+                del value[key]
+                key = _json_key(key)
+                value[key] = item
+            if not isinstance(item, _json_scalar_types):
+                value[key] = _validate_json(item)
+        return value
+    if isinstance(value, list):
+        for index, item in enumerate(value):
+            if not isinstance(item, _json_scalar_types):
+                value[index] = _validate_json(item)
+        return value
+    if isinstance(value, tuple):
+        return [_validate_json(item) for item in value]
+    return _decimal_default(value)
+
+_xml_json_converter = XMLJSONConverter()
+
+class ConversionPlan(object):
+    """**A precomputed conversion between two event classes**
+
+    The data is converted from its representation in the format of <source>. The converted event takes over the
+    EventData of the original, so the representation built while converting is not rebuilt on access.
+
+    Parameters:
+        source (class):
+            | The event class being converted from
+        target (class):
+            | The event class being converted to
+        convert_data (Optional[func]):
+            | Converts event data to the format of <target>. None if <source> is already compatible with <target>
+            | Default: None
+        convert_source (Optional[func]):
+            | Converts event data to the format of <source>
+            | Default: None
+    """
+
+    def __init__(self, source, target, convert_data=None, convert_source=None):
+        self.source = source
+        self.target = target
+        self.__convert_data = convert_data
+        self.__convert_source = convert_source
+
+    @property
+    def compatible(self):
+        return self.__convert_data is None
+
+    def convert(self, event):
+        if self.compatible:
+            return event
+        try:
+            if not self.__convert_source is None:
+                event._data.checkout(format_type=self.source._format_type, convert=self.__convert_source)
+            event._data.get(format_type=self.target._format_type, convert=self.__convert_data)
+            new_event = self.target.__new__(cls=self.target)
+            new_event._set_state(state=event._get_state())
+        except Exception as err:
+            raise InvalidEventConversion("Unable to convert event. <Attempted {old} -> {new}>".format(old=self.source, new=self.target))
+        return new_event
+
+class EventManager(object):
+    """**Converts event data between formats and builds the conversion plans between event classes**
+
+    Parameters:
+        json_assignment (Optional[str]):
+            | How dicts and lists assigned to JSON events are made into their JSON representation
+            |   serialize:  a json.dumps/json.loads round trip
+            |   copy:       a structural copy, checked for JSON compatibility as it is built
+            |   validate:   checked for JSON compatibility in place. The event takes ownership of the value
+            | In every mode Decimals become floats. Representations the event data already owns, such as copies made
+            | for forked events or decoded payloads, are never converted again
+            | Default: "copy"
+    """
+
+    JSON_SERIALIZE = "serialize"
+    JSON_COPY = "copy"
+    JSON_VALIDATE = "validate"
+
     __XML_TYPES = [etree._Element, etree._ElementTree, etree._XSLTResultTree]
     __JSON_TYPES = [dict, list, collections.OrderedDict]
 
-    __pypes_xml_wrapper_key = "pypes_conversion_wrapper"
-    __pypes_json_type_key = "@pypes_json_type"
-
-    __xml_conversion_methods = {str: lambda data: etree.fromstring(data)}
+    __xml_conversion_methods = dict.fromkeys((str, unicode), lambda data: etree.fromstring(data))
     __xml_conversion_methods.update(dict.fromkeys(__XML_TYPES, lambda data: data))
-    __xml_conversion_methods.update(dict.fromkeys(__JSON_TYPES, lambda data: etree.fromstring(xmltodict.unparse(self.__internal_xmlify(data)).encode('utf-8'))))
-    __xml_conversion_methods.update({None.__class__: lambda data: etree.fromstring("<%s/>" % __pypes_xml_wrapper_key)})
-    __json_conversion_methods = {str: lambda data: json.loads(data)}
-    __json_conversion_methods.update(dict.fromkeys(__JSON_TYPES, lambda data: json.loads(json.dumps(data, default=self.__decimal_default))))
-    __json_conversion_methods.update(dict.fromkeys(__XML_TYPES, lambda data: self.__remove_internal_xmlify(xmltodict.parse(etree.tostring(data), expat=expat))))
+    __xml_conversion_methods.update(dict.fromkeys(__JSON_TYPES, lambda data: _xml_json_converter.to_xml(data=data)))
+    __xml_conversion_methods.update({None.__class__: lambda data: etree.Element(XMLJSONConverter.WRAPPER_KEY)})
+    __xml_conversion_methods.update({XMLStream: lambda data: data.parse()})
+    __json_conversion_methods = dict.fromkeys((str, unicode), lambda data: json.loads(data))
+    __json_conversion_methods.update(dict.fromkeys(__XML_TYPES, lambda data: _xml_json_converter.to_json(data=data)))
     __json_conversion_methods.update({None.__class__: lambda data: {}})
-    __string_conversion_methods = {str: lambda data: data}
-    __string_conversion_methods.update(dict.fromkeys(__JSON_TYPES, lambda data: json.dumps(data, default=self.__decimal_default)))
+    __json_conversion_methods.update({XMLStream: lambda data: _xml_json_converter.to_json(data=data.parse())})
+    __string_conversion_methods = dict.fromkeys((str, unicode), lambda data: data)
+    __string_conversion_methods.update(dict.fromkeys(__JSON_TYPES, lambda data: json.dumps(data, default=_decimal_default)))
     __string_conversion_methods.update(dict.fromkeys(__XML_TYPES, lambda data: etree.tostring(data)))
     __string_conversion_methods.update({None.__class__: lambda data: ""})
+    __string_conversion_methods.update({XMLStream: lambda data: data.read()})
     __default_conversion_methods = collections.defaultdict(lambda: lambda data: data)
 
     convert_to_xml = lambda self, value: self.__xml_conversion_methods[value.__class__](data=value)
-    convert_to_json = lambda self, value: self.__json_conversion_methods[value.__class__](data=value)
     convert_to_string = lambda self, value: self.__string_conversion_methods[value.__class__](data=value)
     convert_to_default = lambda self, value: self.__default_conversion_methods[value.__class__](data=value)
 
+    def convert_to_json(self, value):
+        if value.__class__ in EventManager.__JSON_TYPES:
+            return self.__assign_json(value)
+        return self.__json_conversion_methods[value.__class__](data=value)
+
+    __json_assignments = {
+        JSON_SERIALIZE: lambda data: json.loads(json.dumps(data, default=_decimal_default)),
+        JSON_COPY: _copy_json,
+        JSON_VALIDATE: _validate_json
+    }
+
     __conversion_types = {
         JSONType: convert_to_json,
         XMLType: convert_to_xml,
@@ -64,114 +300,66 @@ class EventManager:
         return None
 
     def stringify(self, new_value):
-        self.convert_to_string(value=new_value)
+        return self.convert_to_string(value=new_value)
 
     def ensure_formating(self, event, new_value):
+        return self.convert_format(format_type=event._format_type, value=new_value)
+
+    def convert_format(self, format_type, value):
         try:
-            return self.__conversion_types[event._format_type](self=self, value=new_value)
+            return self.__conversion_types[format_type](self=self, value=value)
         except KeyError:
-            raise InvalidEventDataModification("Data of type '{_type}' was not valid for event type {cls}: {err}".format(_type=type(data), cls=self.__class__, err=traceback.format_exc()))
+            raise InvalidEventDataModification("Data of type '{_type}' was not valid for format {format}".format(_type=type(value), format=format_type.__name__))
         except ValueError as err:
             raise InvalidEventDataModification("Malformed data: {err}".format(err=err))
         except Exception as err:
             raise InvalidEventDataModification("Unknown error occurred on modification: {err}".format(err=err))
 
+    def get_data_string(self, data, format_type):
+        '''Returns the <format_type> representation of <data>, an EventData, as a string'''
+        return data.get_string(format_type=format_type, convert=self.__converters[format_type], stringify=self.__converters[StringType])
+
+    def get_converter(self, format_type):
+        '''Returns a function converting a value to the representation of <format_type>'''
+        return self.__converters[format_type]
+
+    def __init__(self, json_assignment=JSON_COPY):
+        self.json_assignment = json_assignment
+        self.__conversion_plans = {}
+        self.__converters = dict((format_type, functools.partial(self.convert_format, format_type)) for format_type in self.__conversion_types)
+
+    @property
+    def json_assignment(self):
+        return self.__json_assignment
+
+    @json_assignment.setter
+    def json_assignment(self, mode):
+        try:
+            self.__assign_json = self.__json_assignments[mode]
+        except KeyError:
+            raise ValueError("Unknown JSON assignment mode '{0}'".format(mode))
+        self.__json_assignment = mode
+
+    def get_conversion_plan(self, source, target):
+        key = (source, target)
+        try:
+            return self.__conversion_plans[key]
+        except KeyError:
+            plan = self.__conversion_plans[key] = self.__build_conversion_plan(source=source, target=target)
+            return plan
+
+    def __build_conversion_plan(self, source, target):
+        for base in target.__bases__:
+            if not issubclass(source, base):
+                return ConversionPlan(source=source, target=target, convert_data=self.get_converter(format_type=target._format_type),
+                    convert_source=self.get_converter(format_type=source._format_type))
+        return ConversionPlan(source=source, target=target)
+
     def convert(self, event, convert_to):
-        if not self.is_instance(event=event, convert_to=convert_to):
-            try:
-                new_event = convert_to.__new__(cls=convert_to)
-                new_event.__dict__.update(event.__dict__)
-                new_event.data = event.data
-            except Exception as err:
-                raise InvalidEventConversion("Unable to convert event. <Attempted {old} -> {new}>".format(old=event.__class__, new=convert_to))
-            else:
-                return new_event
-        return event
+        return self.get_conversion_plan(source=event.__class__, target=convert_to).convert(event=event)
 
     def is_instance(self, event, convert_to):
-        for base in convert_to.__bases__:
-            if not issubclass(event.__class__, base):
-                return False
-        return True
-
-    def __internal_xmlify(self, _json):
-        if isinstance(_json, dict) and len(_json) == 0:
-            _json = {self.__compy_wrapper_key: {}}
-        if isinstance(_json, list) or len(_json) > 1:
-            _json = {self.__compy_wrapper_key: _json}
-        _, value = next(iter(_json.items()))
-        if isinstance(value, list):
-            _json = {self.__compy_wrapper_key: _json}
-        return _json
-
-    def __remove_internal_xmlify(self, _json):
-        if len(_json) == 1 and isinstance(_json, dict):
-            key, value = next(iter(_json.items()))
-            if key == self.__compy_wrapper_key:
-                _json = value
-        self.__json_conversion_crawl(_json)
-        return _json
-
-    def __json_get_value_of_dict(self, dict_obj):
-        text = dict_obj.get(EventManager.__xml_to_json_attr_key, None)
-        if text is None or len(dict_obj) > 1:
-            return dict_obj
-        else:
-            return text
-
-    def __json_conversion_crawl_nested(self, _json):
-        if isinstance(_json, dict):
-            for key, value in _json.items():
-                _json[key] = self.__json_conversion_crawl_nested(_json=value)
-            json_type = _json.pop(self.__compy_json_type_key, None)
-            if json_type == "list":
-                new_obj = self.__json_get_value_of_dict(dict_obj=_json)
-                if new_obj is None or (isinstance(new_obj, dict) and len(new_obj) == 0):
-                    return []
-                return [new_obj]
-            elif json_type == "string":
-                new_value = self.__json_get_value_of_dict(dict_obj=value)
-                if isinstance(new_value, (dict, list)):
-                    return json.dumps(new_value)
-                else:
-                    return new_value
-            elif json_type == "dict":
-                return _json
-            elif json_type is not None:
-                return None
-            return _json
-        elif isinstance(_json, list):
-            for index, value in enumerate(_json):
-                if isinstance(value, dict):
-                    for key, sub_value in value.items():
-                        value[key] = self.__json_conversion_crawl_nested(_json=sub_value)
-                    json_type = value.pop(self.__compy_json_type_key, None)
-                    if json_type == "list":
-                        _json[index] = self.__json_get_value_of_dict(dict_obj=value)
-                    elif json_type == "string":
-                        new_value = self.__json_get_value_of_dict(dict_obj=value)
-                        if isinstance(new_value, (dict, list)):
-                            _json[index] = json.dumps(new_value)
-                        else:
-                            _json[index] = new_value
-                    elif json_type == "dict":
-                        _json[index] = None
-                    else:
-                        _json[index] = value
-                else:
-                    _json[index] = self.__json_conversion_crawl_nested(_json=value)
-        return _json
-
-    def __json_conversion_crawl(self, _json):
-        if isinstance(_json, dict):
-            for key, value in _json.items():
-                _json[key] = self.__json_conversion_crawl_nested(_json=value)
-        return _json
-
-    def __decimal_default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        raise TypeError
+        return self.get_conversion_plan(source=event.__class__, target=convert_to).compatible
 
     def get_timestamp(self):
         return time.time()
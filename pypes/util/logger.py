@@ -1,17 +1,24 @@
 #!/usr/bin/env python
 
 import logging
+import traceback
 
-from pypes.util.queue import InternalQueuePool
+import gevent
+
+from pypes.util.queue import InternalQueuePool, RingQueue
 from pypes.event import LogEvent
 from pypes.util.errors import QueueFull
+from pypes.util.async import timestamp
+from pypes.globals.async import DEFAULT_BATCH_SIZE
+from pypes.globals.logger import DEFAULT_LOG_LEVEL, DEFAULT_LOG_BUFFER_SIZE
 from pypes import import_restriction
 
 __all__ = []
 
 if __name__.startswith(import_restriction):
     __all__ += [
-        "Logger"
+        "Logger",
+        "LogSink"
     ]
 
 class Logger(object):
@@ -21,24 +28,69 @@ class Logger(object):
     We use a pool in order to support multiple logging types per process. For example, sending to a third party log
     aggregator as WELL as using a filelogger
 
+    Messages below the level of the logger are dropped before they are formatted or a LogEvent is built. Messages may
+    be a callable returning the message, or a format string that is only formatted with the remaining keyword arguments
+    once the message passes the level. Messages logged with a sample_interval (in seconds) are sent at most once per
+    interval, along with the number of messages from the same call that were dropped in between.
+
     Args:
         - name(str):
             | The name to use when sending log events
         - queue_pool(InternalQueuePool):
             | The pool to use when sending log events
+        - level(Optional[int]):
+            | The lowest level that is sent. Defaults to DEFAULT_LOG_LEVEL while unset
+        - sink(Optional[LogSink]):
+            | If set, messages are handed to the sink instead of being sent to the pool
     """
 
-    def __init__(self, name, queue_pool):
+    def __init__(self, name, queue_pool, level=None, sink=None):
         self.name = name
+        self.sink = sink
         if not isinstance(queue_pool, InternalQueuePool):
             raise TypeError("Logger queue_pool must be of type 'InternalQueuePool'")
 
         self.__pool = queue_pool
+        self.__samples = {}
+        self.level = level
+
+    @property
+    def level(self):
+        return self.__level
+
+    @level.setter
+    def level(self, level):
+        self.__level = level
+        self.__threshold = DEFAULT_LOG_LEVEL if level is None else level
 
-    def log(self, level, message, event=None, log_entry_id=None):
+    def is_enabled(self, level):
+        return level >= self.__threshold
+
+    def log(self, level, message, event=None, log_entry_id=None, sample_interval=None, **kwargs):
         """
         Uses log_entry_id explicitely as the logged ID, if defined. Otherwise, will attempt to ascertain the ID from 'event', if passed
         """
+        if level < self.__threshold:
+            return
+        if not sample_interval is None:
+            #callables are recreated on every call, so they are sampled by their code
+            suppressed = self.__sample(key=(level, getattr(message, "__code__", message)), interval=sample_interval)
+            if suppressed is None:
+                return
+        else:
+            suppressed = 0
+
+        if callable(message):
+            message = message()
+        elif kwargs:
+            message = message.format(**kwargs)
+        if suppressed > 0:
+            message = "{message} ({suppressed} similar messages suppressed)".format(message=message, suppressed=suppressed)
+
+        if not self.sink is None:
+            self.sink.put(level=level, origin=self.name, message=message)
+            return
+
         if not log_entry_id:
             if event:
                 log_entry_id = event.event_id
@@ -48,31 +100,127 @@ class Logger(object):
                 log_event = LogEvent(log_level=level, log_origin_actor=self.name, log_message=message)
                 self.__pool[key].put(log_event)
             except QueueFull:
-                self.__pool.wait_until_free()
+                self.__pool[key].wait_until_free()
                 self.__pool[key].put(log_event)
 
-    def critical(self, message, event=None, log_entry_id=None):
+    def __sample(self, key, interval):
+        """Returns the number of messages suppressed for <key> since the last one was sent, or None if this one is to be suppressed as well"""
+        now = timestamp()
+        sample = self.__samples.get(key, None)
+        if sample is None or now - sample[0] >= interval:
+            self.__samples[key] = [now, 0]
+            return 0 if sample is None else sample[1]
+        sample[1] += 1
+        return None
+
+    def critical(self, message, *args, **kwargs):
         """Generates a log message with priority logging.CRITICAL
         """
-        self.log(logging.CRITICAL, message, event=event, log_entry_id=log_entry_id)
+        self.log(logging.CRITICAL, message, *args, **kwargs)
 
-    def error(self, message, event=None, log_entry_id=None):
+    def error(self, message, *args, **kwargs):
         """Generates a log message with priority error(3).
         """
-        self.log(logging.ERROR, message, event=event, log_entry_id=log_entry_id)
+        self.log(logging.ERROR, message, *args, **kwargs)
 
-    def warn(self, message, event=None, log_entry_id=None):
+    def warn(self, message, *args, **kwargs):
         """Generates a log message with priority logging.WARN
         """
-        self.log(logging.WARN, message, event=event, log_entry_id=log_entry_id)
+        self.log(logging.WARN, message, *args, **kwargs)
     warning=warn
 
-    def info(self, message, event=None, log_entry_id=None):
+    def info(self, message, *args, **kwargs):
         """Generates a log message with priority logging.INFO.
         """
-        self.log(logging.INFO, message, event=event, log_entry_id=log_entry_id)
+        self.log(logging.INFO, message, *args, **kwargs)
 
-    def debug(self, message, event=None, log_entry_id=None):
+    def debug(self, message, *args, **kwargs):
         """Generates a log message with priority logging.DEBUG
         """
-        self.log(logging.DEBUG, message, event=event, log_entry_id=log_entry_id)
\ No newline at end of file
+        self.log(logging.DEBUG, message, *args, **kwargs)
+
+class LogSink(object):
+
+    """**Hands log messages directly to a log actor of the same process, instead of sending LogEvents over log queues**
+
+    Loggers using the sink only append a (level, origin, message, time) tuple to a bounded RingQueue. A single drainer
+    greenlet takes the records off in batches, builds their LogEvents and passes them straight to consume_batch, or
+    consume, of the actor, without going through its queues, consumer greenlets and input checks.
+
+    When the buffer is full, messages are either dropped (DROP) and reported in a warning with the next batch, or the
+    logging greenlet blocks until the drainer frees a slot (BLOCK). Messages the actor failed to write are counted in
+    'failed' and reported the same way.
+
+    Args:
+        - actor(Actor):
+            | The log actor the LogEvents are handed to (FileLogger, STDOUT...)
+        - size(Optional[int]):
+            | The number of records the buffer holds
+            | Default: DEFAULT_LOG_BUFFER_SIZE
+        - policy(Optional[str]):
+            | DROP or BLOCK
+            | Default: DROP
+        - batch_size(Optional[int]):
+            | The maximum number of LogEvents handed to the actor at once
+            | Default: DEFAULT_BATCH_SIZE
+    """
+
+    DROP = "drop"
+    BLOCK = "block"
+
+    def __init__(self, actor, size=DEFAULT_LOG_BUFFER_SIZE, policy=DROP, batch_size=DEFAULT_BATCH_SIZE):
+        if not policy in (LogSink.DROP, LogSink.BLOCK):
+            raise ValueError("Unknown log sink policy '{0}'".format(policy))
+        self.actor = actor
+        self.policy = policy
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.failed = 0
+        self.__buffer = RingQueue("log_sink", maxsize=size)
+        self.__greenlet = None
+
+    def put(self, level, origin, message):
+        if not self.__buffer.try_put((level, origin, message, timestamp())):
+            if self.policy == LogSink.DROP:
+                self.dropped += 1
+            else:
+                self.__buffer.put((level, origin, message, timestamp()))
+
+    def start(self):
+        if self.__greenlet is None:
+            self.__greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        '''Stops the drainer, after handing the records still buffered to the actor'''
+        if not self.__greenlet is None:
+            self.__greenlet.kill()
+            self.__greenlet = None
+        while not self.__buffer.empty():
+            self.__write(records=self.__buffer.get_batch(max_size=self.batch_size))
+
+    def _run(self):
+        while True:
+            self.__buffer.wait_until_content()
+            self.__write(records=self.__buffer.get_batch(max_size=self.batch_size))
+
+    def __write(self, records):
+        events = [LogEvent(log_level=level, log_origin_actor=origin, log_message=message, log_time=logged) for level, origin, message, logged in records]
+        dropped, failed = self.dropped, self.failed
+        if dropped > 0:
+            events.append(LogEvent(log_level=logging.WARN, log_origin_actor=self.actor.name,
+                log_message="Dropped {0} log messages, the log buffer was full".format(dropped)))
+        if failed > 0:
+            events.append(LogEvent(log_level=logging.WARN, log_origin_actor=self.actor.name,
+                log_message="Failed to write {0} log messages".format(failed)))
+        self.dropped, self.failed = 0, 0
+        try:
+            if self.actor.batched:
+                self.actor.consume_batch(events=events, origin_queue=None)
+            else:
+                for event in events:
+                    self.actor.consume(event=event, origin_queue=None)
+        except Exception:
+            #reported with the next batch, along with the counts this batch was reporting
+            self.dropped += dropped
+            self.failed += failed + len(records)
+            print(traceback.format_exc())
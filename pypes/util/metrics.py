@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+
+from bisect import bisect_left
+
+from pypes import import_restriction
+from pypes.globals.metrics import DEFAULT_LATENCY_BUCKETS
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "Histogram",
+        "ActorMetrics"
+    ]
+
+class Histogram(object):
+    """
+    **A fixed bucket histogram. All buckets are allocated up front so recording a value never allocates**
+
+    Parameters:
+        buckets (Optional[tuple]):
+            | The sorted upper bounds of each bucket. Values above the last bound are counted in an overflow bucket
+            | Default: DEFAULT_LATENCY_BUCKETS
+    """
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count > 0 else 0.0
+
+    def percentile(self, percentile):
+        '''Returns the upper bound of the bucket containing the <percentile> (0-100) value. Overflow returns the max recorded value'''
+        if self.count == 0:
+            return 0.0
+        rank, seen = self.count * percentile / 100.0, 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count > 0:
+                return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99)
+        }
+
+class ActorMetrics(object):
+    """
+    **Counters and histograms kept by every actor**
+
+    Counters are plain attributes that the actor increments directly. Queue depths are read from the pool only
+    when a snapshot is taken
+
+    Parameters:
+        pool (QueuePool):
+            | The queue pool of the measured actor
+    """
+
+    def __init__(self, pool):
+        self.__pool = pool
+        self.consumed = 0
+        self.emitted = 0
+        self.errored = 0
+        self.converted = 0
+        self.in_flight = 0
+        self.latency = Histogram()
+
+    def queue_depths(self):
+        return {name: queue.qsize() for name, queue in self.__pool.inbound.iteritems()}
+
+    def queue_high_watermarks(self):
+        return {name: queue.high_watermark for name, queue in self.__pool.inbound.iteritems()}
+
+    def snapshot(self):
+        return {
+            "consumed": self.consumed,
+            "emitted": self.emitted,
+            "errored": self.errored,
+            "converted": self.converted,
+            "in_flight": self.in_flight,
+            "latency": self.latency.snapshot(),
+            "queue_depth": self.queue_depths(),
+            "queue_high_watermark": self.queue_high_watermarks()
+        }
@@ -0,0 +1,270 @@
+#!/usr/bin/env python
+
+import os
+import signal
+import struct
+import traceback
+
+import gevent.os
+from gevent.monkey import get_original
+from gevent.queue import Queue
+from gevent.threadpool import ThreadPool
+
+pickle = None
+try:
+    import cPickle as pickle #Python 2
+except ImportError:
+    import _pickle as pickle #Python 3
+
+from pypes.util import ignored
+from pypes.util.errors import PypesException
+from pypes.globals.async import DEFAULT_OFFLOAD_SIZE
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "Offloader",
+        "InlineOffloader",
+        "ProcessOffloader",
+        "ThreadOffloader",
+        "PerThread",
+        "create_offloader"
+    ]
+
+class Offloader(object):
+    """
+    **Runs CPU heavy work for an actor, returning the result to the calling greenlet**
+
+    Offloaders that run work in another process set 'serializes', in which case the work and its arguments must be
+    picklable: module-level functions taking and returning plain data such as strings.
+    """
+
+    serializes = False
+
+    def run(self, func, *args, **kwargs):
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+class InlineOffloader(Offloader):
+    '''Runs work directly in the calling greenlet, blocking the hub'''
+
+    def run(self, func, *args, **kwargs):
+        return func(*args, **kwargs)
+
+class _WorkerProcess(object):
+
+    __header = struct.Struct(">I")
+
+    #the parent side pipes of every worker forked by this process, which later workers must not hold open
+    __parent_fds = set()
+
+    def __init__(self):
+        parent_read, child_write = os.pipe()
+        child_read, parent_write = os.pipe()
+        self.pid = os.fork()
+        if self.pid == 0:
+            for fd in _WorkerProcess.__parent_fds | set([parent_read, parent_write]):
+                with ignored(OSError):
+                    os.close(fd)
+            try:
+                _WorkerProcess.__serve(read_fd=child_read, write_fd=child_write)
+            finally:
+                os._exit(0)
+        os.close(child_read)
+        os.close(child_write)
+        self.__read_fd, self.__write_fd = parent_read, parent_write
+        _WorkerProcess.__parent_fds.update([parent_read, parent_write])
+        gevent.os.make_nonblocking(self.__read_fd)
+        gevent.os.make_nonblocking(self.__write_fd)
+
+    @staticmethod
+    def __serve(read_fd, write_fd):
+        '''The worker loop, which only ever blocks on its own pipe'''
+        while True:
+            message = _WorkerProcess.__receive(read=lambda size: os.read(read_fd, size))
+            if message is None:
+                return
+            func, args, kwargs = pickle.loads(message)
+            try:
+                reply = pickle.dumps((True, func(*args, **kwargs)), pickle.HIGHEST_PROTOCOL)
+            except Exception as err:
+                try:
+                    reply = pickle.dumps((False, err), pickle.HIGHEST_PROTOCOL)
+                except Exception:
+                    reply = pickle.dumps((False, PypesException(message=traceback.format_exc())), pickle.HIGHEST_PROTOCOL)
+            _WorkerProcess.__send(write=lambda data: os.write(write_fd, data), message=reply)
+
+    @staticmethod
+    def __receive(read):
+        header = _WorkerProcess.__read_exactly(read=read, size=_WorkerProcess.__header.size)
+        if header is None:
+            return None
+        length, = _WorkerProcess.__header.unpack(header)
+        return _WorkerProcess.__read_exactly(read=read, size=length)
+
+    @staticmethod
+    def __read_exactly(read, size):
+        chunks, remaining = [], size
+        while remaining > 0:
+            chunk = read(remaining)
+            if len(chunk) == 0:
+                return None
+            chunks.append(chunk)
+            remaining -= len(chunk)
+        return "".join(chunks)
+
+    @staticmethod
+    def __send(write, message):
+        data = _WorkerProcess.__header.pack(len(message)) + message
+        while len(data) > 0:
+            data = data[write(data):]
+
+    def call(self, func, args, kwargs):
+        '''Runs func in the worker and returns whether it succeeded, along with its result or error. Only the calling
+        greenlet waits on the pipes'''
+        _WorkerProcess.__send(write=lambda data: gevent.os.nb_write(self.__write_fd, data),
+            message=pickle.dumps((func, args, kwargs), pickle.HIGHEST_PROTOCOL))
+        reply = _WorkerProcess.__receive(read=lambda size: gevent.os.nb_read(self.__read_fd, size))
+        if reply is None:
+            raise PypesException(message="Offload worker process {0} exited".format(self.pid))
+        return pickle.loads(reply)
+
+    def close(self, terminate=False):
+        '''Closing the pipes makes the worker exit once it is idle. A terminated worker is killed right away'''
+        if terminate:
+            with ignored(OSError):
+                os.kill(self.pid, signal.SIGKILL)
+        _WorkerProcess.__parent_fds.difference_update([self.__read_fd, self.__write_fd])
+        os.close(self.__write_fd)
+        os.close(self.__read_fd)
+        with ignored(OSError):
+            gevent.os.waitpid(self.pid, 0)
+
+class ProcessOffloader(Offloader):
+    """
+    **Runs work on a pool of forked worker processes**
+
+    The pool is forked on first use, by the process using it (so worker processes placed by the Director get pools of
+    their own). Each call is sent to an idle worker over a pipe, and only the calling greenlet waits for the reply.
+
+    Parameters:
+        size (Optional[int]):
+            | The number of worker processes
+            | Default: DEFAULT_OFFLOAD_SIZE
+    """
+
+    serializes = True
+
+    def __init__(self, size=DEFAULT_OFFLOAD_SIZE):
+        self.size = size
+        self.__pid = None
+        self.__workers = []
+        self.__idle = None
+
+    def __ensure_started(self):
+        if self.__pid != os.getpid():
+            self.__pid = os.getpid()
+            self.__workers = [_WorkerProcess() for _ in xrange(self.size)]
+            self.__idle = Queue()
+            for worker in self.__workers:
+                self.__idle.put(worker)
+
+    def run(self, func, *args, **kwargs):
+        self.__ensure_started()
+        worker = self.__idle.get()
+        try:
+            successful, value = worker.call(func=func, args=args, kwargs=kwargs)
+        except BaseException:
+            #the worker exited, or the caller was killed or timed out before reading the reply, which would otherwise
+            #be read by the next caller
+            self.__replace(worker=worker)
+            raise
+        self.__idle.put(worker)
+        if not successful:
+            raise value
+        return value
+
+    def __replace(self, worker):
+        self.__workers.remove(worker)
+        replacement = _WorkerProcess()
+        self.__workers.append(replacement)
+        #the replacement is idle before the old worker is reaped, which waits on the hub where the caller can be killed
+        self.__idle.put(replacement)
+        worker.close(terminate=True)
+
+    def close(self):
+        if self.__pid == os.getpid():
+            for worker in self.__workers:
+                worker.close()
+        self.__pid, self.__workers, self.__idle = None, [], None
+
+class ThreadOffloader(Offloader):
+    """
+    **Runs work on a pool of native threads**
+
+    Only work that releases the GIL (such as lxml parsing, XSLT application and schema validation) runs in parallel.
+    lxml objects are not thread-safe, so compiled objects used by the work should be kept in a PerThread.
+
+    Parameters:
+        size (Optional[int]):
+            | The number of threads
+            | Default: DEFAULT_OFFLOAD_SIZE
+    """
+
+    def __init__(self, size=DEFAULT_OFFLOAD_SIZE):
+        self.size = size
+        self.__pool = None
+
+    def run(self, func, *args, **kwargs):
+        if self.__pool is None:
+            self.__pool = ThreadPool(maxsize=self.size)
+        return self.__pool.apply(func, args, kwargs)
+
+    def close(self):
+        if not self.__pool is None:
+            self.__pool.kill()
+            self.__pool = None
+
+class PerThread(object):
+    """
+    **Lazily builds one object per native thread**
+
+    threading.local is greenlet-local once gevent has patched it, which would rebuild the object for every greenlet
+    of the hub thread, so instances are keyed by the unpatched thread identity instead.
+
+    Parameters:
+        factory (callable):
+            | Builds the object for the calling thread
+    """
+
+    __get_ident = staticmethod(get_original("thread", "get_ident"))
+
+    def __init__(self, factory):
+        self.__factory = factory
+        self.__instances = {}
+
+    def get(self):
+        ident = PerThread.__get_ident()
+        instance = self.__instances.get(ident, None)
+        if instance is None:
+            instance = self.__instances[ident] = self.__factory()
+        return instance
+
+__offloaders = {
+    None: InlineOffloader,
+    "inline": InlineOffloader,
+    "process": ProcessOffloader,
+    "thread": ThreadOffloader
+}
+
+def create_offloader(mode=None, size=DEFAULT_OFFLOAD_SIZE):
+    '''Creates the offloader for <mode> (None|"inline"|"process"|"thread")'''
+    try:
+        offloader = __offloaders[mode]
+    except KeyError:
+        raise ValueError("Unknown offload mode '{0}'".format(mode))
+    return offloader() if offloader is InlineOffloader else offloader(size=size)
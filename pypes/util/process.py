@@ -0,0 +1,142 @@
+#!/usr/bin/env python
+
+import os
+import traceback
+
+import gevent
+import zmq.green as zmq
+
+from pypes.util.codec import EventCodec
+from pypes.util.errors import QueueEmpty
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "QueueSender",
+        "QueueReceiver",
+        "queue_endpoint"
+    ]
+
+def queue_endpoint(directory, queue, process):
+    '''Returns the ipc endpoint on which <process> receives the elements put on <queue> by other processes.
+    Queue objects are created before the worker processes are forked, so id(queue) is the same in every process'''
+    return "ipc://{0}".format(os.path.join(directory, "{0}.{1}".format(id(queue), process)))
+
+class _QueueBridge(object):
+
+    def __init__(self, queue, context=None, codec=None, actor=None):
+        self.queue = queue
+        self.context = zmq.Context.instance() if context is None else context
+        self.codec = EventCodec() if codec is None else codec
+        self.actor = actor
+        self.failed = 0
+        self.socket = None
+        self.__greenlet = None
+
+    def start(self):
+        if self.__greenlet is None:
+            self.socket = self._create_socket()
+            self.__greenlet = gevent.spawn(self._run)
+
+    def stop(self):
+        if not self.__greenlet is None:
+            self.__greenlet.kill()
+            self.__greenlet = None
+            self.socket.close(linger=0)
+            self.socket = None
+
+    def _fail(self, error, event=None):
+        '''Reports an element that could not be bridged, sending <event> to the error queues of the actor unless it was
+        already on its way to them'''
+        self.failed += 1
+        if self.actor is None:
+            print(traceback.format_exc())
+            return
+        self.actor.logger.error("Unable to bridge queue '{queue}': {error}", event=event, queue=self.queue.name, error=error)
+        if not event is None and not self.queue in self.actor.pool.error.values():
+            event.error = error
+            self.actor.send_error(event)
+
+class QueueSender(_QueueBridge):
+    """
+    **Drains a local queue and pushes its elements to the processes consuming it**
+
+    Events are spread round-robin over <endpoints>, which is how replicas of an actor share one queue. Each event is
+    sent as the multipart frames of an EventCodec, without copying its payload, and acked on the local queue once it
+    has been handed to zmq. Events that cannot be encoded are logged and sent to the error queues of <actor>.
+
+    Parameters:
+        queue (Queue):
+            | The local queue, with no local consumer
+        endpoints (list):
+            | The endpoints of the processes consuming <queue> (see queue_endpoint)
+        context (Optional[zmq.Context]):
+            | Default: The context of this process
+        codec (Optional[EventCodec]):
+            | Default: A new EventCodec
+        actor (Optional[Actor]):
+            | The local actor producing to <queue>
+    """
+
+    def __init__(self, queue, endpoints, *args, **kwargs):
+        super(QueueSender, self).__init__(queue=queue, *args, **kwargs)
+        self.endpoints = endpoints
+
+    def _create_socket(self):
+        socket = self.context.socket(zmq.PUSH)
+        for endpoint in self.endpoints:
+            socket.connect(endpoint)
+        return socket
+
+    def _run(self):
+        while True:
+            self.queue.wait_until_content()
+            try:
+                element = self.queue.get()
+            except QueueEmpty:
+                continue
+            try:
+                self.socket.send_multipart(self.codec.encode_frames(event=element), copy=False)
+            except Exception as err:
+                self._fail(error=err, event=element)
+            self.queue.ack(element)
+
+class QueueReceiver(_QueueBridge):
+    """
+    **Puts the events other processes push to <endpoint> on a local queue**
+
+    Messages that cannot be decoded are logged by <actor> and dropped.
+
+    Parameters:
+        queue (Queue):
+            | The local queue, consumed by an actor of this process
+        endpoint (str):
+            | The endpoint this process binds for <queue> (see queue_endpoint)
+        context (Optional[zmq.Context]):
+            | Default: The context of this process
+        codec (Optional[EventCodec]):
+            | Default: A new EventCodec
+        actor (Optional[Actor]):
+            | The local actor consuming <queue>
+    """
+
+    def __init__(self, queue, endpoint, *args, **kwargs):
+        super(QueueReceiver, self).__init__(queue=queue, *args, **kwargs)
+        self.endpoint = endpoint
+
+    def _create_socket(self):
+        socket = self.context.socket(zmq.PULL)
+        socket.bind(self.endpoint)
+        return socket
+
+    def _run(self):
+        while True:
+            frames = self.socket.recv_multipart()
+            try:
+                event = self.codec.decode_frames(frames=frames)
+            except Exception as err:
+                self._fail(error=err)
+                continue
+            self.queue.put(event)
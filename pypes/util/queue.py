@@ -1,13 +1,28 @@
 #!/usr/bin/env python
 
+import gevent
 import gevent.queue as gqueue
+import os
+import shutil
+import struct
+import tempfile
+import time
+
+from collections import deque
+
+pickle = None
+try:
+    import cPickle as pickle #Python 2
+except ImportError:
+    import _pickle as pickle #Python 3
 
 from uuid import uuid4 as uuid
-from gevent import sleep
 from gevent.hub import LoopExit
 from gevent.event import Event
 
 from pypes.util.errors import QueueEmpty, QueueFull
+from pypes.util.segments import SegmentedLog
+from pypes.globals.queue import DEFAULT_SEGMENT_SIZE, DEFAULT_SPILL_DIRECTORY, DEFAULT_COMMIT_INTERVAL, DEFAULT_COMMIT_SIZE
 from pypes import import_restriction
 
 __all__ = []
@@ -15,8 +30,16 @@ __all__ = []
 if __name__.startswith(import_restriction):
     __all__ += [
         "QueuePool",
-        "InternalQueuePool"
+        "InternalQueuePool",
+        "Queue",
+        "RingQueue",
+        "SpillQueue",
+        "PersistentQueue",
+        "QUEUE_EMPTY"
     ]
+
+#returned by try_get when a queue has no waiting elements
+QUEUE_EMPTY = object()
     
 class InternalQueuePool(dict):
     """
@@ -30,21 +53,33 @@ class InternalQueuePool(dict):
         size (Optional[int]):
             | The maxsize of each queue in this pool. A value of 0 represents an unlimited size
             | Default: 0
+        queue_class (Optional[class]):
+            | The class of the queues created by this pool (Queue|RingQueue|SpillQueue)
+            | PersistentQueue needs a directory per queue and is selected per connection instead (see Actor.connect_queue)
+            | Default: Queue
     """
 
-    def __init__(self, placeholder=None, size=0, *args, **kwargs):
+    def __init__(self, placeholder=None, size=0, queue_class=None, *args, **kwargs):
         self.__size = size
+        self.__queue_class = Queue if queue_class is None else queue_class
         self.placeholder = placeholder
         super(InternalQueuePool, self).__init__(*args, **kwargs)
         if self.placeholder:
-            self[self.placeholder] = Queue(self.placeholder, maxsize=(None if self.__size <= 0 else self.__size))
+            self[self.placeholder] = self.create_queue(name=self.placeholder)
+
+    @property
+    def queue_class(self):
+        return self.__queue_class
+
+    def create_queue(self, name):
+        return self.__queue_class(name, maxsize=(None if self.__size <= 0 else self.__size))
 
     def add(self, name, queue=None):
-        if not queue:
-            queue = Queue(name, maxsize=(None if self.__size <= 0 else self.__size))
+        if queue is None:
+            queue = self.create_queue(name=name)
 
         if not self.placeholder is None:
-            if self.get(self.placeholder, None):
+            if not self.get(self.placeholder, None) is None:
                 placeholder = self.pop(self.placeholder)
                 placeholder.dump(queue)
 
@@ -54,12 +89,12 @@ class InternalQueuePool(dict):
 
 class QueuePool(object):
 
-    def __init__(self, size=0):
+    def __init__(self, size=0, queue_class=None):
         self.__size = size
-        self.inbound = InternalQueuePool(size=size)
-        self.outbound = InternalQueuePool(size=size)
-        self.error = InternalQueuePool(size=size)
-        self.logs = InternalQueuePool(size=size, placeholder=uuid().get_hex())
+        self.inbound = InternalQueuePool(size=size, queue_class=queue_class)
+        self.outbound = InternalQueuePool(size=size, queue_class=queue_class)
+        self.error = InternalQueuePool(size=size, queue_class=queue_class)
+        self.logs = InternalQueuePool(size=size, queue_class=queue_class, placeholder=uuid().get_hex())
 
     @property
     def size(self):
@@ -68,10 +103,10 @@ class QueuePool(object):
     def list_all_queues(self):
         return (self.inbound.values() + self.outbound.values() + self.error.values() + self.logs.values())
 
-    def join(self):
+    def join(self, timeout=None):
         """**Blocks until all queues in the pool are empty.**"""
         for queue in self.list_all_queues():
-            queue.wait_until_empty()
+            queue.wait_until_empty(timeout=timeout)
 
 
 class Queue(gqueue.Queue):
@@ -85,11 +120,34 @@ class Queue(gqueue.Queue):
 
     '''
 
+    #whether elements survive a restart. Durable queues are never fused (see Director)
+    DURABLE = False
+
     def __init__(self, name, *args, **kwargs):
         super(Queue, self).__init__(*args, **kwargs)
         self.name = name
+        self.high_watermark = 0
         self.__has_content = Event()
+        self.__is_empty = Event()
+        self.__has_space = Event()
         self.__has_content.clear()
+        self.__is_empty.set()
+        self.__has_space.set()
+
+    def __signal(self):
+        '''Updates the content, empty and free slot events after the queue size changed.'''
+        size = self.qsize()
+        if size == 0:
+            self.__has_content.clear()
+            self.__is_empty.set()
+        else:
+            self.__has_content.set()
+            self.__is_empty.clear()
+        if self.maxsize is None or size < self.maxsize:
+            self.__has_space.set()
+        else:
+            self.__has_space.clear()
+        return size
 
     def get(self, block=False, *args, **kwargs):
         '''Gets an element from the queue.'''
@@ -100,16 +158,56 @@ class Queue(gqueue.Queue):
             self.__has_content.clear()
             raise QueueEmpty("Queue {0} has no waiting events".format(self.name))
 
-        if self.qsize() == 0:
-            self.__has_content.clear()
-
+        self.__signal()
         return element
 
+    def get_batch(self, max_size, timeout=None):
+        '''Gets up to <max_size> elements from the queue.
+
+        Elements already waiting are taken immediately. If <timeout> is defined, the queue is waited on for up to
+        <timeout> seconds (measured from the first call) for further elements until <max_size> is reached.
+        An empty list is returned if no elements arrived.
+        '''
+
+        elements = []
+        deadline = None if timeout is None else time.time() + timeout
+        while len(elements) < max_size:
+            try:
+                elements.append(super(Queue, self).get(block=False))
+            except gqueue.Empty:
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is None or remaining <= 0:
+                    break
+                try:
+                    elements.append(super(Queue, self).get(block=True, timeout=remaining))
+                except gqueue.Empty:
+                    break
+
+        self.__signal()
+        return elements
+
+    def try_get(self):
+        '''Gets an element from the queue without blocking. Returns QUEUE_EMPTY if there is none.'''
+        try:
+            return self.get()
+        except QueueEmpty:
+            return QUEUE_EMPTY
+
+    def try_put(self, element):
+        '''Puts element in queue without blocking. Returns whether there was a free slot.'''
+        try:
+            self.put(element, block=False)
+        except QueueFull:
+            return False
+        return True
+
     def put(self, element, *args, **kwargs):
         '''Puts element in queue.'''
         try:
             super(Queue, self).put(element, *args, **kwargs)
-            self.__has_content.set()
+            size = self.__signal()
+            if size > self.high_watermark:
+                self.high_watermark = size
         except gqueue.Full:
             #only if block = False or (block = True and timeout not None)
             raise QueueFull(message="Queue {0} is full".format(self.name), queue=self)
@@ -118,17 +216,13 @@ class Queue(gqueue.Queue):
         '''Blocks until at least 1 slot is taken.'''
         self.__has_content.wait()
 
-    def wait_until_empty(self):
+    def wait_until_empty(self, timeout=None):
         '''Blocks until the queue is completely empty.'''
+        return self.__is_empty.wait(timeout=timeout)
 
-        while not self.__has_content.is_set():
-            sleep(0)
-
-    def wait_until_free(self):
+    def wait_until_free(self, timeout=None):
         '''Blocks until the queue has at lease 1 free slot.'''
-
-        while self.qsize() >= self.maxsize:
-            sleep(0)
+        return self.__has_space.wait(timeout=timeout)
             
     def dump(self, other_queue):
         """**Dump all items on this queue to another queue**"""
@@ -138,3 +232,404 @@ class Queue(gqueue.Queue):
         except (gqueue.Full, Exception):
             pass
 
+    def ack(self, element):
+        '''Marks <element> as fully processed. Only meaningful for durable queues'''
+        pass
+
+    def close(self):
+        '''Releases what the queue keeps outside of memory, once nothing consumes it anymore. Safe to call repeatedly'''
+        pass
+
+
+
+class RingQueue(object):
+
+    '''A lighter alternative to Queue built on a collections.deque.
+
+    Uncontended gets and puts never touch a gevent primitive or raise: try_get and try_put return QUEUE_EMPTY and False
+    respectively. Blocked greenlets all wait on a single gevent Event that is swapped out and set whenever the queue
+    changes while somebody is waiting.
+
+    Parameters:
+
+        name (str):
+            | The name of this queue. Used in certain actors to determine origin faster than reverse key-value lookup
+        maxsize (Optional[int]):
+            | The maximum number of elements. None or a value <= 0 represents an unlimited size
+            | Default: None
+
+    '''
+
+    DURABLE = False
+
+    def __init__(self, name, maxsize=None):
+        self.name = name
+        self.maxsize = None if maxsize is None or maxsize <= 0 else maxsize
+        self.high_watermark = 0
+        self.__elements = deque()
+        self.__changed = Event()
+        self.__waiting = 0
+
+    def qsize(self):
+        return len(self.__elements)
+
+    def __len__(self):
+        return len(self.__elements)
+
+    def empty(self):
+        return len(self.__elements) == 0
+
+    def full(self):
+        return not self.maxsize is None and len(self.__elements) >= self.maxsize
+
+    def __notify(self):
+        if self.__waiting > 0:
+            changed, self.__changed = self.__changed, Event()
+            changed.set()
+
+    def __wait(self, predicate, deadline=None):
+        '''Blocks until <predicate> holds. Returns False if <deadline> passed first.'''
+        while not predicate():
+            remaining = None if deadline is None else deadline - time.time()
+            if not remaining is None and remaining <= 0:
+                return False
+            self.__waiting += 1
+            try:
+                self.__changed.wait(timeout=remaining)
+            finally:
+                self.__waiting -= 1
+        return True
+
+    def try_get(self):
+        '''Gets an element from the queue without blocking. Returns QUEUE_EMPTY if there is none.'''
+        try:
+            element = self.__elements.popleft()
+        except IndexError:
+            return QUEUE_EMPTY
+        self.__notify()
+        return element
+
+    def try_put(self, element):
+        '''Puts element in queue without blocking. Returns whether there was a free slot.'''
+        if self.full():
+            return False
+        self.__elements.append(element)
+        size = len(self.__elements)
+        if size > self.high_watermark:
+            self.high_watermark = size
+        self.__notify()
+        return True
+
+    def get(self, block=False, timeout=None):
+        '''Gets an element from the queue.'''
+        deadline = None if timeout is None else time.time() + timeout
+        while True:
+            element = self.try_get()
+            if not element is QUEUE_EMPTY:
+                return element
+            if not block or not self.__wait(predicate=lambda: not self.empty(), deadline=deadline):
+                raise QueueEmpty("Queue {0} has no waiting events".format(self.name))
+
+    def get_batch(self, max_size, timeout=None):
+        '''Gets up to <max_size> elements from the queue, waiting up to <timeout> seconds for the batch to fill.'''
+        elements = []
+        deadline = None if timeout is None else time.time() + timeout
+        while len(elements) < max_size:
+            element = self.try_get()
+            if element is QUEUE_EMPTY:
+                if deadline is None or not self.__wait(predicate=lambda: not self.empty(), deadline=deadline):
+                    break
+            else:
+                elements.append(element)
+        return elements
+
+    def put(self, element, block=True, timeout=None):
+        '''Puts element in queue.'''
+        deadline = None if timeout is None else time.time() + timeout
+        while not self.try_put(element):
+            if not block or not self.__wait(predicate=lambda: not self.full(), deadline=deadline):
+                raise QueueFull(message="Queue {0} is full".format(self.name), queue=self)
+
+    def wait_until_content(self, timeout=None):
+        '''Blocks until at least 1 slot is taken.'''
+        return self.__wait(predicate=lambda: not self.empty(), deadline=None if timeout is None else time.time() + timeout)
+
+    def wait_until_empty(self, timeout=None):
+        '''Blocks until the queue is completely empty.'''
+        return self.__wait(predicate=self.empty, deadline=None if timeout is None else time.time() + timeout)
+
+    def wait_until_free(self, timeout=None):
+        '''Blocks until the queue has at lease 1 free slot.'''
+        return self.__wait(predicate=lambda: not self.full(), deadline=None if timeout is None else time.time() + timeout)
+
+    def dump(self, other_queue):
+        """**Dump all items on this queue to another queue**"""
+        element = self.try_get()
+        while not element is QUEUE_EMPTY:
+            other_queue.put(element)
+            element = self.try_get()
+
+    def ack(self, element):
+        '''Marks <element> as fully processed. Only meaningful for durable queues'''
+        pass
+
+    def close(self):
+        '''Releases what the queue keeps outside of memory, once nothing consumes it anymore. Safe to call repeatedly'''
+        pass
+
+
+class SpillQueue(RingQueue):
+
+    '''A RingQueue that keeps at most <maxsize> elements in memory and spills the overflow to a segmented file store.
+
+    Spilled elements are pickled (events through BaseEvent.__getstate__/__setstate__) and paged back into memory in
+    FIFO order as the in-memory head drains, so puts never block or raise QueueFull. The store only exists to bound
+    resident memory; it is not durable and is deleted when the queue is closed.
+
+    Parameters:
+
+        name (str):
+            | The name of this queue. Used in certain actors to determine origin faster than reverse key-value lookup
+        maxsize (Optional[int]):
+            | The maximum number of elements kept in memory. None or a value <= 0 never spills
+            | Default: None
+        directory (Optional[str]):
+            | The parent directory of the spill store. Each queue spills to its own temporary subdirectory
+            | Default: DEFAULT_SPILL_DIRECTORY
+        segment_size (Optional[int]):
+            | The size (in bytes) after which the spill store starts a new segment file
+            | Default: DEFAULT_SEGMENT_SIZE
+
+    '''
+
+    def __init__(self, name, maxsize=None, directory=DEFAULT_SPILL_DIRECTORY, segment_size=DEFAULT_SEGMENT_SIZE):
+        super(SpillQueue, self).__init__(name, maxsize=maxsize)
+        self.__directory = directory
+        self.__segment_size = segment_size
+        self.__store = None
+        self.__spilled = 0
+
+    @property
+    def spilled(self):
+        '''The number of elements currently held on disk'''
+        return self.__spilled
+
+    def __spill(self, element):
+        if self.__store is None:
+            if not os.path.isdir(self.__directory):
+                os.makedirs(self.__directory)
+            self.__store = SegmentedLog(directory=tempfile.mkdtemp(prefix="{0}-".format(self.name), dir=self.__directory),
+                segment_size=self.__segment_size)
+        self.__store.append(pickle.dumps(element, pickle.HIGHEST_PROTOCOL))
+        self.__spilled += 1
+
+    def __page_in(self):
+        while self.__spilled > 0 and not self.full():
+            self.__spilled -= 1
+            super(SpillQueue, self).try_put(pickle.loads(self.__store.read()))
+
+    def qsize(self):
+        return super(SpillQueue, self).qsize() + self.__spilled
+
+    def __len__(self):
+        return self.qsize()
+
+    def try_get(self):
+        '''Gets an element from the queue without blocking. Returns QUEUE_EMPTY if there is none.'''
+        element = super(SpillQueue, self).try_get()
+        if self.__spilled > 0:
+            self.__page_in()
+        return element
+
+    def try_put(self, element):
+        '''Puts element in queue, spilling it to disk if the in-memory head is full or already spilling. Always True.'''
+        if self.__spilled > 0 or not super(SpillQueue, self).try_put(element):
+            self.__spill(element)
+        return True
+
+    def wait_until_free(self, timeout=None):
+        '''A SpillQueue always accepts elements'''
+        return True
+
+    def close(self):
+        '''Deletes the spill store along with any elements still on disk'''
+        if not self.__store is None:
+            self.__store.destroy()
+            shutil.rmtree(self.__store.directory, ignore_errors=True)
+            self.__store = None
+            self.__spilled = 0
+
+
+class PersistentQueue(RingQueue):
+
+    '''A RingQueue backed by a segmented write-ahead log, so that unacknowledged elements survive a restart.
+
+    Every put is appended to the log and fsynced by a group commit: at most once per <commit_interval>, or as soon as
+    <commit_size> records are pending. A blocking put returns only once its record is on disk. Consumers call
+    ack(element) once an element has been fully processed; elements that were never acknowledged are replayed, in
+    order, when a PersistentQueue is opened on the same directory. Segments are deleted once all of their elements
+    (and every older segment's) have been acknowledged. The queue holds on to every element until it is acknowledged,
+    so an element dropped without an ack is never mistaken for a later one.
+
+    Parameters:
+
+        name (str):
+            | The name of this queue. Used in certain actors to determine origin faster than reverse key-value lookup
+        maxsize (Optional[int]):
+            | The maximum number of elements. None or a value <= 0 represents an unlimited size
+            | Default: None
+        directory (str):
+            | The directory holding the write-ahead log. Must be unique to this queue and stable across restarts
+        segment_size (Optional[int]):
+            | The size (in bytes) after which the log starts a new segment file
+            | Default: DEFAULT_SEGMENT_SIZE
+        commit_interval (Optional[float]):
+            | The longest time (in seconds) a record waits to be fsynced
+            | Default: DEFAULT_COMMIT_INTERVAL
+        commit_size (Optional[int]):
+            | The number of pending records that forces an immediate fsync
+            | Default: DEFAULT_COMMIT_SIZE
+
+    '''
+
+    DURABLE = True
+
+    __header = struct.Struct(">cQ")
+    __put_record = "P"
+    __ack_record = "A"
+
+    def __init__(self, name, maxsize=None, directory=None, segment_size=DEFAULT_SEGMENT_SIZE, commit_interval=DEFAULT_COMMIT_INTERVAL, commit_size=DEFAULT_COMMIT_SIZE):
+        if directory is None:
+            raise ValueError("PersistentQueue {0} requires a directory".format(name))
+        super(PersistentQueue, self).__init__(name, maxsize=maxsize)
+        self.commit_interval = commit_interval
+        self.commit_size = commit_size
+        self.__log = SegmentedLog(directory=directory, segment_size=segment_size)
+        self.__sequence = 0
+        self.__synced = 0
+        self.__pending = 0
+        self.__scheduled = None
+        self.__committed = Event()
+        self.__unacked = {}
+        self.__segments = {}
+        self.__outstanding = {}
+        self.__oldest = self.__log.segment
+        self.__replayed = deque()
+        self.__closed = False
+        self.__replay()
+
+    def __replay(self):
+        segments = self.__log.segments()
+        if len(segments) > 0:
+            self.__oldest = segments[0]
+        puts = {}
+        for segment, record in self.__log:
+            kind, sequence = PersistentQueue.__header.unpack_from(record)
+            self.__sequence = max(self.__sequence, sequence + 1)
+            if kind == PersistentQueue.__put_record:
+                puts[sequence] = (segment, record[PersistentQueue.__header.size:])
+            else:
+                puts.pop(sequence, None)
+
+        for sequence in sorted(puts):
+            segment, payload = puts[sequence]
+            element = pickle.loads(payload)
+            self.__track(element=element, sequence=sequence, segment=segment)
+            self.__replayed.append(element)
+        self.__synced = self.__sequence
+        self.__compact()
+
+    def __track(self, element, sequence, segment):
+        #the element is held until it is acked, so that its id cannot be reused by a later element while it is unacked
+        self.__unacked.setdefault(id(element), (element, []))[1].append(sequence)
+        self.__segments[sequence] = segment
+        self.__outstanding[segment] = self.__outstanding.get(segment, 0) + 1
+
+    def __compact(self):
+        while self.__oldest < self.__log.segment and self.__outstanding.get(self.__oldest, 0) == 0:
+            self.__outstanding.pop(self.__oldest, None)
+            self.__log.discard(self.__oldest)
+            self.__oldest += 1
+
+    def __append(self, kind, sequence, payload=""):
+        segment = self.__log.append(PersistentQueue.__header.pack(kind, sequence) + payload)
+        self.__pending += 1
+        if self.__pending >= self.commit_size:
+            if not self.__scheduled is None:
+                self.__scheduled.kill(block=False)
+            self.commit()
+        elif self.__scheduled is None:
+            self.__scheduled = gevent.spawn_later(self.commit_interval, self.commit)
+        return segment
+
+    def commit(self):
+        '''Fsyncs every pending record and wakes the puts waiting on them'''
+        self.__scheduled = None
+        if self.__pending == 0:
+            return
+        self.__pending = 0
+        sequence = self.__sequence
+        self.__log.sync()
+        self.__synced = sequence
+        committed, self.__committed = self.__committed, Event()
+        committed.set()
+
+    @property
+    def unacked(self):
+        '''The number of elements put (or replayed) that have not been acknowledged yet'''
+        return len(self.__segments)
+
+    def qsize(self):
+        return super(PersistentQueue, self).qsize() + len(self.__replayed)
+
+    def __len__(self):
+        return self.qsize()
+
+    def empty(self):
+        return len(self.__replayed) == 0 and super(PersistentQueue, self).empty()
+
+    def try_get(self):
+        '''Gets an element from the queue without blocking, replayed elements first. Returns QUEUE_EMPTY if there is none.'''
+        if len(self.__replayed) > 0:
+            return self.__replayed.popleft()
+        return super(PersistentQueue, self).try_get()
+
+    def try_put(self, element):
+        '''Logs and puts element in queue without blocking or waiting for the commit. Returns whether there was a free slot.'''
+        if self.full():
+            return False
+        sequence = self.__sequence
+        self.__sequence += 1
+        segment = self.__append(kind=PersistentQueue.__put_record, sequence=sequence, payload=pickle.dumps(element, pickle.HIGHEST_PROTOCOL))
+        self.__track(element=element, sequence=sequence, segment=segment)
+        return super(PersistentQueue, self).try_put(element)
+
+    def put(self, element, block=True, timeout=None):
+        '''Puts element in queue and blocks until it has been committed to disk.'''
+        super(PersistentQueue, self).put(element, block=block, timeout=timeout)
+        sequence = self.__sequence
+        while self.__synced < sequence:
+            self.__committed.wait()
+
+    def ack(self, element):
+        '''Marks <element> as fully processed so that it is not replayed'''
+        tracked, sequences = self.__unacked.get(id(element), (None, None))
+        if not tracked is element:
+            return
+        sequence = sequences.pop(0)
+        if len(sequences) == 0:
+            del self.__unacked[id(element)]
+        segment = self.__segments.pop(sequence)
+        self.__outstanding[segment] -= 1
+        self.__append(kind=PersistentQueue.__ack_record, sequence=sequence)
+        self.__compact()
+
+    def close(self):
+        '''Commits every pending record and closes the log. Unacknowledged elements are replayed on the next open'''
+        if self.__closed:
+            return
+        self.__closed = True
+        if not self.__scheduled is None:
+            self.__scheduled.kill(block=False)
+        self.commit()
+        self.__log.close()
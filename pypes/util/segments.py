@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import os
+import struct
+import zlib
+
+from pypes import import_restriction
+from pypes.globals.queue import DEFAULT_SEGMENT_SIZE
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "SegmentedLog"
+    ]
+
+class SegmentedLog(object):
+    """
+    **An append-only store of byte records, split over numbered segment files**
+
+    Records are read back in the order they were appended. A segment file is deleted as soon as every record in it
+    has been read and writing has moved on to a newer segment.
+
+    Every record is stored with its length and CRC32. When the log is opened, it is cut at the first record that is
+    torn or corrupt (e.g. by a crash mid-write): that segment is truncated before it and every newer segment is deleted,
+    so that records are only ever appended after valid ones.
+
+    sync() fsyncs every segment written since the last sync, and the directory if segments were created, so that a
+    rollover between two syncs never leaves synced records in the page cache only.
+
+    Parameters:
+        directory (str):
+            | The directory holding the segment files. Created if missing
+        segment_size (Optional[int]):
+            | The size (in bytes) after which a new segment file is started
+            | Default: DEFAULT_SEGMENT_SIZE
+    """
+
+    __header = struct.Struct(">II")
+    __suffix = ".seg"
+
+    def __init__(self, directory, segment_size=DEFAULT_SEGMENT_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        segments = self.__recover()
+        self.__read_index = segments[0] if len(segments) > 0 else 0
+        self.__write_index = segments[-1] if len(segments) > 0 else 0
+        self.__reader = None
+        self.__writer = open(self.__segment_path(self.__write_index), "ab")
+        #the segments closed by a rollover since the last sync, and whether the directory gained a segment file
+        self.__unsynced = set()
+        self.__created = True
+
+    def __segment_path(self, index):
+        return os.path.join(self.directory, "%020d%s" % (index, SegmentedLog.__suffix))
+
+    def segments(self):
+        '''Returns the indexes of all segment files currently on disk, oldest first'''
+        return sorted(int(name[:-len(SegmentedLog.__suffix)]) for name in os.listdir(self.directory) if name.endswith(SegmentedLog.__suffix))
+
+    def __recover(self):
+        '''Cuts the log at its first invalid record and returns the indexes of the segments left'''
+        segments = self.segments()
+        for position, index in enumerate(segments):
+            with open(self.__segment_path(index), "r+b") as reader:
+                while not self.__read_record(reader) is None:
+                    pass
+                offset = reader.tell()
+                if reader.read(1) == "":
+                    continue
+                reader.seek(offset)
+                reader.truncate()
+            for newer in segments[position + 1:]:
+                os.remove(self.__segment_path(newer))
+            return segments[:position + 1]
+        return segments
+
+    @property
+    def segment(self):
+        '''The index of the segment currently being written'''
+        return self.__write_index
+
+    def append(self, record):
+        '''Appends <record> and returns the index of the segment it was written to'''
+        if self.__writer.tell() >= self.segment_size:
+            self.__writer.close()
+            self.__unsynced.add(self.__write_index)
+            self.__write_index += 1
+            self.__writer = open(self.__segment_path(self.__write_index), "ab")
+            self.__created = True
+        self.__writer.write(SegmentedLog.__header.pack(len(record), zlib.crc32(record) & 0xffffffff))
+        self.__writer.write(record)
+        return self.__write_index
+
+    def flush(self):
+        self.__writer.flush()
+
+    def sync(self):
+        '''Flushes and fsyncs the segment currently being written, along with every segment closed since the last sync
+        and the directory if it gained segment files'''
+        self.__writer.flush()
+        for index in sorted(self.__unsynced):
+            path = self.__segment_path(index)
+            if os.path.exists(path):
+                self.__fsync(path=path)
+        self.__unsynced.clear()
+        os.fsync(self.__writer.fileno())
+        if self.__created:
+            self.__fsync(path=self.directory)
+            self.__created = False
+
+    def __fsync(self, path):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def __read_record(self, reader):
+        '''Returns the next record, or None with <reader> left after the last valid record if there is none'''
+        position = reader.tell()
+        header = reader.read(SegmentedLog.__header.size)
+        if len(header) == SegmentedLog.__header.size:
+            length, crc = SegmentedLog.__header.unpack(header)
+            record = reader.read(length)
+            if len(record) == length and zlib.crc32(record) & 0xffffffff == crc:
+                return record
+        reader.seek(position)
+        return None
+
+    def read(self):
+        '''Returns the oldest unread record, or None if every record has been read'''
+        while True:
+            if self.__reader is None:
+                path = self.__segment_path(self.__read_index)
+                if not os.path.exists(path) and self.__read_index < self.__write_index:
+                    self.__read_index += 1
+                    continue
+                self.__reader = open(path, "rb")
+            if self.__read_index == self.__write_index:
+                self.__writer.flush()
+            record = self.__read_record(self.__reader)
+            if not record is None:
+                return record
+            if self.__read_index == self.__write_index:
+                return None
+            self.__reader.close()
+            self.__reader = None
+            os.remove(self.__segment_path(self.__read_index))
+            self.__unsynced.discard(self.__read_index)
+            self.__read_index += 1
+
+    def __iter__(self):
+        '''Iterates (segment index, record) for every record still on disk, oldest first, without moving the read position.
+        Iteration stops at the first invalid record'''
+        self.__writer.flush()
+        for index in self.segments():
+            with open(self.__segment_path(index), "rb") as reader:
+                record = self.__read_record(reader)
+                while not record is None:
+                    yield index, record
+                    record = self.__read_record(reader)
+                if reader.read(1) != "":
+                    return
+
+    def discard(self, index):
+        '''Deletes segment <index>. The segment currently being written is never deleted'''
+        if index < self.__write_index:
+            if index == self.__read_index and not self.__reader is None:
+                self.__reader.close()
+                self.__reader = None
+            path = self.__segment_path(index)
+            if os.path.exists(path):
+                os.remove(path)
+            self.__unsynced.discard(index)
+
+    def close(self):
+        if not self.__reader is None:
+            self.__reader.close()
+            self.__reader = None
+        self.__writer.close()
+
+    def destroy(self):
+        '''Closes the log and deletes all of its segment files'''
+        self.close()
+        for index in self.segments():
+            os.remove(self.__segment_path(index))
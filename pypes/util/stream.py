@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import io
+
+from lxml import etree
+
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "XMLStream"
+    ]
+
+class XMLStream(object):
+    """
+    **XML event data that is parsed incrementally, one record at a time, instead of into a full tree**
+
+    records() parses the source with etree.iterparse and clears every record, along with the records before it, once
+    the caller moves on to the next one. Only the record being processed and the root element stay in memory, whatever
+    the size of the document.
+
+    An XMLStream is converted to a full tree like any other event data as soon as an actor accesses XMLEvent.data, so
+    actors that don't stream keep working. A file source can only be streamed from one actor at a time.
+
+    Parameters:
+        source (str|file|etree._Element):
+            | The XML document as a string, a file-like object positioned at its start, or an already parsed element.
+            | Records of an element are iterated without being cleared
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.root = None
+
+    def records(self, tag=None):
+        '''Yields every element matching <tag>, in document order, once it has been completely parsed. <root> is set as
+        soon as the first record is yielded, or once the document has been read if there are no records'''
+        if isinstance(self.source, etree._Element):
+            self.root = self.source
+            for element in self.source.iter(tag=tag):
+                yield element
+            return
+
+        context = etree.iterparse(self.__open(), events=("end",), tag=tag, huge_tree=True)
+        for _, element in context:
+            if self.root is None:
+                self.root = element.getroottree().getroot()
+            yield element
+            element.clear()
+            parent = element.getparent()
+            if not parent is None:
+                while not element.getprevious() is None:
+                    del parent[0]
+        if self.root is None:
+            self.root = context.root
+
+    def read(self):
+        '''Returns the whole document as a string'''
+        if isinstance(self.source, basestring):
+            return self.source
+        if isinstance(self.source, etree._Element):
+            return etree.tostring(self.source)
+        return self.__open().read()
+
+    def parse(self):
+        '''Returns the whole document parsed as a tree'''
+        if isinstance(self.source, etree._Element):
+            return self.source
+        return etree.parse(self.__open()).getroot()
+
+    def __open(self):
+        if isinstance(self.source, basestring):
+            return io.BytesIO(self.source.encode("utf-8") if isinstance(self.source, unicode) else self.source)
+        if self.source.seekable() if hasattr(self.source, "seekable") else hasattr(self.source, "seek"):
+            self.source.seek(0)
+        return self.source
+
+    def __reduce__(self):
+        return (XMLStream, (self.read(),))
@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+
+import collections
+import json
+
+from lxml import etree
+
+from pypes import import_restriction
+
+__all__ = []
+
+if __name__.startswith(import_restriction):
+    __all__ += [
+        "XMLJSONConverter"
+    ]
+
+class XMLJSONConverter(object):
+    """
+    **Converts between XML elements and JSON structures in a single walk, without serializing either side**
+
+    The mapping is the one of xmltodict: attributes become '@' prefixed keys, the text of an element becomes its value
+    when it has neither attributes nor children and its '#text' key otherwise, repeated elements become lists and empty
+    elements become None. Namespaced names keep their prefix, and namespace declarations become '@xmlns' keys.
+
+    JSON that doesn't map to a single root element (an empty or multi-key dict, a list or a single key holding a list)
+    is wrapped in a <pypes_conversion_wrapper> element, which is removed again when converting back.
+
+    An element can force the JSON type it converts to with a pypes_json_type attribute:
+        list:       the element is always a list, even when it occurs only once. An empty element is an empty list
+        string:     the text of the element, or the serialized JSON of its content if it has children
+        dict:       the content of the element as a dict, even when empty
+        anything else converts to null
+    """
+
+    WRAPPER_KEY = "pypes_conversion_wrapper"
+    JSON_TYPE_KEY = "@pypes_json_type"
+
+    __attribute_prefix = "@"
+    __text_key = "#text"
+    __json_type_attribute = JSON_TYPE_KEY[1:]
+    __list_types = (list, tuple)
+    __xml_namespace = "http://www.w3.org/XML/1998/namespace"
+
+    def to_xml(self, data):
+        '''Returns <data>, a dict or list, as an XML element'''
+        if isinstance(data, dict) and len(data) == 1:
+            key, value = next(data.iteritems())
+            if not isinstance(value, XMLJSONConverter.__list_types):
+                return self.__build(parent=None, key=key, value=value)
+        elif isinstance(data, XMLJSONConverter.__list_types):
+            if len(data) == 0:
+                element = etree.Element(XMLJSONConverter.WRAPPER_KEY)
+                element.set(XMLJSONConverter.__json_type_attribute, "list")
+                return element
+            data = {XMLJSONConverter.WRAPPER_KEY: data}
+        return self.__build(parent=None, key=XMLJSONConverter.WRAPPER_KEY, value=data)
+
+    def to_json(self, data):
+        '''Returns <data>, an XML element or tree, as a dict, or as a list if <data> was converted from one'''
+        root = data.getroot() if hasattr(data, "getroot") else data
+        if root is None:
+            raise ValueError("XML document has no root element")
+        value, json_type = self.__walk(element=root, namespaces={})
+        value = self.__apply_json_type(value=value, json_type=json_type)
+        name = self.__name(element=root, tag=root.tag)
+        if name != XMLJSONConverter.WRAPPER_KEY:
+            return collections.OrderedDict([(name, value)])
+        if value is None:
+            return collections.OrderedDict()
+        if isinstance(value, dict) and len(value) == 1 and isinstance(value.get(XMLJSONConverter.WRAPPER_KEY, None), list):
+            return value[XMLJSONConverter.WRAPPER_KEY]
+        return value
+
+    # JSON -> XML
+
+    def __build(self, parent, key, value):
+        #an empty list has no element to build, like in xmltodict
+        element = None
+        for value in (value if isinstance(value, XMLJSONConverter.__list_types) else (value,)):
+            namespaces, attributes, children, text = self.__split(value=value)
+            scope = namespaces
+            if not parent is None and namespaces:
+                scope = dict(parent.nsmap)
+                scope.update(namespaces)
+            elif not parent is None:
+                scope = parent.nsmap
+            tag = self.__qualify(name=key, namespaces=scope, default=True)
+            if parent is None:
+                element = etree.Element(tag, nsmap=namespaces)
+            else:
+                element = etree.SubElement(parent, tag, nsmap=namespaces)
+            for name, attribute in attributes:
+                element.set(self.__qualify(name=name, namespaces=scope, default=False), attribute)
+            for child_key, child_value in children:
+                self.__build(parent=element, key=child_key, value=child_value)
+            if not text is None:
+                if len(element):
+                    element[-1].tail = text
+                else:
+                    element.text = text
+        return element
+
+    def __split(self, value):
+        if value is None:
+            return {}, (), (), None
+        if isinstance(value, bool):
+            return {}, (), (), u"true" if value else u"false"
+        if not isinstance(value, dict):
+            return {}, (), (), self.__text(value=value)
+
+        namespaces, attributes, children, text = {}, [], [], None
+        for key, item in value.iteritems():
+            if key == XMLJSONConverter.__text_key:
+                text = self.__text(value=item)
+            elif key.startswith(XMLJSONConverter.__attribute_prefix):
+                name, item = key[1:], self.__text(value=item)
+                if name == "xmlns":
+                    namespaces[None] = item
+                elif name.startswith("xmlns:"):
+                    namespaces[name[6:]] = item
+                else:
+                    attributes.append((name, item))
+            else:
+                children.append((key, item))
+        return namespaces, attributes, children, text
+
+    def __text(self, value):
+        return value if isinstance(value, basestring) else unicode(value)
+
+    def __qualify(self, name, namespaces, default):
+        prefix, _, local = name.rpartition(":")
+        if prefix == "xml":
+            return "{%s}%s" % (XMLJSONConverter.__xml_namespace, local)
+        if prefix:
+            try:
+                return "{%s}%s" % (namespaces[prefix], local)
+            except KeyError:
+                raise ValueError("Namespace prefix '{0}' is not declared".format(prefix))
+        if default and namespaces.get(None, None):
+            return "{%s}%s" % (namespaces[None], name)
+        return name
+
+    # XML -> JSON
+
+    def __walk(self, element, namespaces):
+        item = collections.OrderedDict()
+        for prefix, uri in element.nsmap.iteritems():
+            if namespaces.get(prefix, None) != uri:
+                item["@xmlns" if prefix is None else "@xmlns:" + prefix] = uri
+        json_type = None
+        for name, value in element.attrib.iteritems():
+            name = self.__name(element=element, tag=name)
+            if name == XMLJSONConverter.__json_type_attribute:
+                json_type = value
+            else:
+                item[XMLJSONConverter.__attribute_prefix + name] = value
+
+        text, children = [element.text] if element.text else [], collections.OrderedDict()
+        for child in element:
+            if child.tail:
+                text.append(child.tail)
+            if isinstance(child.tag, basestring):
+                children.setdefault(self.__name(element=child, tag=child.tag), []).append(self.__walk(element=child, namespaces=element.nsmap))
+        for name, values in children.iteritems():
+            if len(values) == 1:
+                item[name] = self.__apply_json_type(*values[0])
+            else:
+                item[name] = [self.__apply_json_type(value=value, json_type=value_type, in_list=True) for value, value_type in values]
+
+        text = "".join(text).strip() or None
+        if not item and json_type is None:
+            return text, None
+        if not text is None:
+            item[XMLJSONConverter.__text_key] = text
+        return item, json_type
+
+    def __name(self, element, tag):
+        if tag[0] != "{":
+            return tag
+        uri, local = tag[1:].split("}", 1)
+        if uri == XMLJSONConverter.__xml_namespace:
+            return "xml:" + local
+        for prefix, namespace in element.nsmap.iteritems():
+            if namespace == uri and not prefix is None:
+                return "%s:%s" % (prefix, local)
+        return local
+
+    def __apply_json_type(self, value, json_type, in_list=False):
+        if json_type is None:
+            return value
+        if json_type == "dict":
+            return value
+        if json_type == "list":
+            value = self.__value_of(item=value)
+            if in_list:
+                return value
+            return [] if value is None or value == {} else [value]
+        if json_type == "string":
+            value = self.__value_of(item=value)
+            if not value:
+                return u""
+            return json.dumps(value) if isinstance(value, (dict, list)) else value
+        return None
+
+    def __value_of(self, item):
+        if len(item) == 1 and XMLJSONConverter.__text_key in item:
+            return item[XMLJSONConverter.__text_key]
+        return item
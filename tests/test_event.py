@@ -1,8 +1,112 @@
 import unittest
+import logging
+import cPickle as pickle
 
 #from compy.event import HttpEvent, Event
 #from compy.errors import CompysitionException, ResourceNotFound
 from pypes.event import *
+from pypes.util.errors import InvalidEventDataModification
+from lxml import etree
 class TestEvent(unittest.TestCase):
     def test_init(self):
-        Event()
\ No newline at end of file
+        Event()
+class TestEventFork(unittest.TestCase):
+    def test_fork_shares_data(self):
+        data = {"key": ["value"]}
+        events = Event(data=data).fork(count=3)
+        self.assertEqual(len(events), 3)
+        self.assertEqual(len(set(id(event) for event in events)), 3)
+        self.assertIs(events[0]._data, events[2]._data)
+
+    def test_fork_copies_on_access(self):
+        data = {"key": ["value"]}
+        first, second = Event(data=data).fork(count=2)
+        first.data["key"].append("other")
+        self.assertEqual(second.data, {"key": ["value"]})
+        self.assertIs(second.data, data)
+        self.assertIsNot(first.data, data)
+
+    def test_fork_copies_metadata(self):
+        first, second = Event(data="data").fork(count=2)
+        first.splits.append(1)
+        self.assertEqual(second.splits, [])
+
+    def test_fork_getstate(self):
+        first, second = Event(data="data").fork(count=2)
+        self.assertEqual(second.__getstate__()["_data"], "data")
+
+    def test_fork_read_only(self):
+        event = JSONEvent(data={"key": ["value"]})
+        original = event.data
+        forks = event.fork(3)
+        self.assertTrue(all(fork.data_view is original for fork in forks))
+        self.assertEqual(event._data.references, 3)
+        branch = forks[1].data
+        self.assertIsNot(branch, original)
+        self.assertEqual(branch, original)
+        self.assertIs(forks[2].data_view, original)
+        self.assertEqual(event._data.references, 2)
+
+    def test_fork_string_shared(self):
+        forks = Event(data="value").fork(2)
+        self.assertEqual([fork.data for fork in forks], ["value", "value"])
+        self.assertIs(forks[0]._data, forks[1]._data)
+
+class TestEventData(unittest.TestCase):
+    def test_lazy_conversion(self):
+        event = JSONEvent(data="not json")
+        with self.assertRaises(InvalidEventDataModification):
+            event.data
+
+    def test_data_string_cached(self):
+        event = XMLEvent(data="<root/>")
+        self.assertIs(event.data_string, event.data_string)
+
+    def test_data_string_after_modification(self):
+        event = XMLEvent(data="<root/>")
+        event.data_string
+        event.data.append(etree.Element("child"))
+        self.assertEqual(event.data_string, "<root><child/></root>")
+
+    def test_assignment(self):
+        event = JSONEvent(data={"key": "value"})
+        event.data_string
+        event.data = '{"other": "value"}'
+        self.assertEqual(event.data, {"other": "value"})
+        self.assertEqual(event.data_string, '{"other": "value"}')
+
+    def test_pickle_xml(self):
+        event = XMLEvent(data="<root><child/></root>")
+        event.data
+        self.assertEqual(pickle.loads(pickle.dumps(event)).data_string, "<root><child/></root>")
+
+class TestEventSlots(unittest.TestCase):
+    def test_generated_classes_slotted(self):
+        for event_class in (Event, XMLEvent, JSONEvent, HttpEvent):
+            self.assertEqual(event_class.__dict__["__slots__"], ())
+
+    def test_extra_attributes(self):
+        event = Event(data="data", custom="value")
+        self.assertEqual(event.custom, "value")
+        self.assertEqual(event._get_state()["custom"], "value")
+
+    def test_lazy_mixin_state(self):
+        event = TimingEvent()
+        self.assertFalse(hasattr(event, "_timing"))
+        self.assertIsNone(event.timeout)
+        event.set_started(actor_name="actor")
+        self.assertIsNotNone(event.get_started(actor_name="actor"))
+        event = HttpEvent()
+        self.assertFalse(hasattr(event, "_environment"))
+        self.assertEqual(event.status, 200)
+
+    def test_log_event(self):
+        event = LogEvent(log_level=logging.ERROR, log_origin_actor="actor", log_message="message")
+        self.assertEqual(event.log_level, logging.ERROR)
+        self.assertEqual(event.log_message, "message")
+
+    def test_pickle(self):
+        event = TimingEvent(data="data", custom="value")
+        event.timeout = 5
+        copy = pickle.loads(pickle.dumps(event, pickle.HIGHEST_PROTOCOL))
+        self.assertEqual((copy.event_id, copy.data, copy.custom, copy.timeout), (event.event_id, "data", "value", 5))
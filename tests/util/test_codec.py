@@ -0,0 +1,75 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.codec import EventCodec
+from pypes.util.errors import EventCodecError, MalformedEventData
+from pypes.event import Event, XMLEvent, JSONEvent, StringEvent
+from lxml import etree
+from decimal import Decimal
+
+class TestEventCodec(BaseUnitTest):
+
+	def setUp(self):
+		self.codec = EventCodec()
+
+	def roundtrip(self, event):
+		return self.codec.decode(self.codec.encode(event))
+
+	def test_core_attributes(self):
+		event = Event(data="value", service="service")
+		decoded = self.roundtrip(event)
+		self.assertIs(decoded.__class__, Event)
+		self.assertEqual(decoded.event_id, event.event_id)
+		self.assertEqual(decoded.service, "service")
+		self.assertEqual(decoded.created, event.created)
+		self.assertEqual(decoded.data, "value")
+
+	def test_xml_payload(self):
+		event = XMLEvent()
+		event.data = "<root><child>value</child></root>"
+		decoded = self.roundtrip(event)
+		self.assertIs(decoded.__class__, XMLEvent)
+		self.assertEqual(etree.tostring(decoded.data), "<root><child>value</child></root>")
+
+	def test_json_payload(self):
+		event = JSONEvent(data={"key": [1, 2.5, None, True]})
+		self.assertEqual(self.roundtrip(event).data, {"key": [1, 2.5, None, True]})
+
+	def test_text_payload(self):
+		self.assertEqual(self.roundtrip(StringEvent(data=u"caf\xe9")).data, u"caf\xe9")
+		self.assertIsNone(self.roundtrip(Event()).data)
+
+	def test_metadata(self):
+		event = Event(data="value")
+		event.splits.append(12345)
+		event.error = MalformedEventData("invalid")
+		decoded = self.roundtrip(event)
+		self.assertEqual(decoded.splits, [12345])
+		self.assertIsInstance(decoded.error, MalformedEventData)
+		self.assertEqual(decoded.error.message, ["invalid"])
+
+	def test_frames(self):
+		event = StringEvent(data="payload")
+		frames = self.codec.encode_frames(event)
+		self.assertEqual(len(frames), 3)
+		self.assertIs(frames[2], event._data.value)
+		self.assertEqual(self.codec.decode_frames(frames).event_id, event.event_id)
+
+	def test_rejects_unknown_class(self):
+		header, metadata, payload = self.codec.encode_frames(Event(data="value"))
+		header = header.replace("\x00\x05Event", "\x00\x05os.py")
+		with self.assertRaises(EventCodecError):
+			self.codec.decode_frames([header, metadata, payload])
+
+	def test_rejects_version(self):
+		data = self.codec.encode(Event(data="value"))
+		with self.assertRaises(EventCodecError):
+			self.codec.decode(data[:8] + "\x09" + data[9:])
+
+	def test_unencodable(self):
+		with self.assertRaises(EventCodecError) as context:
+			self.codec.encode(Event(data=object()))
+		self.assertIn("is not JSON serializable", str(context.exception))
+
+	def test_decimal(self):
+		event = self.codec.decode(self.codec.encode(JSONEvent(data={"a": Decimal("1.5")}, price=Decimal("2.5"))))
+		self.assertEqual(event.data, {"a": 1.5})
+		self.assertEqual(event.price, 2.5)
@@ -0,0 +1,106 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.environment import LazyMapping, WSGIHeaders, HttpEnvironment
+from pypes.util.codec import EventCodec
+from pypes.event import HttpEvent
+from copy import deepcopy
+import pickle
+
+ENVIRON = {
+	"REQUEST_METHOD": "POST",
+	"PATH_INFO": "/orders",
+	"QUERY_STRING": "page=2&empty=",
+	"HTTP_HOST": "example.com",
+	"HTTP_X_REQUEST_ID": "abc",
+	"CONTENT_TYPE": "application/json",
+	"REMOTE_ADDR": "10.0.0.1",
+	"REMOTE_PORT": "5000",
+	"SERVER_NAME": "server",
+	"SERVER_PORT": "8080",
+	"SERVER_PROTOCOL": "HTTP/1.1",
+	"wsgi.url_scheme": "http",
+	"route.url_args": {"id": "1"}
+}
+
+class TestLazyMapping(BaseUnitTest):
+
+	def test_built_on_access(self):
+		calls = []
+		mapping = LazyMapping(builders={"a": lambda: calls.append("a") or 1, "b": lambda: calls.append("b") or 2})
+		self.assertEqual(sorted(mapping.keys()), ["a", "b"])
+		self.assertEqual(mapping["a"], 1)
+		self.assertEqual(mapping["a"], 1)
+		self.assertEqual(calls, ["a"])
+		self.assertEqual(mapping.built, ["a"])
+
+	def test_set_and_delete_unbuilt(self):
+		mapping = LazyMapping(builders={"a": lambda: self.fail("built"), "b": lambda: self.fail("built")})
+		mapping["a"] = 3
+		del mapping["b"]
+		self.assertEqual(dict(mapping), {"a": 3})
+		with self.assertRaises(KeyError):
+			mapping["b"]
+
+	def test_deepcopy_stays_lazy(self):
+		mapping = LazyMapping(builders={"a": lambda: {"value": 1}, "b": lambda: 2})
+		mapping["a"]["value"] = 5
+		copy = deepcopy(mapping)
+		copy["a"]["value"] = 6
+		self.assertEqual(mapping["a"]["value"], 5)
+		self.assertEqual(copy.built, ["a"])
+		self.assertEqual(copy["b"], 2)
+
+class TestWSGIHeaders(BaseUnitTest):
+
+	def test_lookup(self):
+		headers = WSGIHeaders(environ=ENVIRON)
+		self.assertEqual(headers["X-Request-Id"], "abc")
+		self.assertEqual(headers.get("content-type"), "application/json")
+		self.assertIsNone(headers.get("Origin"))
+		self.assertEqual(sorted(headers.keys()), ["Content-Type", "Host", "X-Request-Id"])
+
+	def test_copy_on_write(self):
+		headers = WSGIHeaders(environ=ENVIRON)
+		headers["Origin"] = "other.com"
+		self.assertEqual(headers["origin"], "other.com")
+		self.assertEqual(headers["Host"], "example.com")
+		self.assertNotIn("HTTP_ORIGIN", ENVIRON)
+
+class TestHttpEnvironment(BaseUnitTest):
+
+	def test_sections(self):
+		environment = HttpEnvironment(environ=ENVIRON, accepted_methods=["POST"])
+		self.assertEqual(environment["request"]["method"], "POST")
+		self.assertEqual(environment["request"]["url"]["path"], "/orders")
+		self.assertEqual(environment.built, ["request"])
+		self.assertEqual(environment["request"]["url"]["domain"], "example.com")
+		self.assertEqual(environment["request"]["url"]["query_args"], {"page": "2", "empty": ""})
+		self.assertEqual(environment["request"]["url"]["path_args"], {"id": "1"})
+		self.assertEqual(environment["remote"]["address"], "10.0.0.1")
+		self.assertEqual(environment["response"], {"headers": {}, "status": 200})
+		self.assertEqual(environment["accepted_methods"], ["POST"])
+
+	def test_defaults(self):
+		environment = HttpEnvironment()
+		self.assertEqual(environment["request"]["headers"], {})
+		self.assertIsNone(environment["request"]["url"]["path"])
+		self.assertIsNone(environment["server"]["name"])
+
+	def test_snapshot(self):
+		environment = HttpEnvironment(environ=ENVIRON)
+		environment["response"]["status"] = 201
+		for snapshot in (pickle.loads(pickle.dumps(environment)), environment.snapshot()):
+			self.assertIs(type(snapshot), dict)
+			self.assertIs(type(snapshot["request"]["headers"]), dict)
+			self.assertEqual(snapshot["request"]["headers"]["Host"], "example.com")
+			self.assertEqual(snapshot["response"]["status"], 201)
+
+	def test_event(self):
+		event = HttpEvent(environment=HttpEnvironment(environ=ENVIRON))
+		self.assertEqual(event.request_headers["X-Request-Id"], "abc")
+		event.environment["response"]["status"] = 404
+		decoded = EventCodec().decode(EventCodec().encode(event))
+		self.assertEqual(decoded.environment["request"]["headers"]["X-Request-Id"], "abc")
+		self.assertEqual(decoded.status, 404)
+		forked = event.fork(2)[1]
+		self.assertEqual(forked.environment["request"]["method"], "POST")
+		self.assertEqual(forked.status, 404)
@@ -2,9 +2,196 @@
 from pypes.testutils import BaseUnitTest
 from pypes.util.errors import (PypesException, QueueEmpty, QueueFull, QueueConnected, SetupError, ReservedName, ActorInitFailure, InvalidEventConversion, InvalidEventDataModification, InvalidEventModification, InvalidActorOutput, InvalidActorInput, ResourceNotModified, MalformedEventData, UnauthorizedEvent, ForbiddenEvent, ResourceNotFound, EventCommandNotAllowed, ActorTimeout, ResourceConflict, ResourceGone, UnprocessableEventData, EventRateExceeded, ServiceUnavailable, EventAttributeError)
 from pypes.event import *
+from pypes.globals.event import get_event_manager, get_id_generator, set_id_generator
+from pypes.util.event import IDGenerator, EventData, EventManager, JSONType, StringType, DefaultType
+from decimal import Decimal
+import collections
+import os
 class TestConversionMethods(BaseUnitTest):
 	
     def test_PypesException(self):
     	exception = PypesException(message="u did something wrong", func="a random kwarg")
     	self.assertEqual(exception.message, ["u did something wrong"])
-    	self.assertEqual(exception.func, "a random kwarg")
\ No newline at end of file
+    	self.assertEqual(exception.func, "a random kwarg")
+class TestConversionPlan(BaseUnitTest):
+
+	def test_compatible(self):
+		plan = get_event_manager().get_conversion_plan(source=JSONEvent, target=Event)
+		self.assertTrue(plan.compatible)
+		event = JSONEvent()
+		self.assertIs(plan.convert(event=event), event)
+
+	def test_cached(self):
+		plan = get_event_manager().get_conversion_plan(source=Event, target=JSONEvent)
+		self.assertIs(get_event_manager().get_conversion_plan(source=Event, target=JSONEvent), plan)
+
+	def test_convert(self):
+		plan = get_event_manager().get_conversion_plan(source=Event, target=JSONEvent)
+		self.assertFalse(plan.compatible)
+		event = plan.convert(event=Event(data='{"key": "value"}', service="service"))
+		self.assertIsInstance(event, JSONEvent)
+		self.assertEqual(event.data, {"key": "value"})
+		self.assertEqual(event.service, "service")
+
+	def test_convert_invalid(self):
+		plan = get_event_manager().get_conversion_plan(source=Event, target=JSONEvent)
+		with self.assertRaises(InvalidEventConversion):
+			plan.convert(event=Event(data='not json'))
+
+	def test_convert_shares_data(self):
+		event = Event(data='{"key": "value"}')
+		converted = get_event_manager().convert(event=event, convert_to=JSONEvent)
+		self.assertIs(converted._data, event._data)
+		self.assertEqual(converted.data, {"key": "value"})
+
+	def test_is_instance(self):
+		self.assertTrue(get_event_manager().is_instance(event=XMLEvent(), convert_to=Event))
+		self.assertFalse(get_event_manager().is_instance(event=Event(), convert_to=XMLEvent))
+
+class TestIDGenerator(BaseUnitTest):
+
+	def test_unique(self):
+		generator = IDGenerator()
+		ids = [generator.next() for index in range(1000)]
+		self.assertEqual(len(set(ids)), 1000)
+		self.assertEqual(len(ids[0]), 32)
+		self.assertEqual(ids[0][:16], ids[-1][:16])
+
+	def test_prefix_per_process(self):
+		first, second = IDGenerator(), IDGenerator()
+		self.assertNotEqual(first.next()[:16], second.next()[:16])
+
+	def test_reset_after_fork(self):
+		generator = IDGenerator()
+		prefix = generator.next()[:16]
+		generator._IDGenerator__pid = -1
+		self.assertNotEqual(generator.next()[:16], prefix)
+
+	def test_lazy_event_id(self):
+		event = Event()
+		self.assertFalse(hasattr(event, "_event_id"))
+		event_id = event.event_id
+		self.assertEqual(event.event_id, event_id)
+		with self.assertRaises(InvalidEventModification):
+			event.event_id = "other"
+
+	def test_assign_event_id(self):
+		event = Event()
+		event.event_id = "assigned"
+		self.assertEqual(event.event_id, "assigned")
+
+	def test_fork_keeps_event_id(self):
+		event = Event()
+		self.assertEqual(set(fork.event_id for fork in event.fork(3)), set([event.event_id]))
+
+	def test_set_id_generator(self):
+		class Generator(object):
+			def next(self):
+				return "fixed"
+		generator = get_id_generator()
+		set_id_generator(Generator())
+		try:
+			self.assertEqual(Event().event_id, "fixed")
+		finally:
+			set_id_generator(generator)
+
+class TestEventData(BaseUnitTest):
+
+	def setUp(self):
+		self.conversions = []
+
+	def convert(self, value):
+		self.conversions.append(value)
+		return "converted %s" % value
+
+	def test_get_cached(self):
+		data = EventData(value=1)
+		self.assertEqual(data.get(format_type=StringType, convert=self.convert), "converted 1")
+		self.assertEqual(data.get(format_type=StringType, convert=self.convert), "converted 1")
+		self.assertEqual(self.conversions, [1])
+
+	def test_get_default(self):
+		data = EventData(value=1)
+		self.assertEqual(data.get(format_type=DefaultType, convert=self.convert), 1)
+		self.assertEqual(self.conversions, [])
+
+	def test_checkout_mutable(self):
+		data = EventData(value="value")
+		data.get(format_type=StringType, convert=self.convert)
+		checked_out = data.checkout(format_type=JSONType, convert=lambda value: {"key": value})
+		self.assertIs(data.value, checked_out)
+		data.get(format_type=StringType, convert=self.convert)
+		self.assertEqual(len(self.conversions), 2)
+
+	def test_checkout_immutable(self):
+		data = EventData(value=1)
+		data.get(format_type=JSONType, convert=self.convert)
+		data.checkout(format_type=StringType, convert=self.convert)
+		self.assertEqual(data.value, 1)
+		self.assertEqual(len(self.conversions), 2)
+
+	def test_owned_format(self):
+		data = EventData(value={"key": "value"}, format_type=JSONType)
+		self.assertIs(data.get(format_type=JSONType, convert=self.convert), data.value)
+		self.assertEqual(self.conversions, [])
+
+	def test_release_keeps_representation(self):
+		data = EventData(value="value", references=2)
+		data.checkout(format_type=JSONType, convert=lambda value: {"key": value})
+		copy = data.release()
+		self.assertIs(copy.get(format_type=JSONType, convert=self.convert), copy.value)
+		self.assertEqual(copy.value, {"key": "value"})
+		self.assertEqual(self.conversions, [])
+
+	def test_release(self):
+		value = {"key": "value"}
+		data = EventData(value=value, references=2)
+		copy = data.release()
+		self.assertIsNot(copy, data)
+		self.assertIsNot(copy.value, value)
+		self.assertIs(data.release(), data)
+		self.assertIs(data.value, value)
+
+class TestJSONAssignment(BaseUnitTest):
+
+	def test_copy(self):
+		value = collections.OrderedDict([("b", [Decimal("1.5"), (1, 2)]), (1, {"c": None})])
+		data = EventManager(json_assignment=EventManager.JSON_COPY).convert_to_json(value=value)
+		self.assertIsNot(data, value)
+		self.assertIsNot(data["b"], value["b"])
+		self.assertIsInstance(data, collections.OrderedDict)
+		self.assertEqual(data, collections.OrderedDict([("b", [1.5, [1, 2]]), ("1", {"c": None})]))
+		self.assertIsInstance(data["b"][0], float)
+
+	def test_validate(self):
+		value = {"a": [Decimal("1.5")], "b": {"c": (1, 2)}, True: "d"}
+		nested = value["a"]
+		data = EventManager(json_assignment=EventManager.JSON_VALIDATE).convert_to_json(value=value)
+		self.assertIs(data, value)
+		self.assertIs(data["a"], nested)
+		self.assertEqual(data, {"a": [1.5], "b": {"c": [1, 2]}, "true": "d"})
+
+	def test_serialize(self):
+		value = {"a": [Decimal("1.5")]}
+		self.assertEqual(EventManager(json_assignment=EventManager.JSON_SERIALIZE).convert_to_json(value=value), {"a": [1.5]})
+
+	def test_invalid(self):
+		for mode in (EventManager.JSON_SERIALIZE, EventManager.JSON_COPY, EventManager.JSON_VALIDATE):
+			with self.assertRaises(InvalidEventDataModification):
+				EventManager(json_assignment=mode).convert_format(format_type=JSONType, value={"a": object()})
+
+	def test_unknown_mode(self):
+		with self.assertRaises(ValueError):
+			EventManager(json_assignment="deepcopy")
+
+	def test_event_assignment(self):
+		manager = get_event_manager()
+		value = {"key": ["value"]}
+		try:
+			manager.json_assignment = EventManager.JSON_VALIDATE
+			self.assertIs(JSONEvent(data=value).data, value)
+		finally:
+			manager.json_assignment = EventManager.JSON_COPY
+		event = JSONEvent(data=value)
+		self.assertEqual(event.data, value)
+		self.assertIsNot(event.data, value)
@@ -0,0 +1,143 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.logger import Logger, LogSink
+from pypes.util.queue import InternalQueuePool
+import gevent
+import logging
+import time
+
+class TestLogger(BaseUnitTest):
+
+	def setUp(self):
+		self.pool = InternalQueuePool()
+		self.queue = self.pool.add(name="logs")
+
+	def messages(self):
+		return [event.log_message for event in self.queue.get_batch(max_size=100)]
+
+	def test_level_gating(self):
+		logger = Logger("test", self.pool, level=logging.INFO)
+		logger.debug("dropped")
+		logger.info("sent")
+		self.assertEqual(self.messages(), ["sent"])
+		logger.level = None
+		logger.debug("default")
+		self.assertEqual(self.messages(), ["default"])
+
+	def test_lazy_message(self):
+		logger = Logger("test", self.pool, level=logging.INFO)
+		calls = []
+		logger.debug(lambda: calls.append(1))
+		self.assertEqual(calls, [])
+		logger.info(lambda: "called")
+		self.assertEqual(self.messages(), ["called"])
+
+	def test_format_kwargs(self):
+		logger = Logger("test", self.pool)
+		logger.info("{count} records", count=3)
+		logger.info("{literal}")
+		self.assertEqual(self.messages(), ["3 records", "{literal}"])
+
+	def test_sampling(self):
+		logger = Logger("test", self.pool)
+		for index in range(3):
+			logger.warning("repeated", sample_interval=.05)
+		self.assertEqual(self.messages(), ["repeated"])
+		time.sleep(.06)
+		logger.warning("repeated", sample_interval=.05)
+		self.assertEqual(self.messages(), ["repeated (2 similar messages suppressed)"])
+
+	def test_sampling_callables(self):
+		logger = Logger("test", self.pool)
+		for index in range(3):
+			logger.warning(lambda: "repeated", sample_interval=10)
+		self.assertEqual(self.messages(), ["repeated"])
+
+class RecordingActor(object):
+
+	def __init__(self, batched=False):
+		self.name = "sink"
+		self.batched = batched
+		self.batches = []
+		self.failing = False
+
+	def consume(self, event, origin_queue):
+		self.consume_batch(events=[event], origin_queue=origin_queue)
+
+	def consume_batch(self, events, origin_queue):
+		if self.failing:
+			raise IOError("Unable to write")
+		self.batches.append(events)
+
+	def messages(self):
+		return [event.log_message for batch in self.batches for event in batch]
+
+class TestLogSink(BaseUnitTest):
+
+	def test_logger_bypasses_pool(self):
+		pool, actor = InternalQueuePool(), RecordingActor(batched=True)
+		queue = pool.add(name="logs")
+		sink = LogSink(actor=actor)
+		Logger("test", pool, sink=sink).info("direct")
+		self.assertEqual(queue.qsize(), 0)
+		sink.start()
+		gevent.sleep(.01)
+		self.assertEqual(actor.messages(), ["direct"])
+		self.assertEqual(actor.batches[0][0].log_origin_actor, "test")
+		sink.stop()
+
+	def test_batches(self):
+		actor = RecordingActor(batched=True)
+		sink = LogSink(actor=actor, batch_size=2)
+		for index in range(3):
+			sink.put(level=logging.INFO, origin="test", message=str(index))
+		sink.start()
+		gevent.sleep(.01)
+		self.assertEqual([len(batch) for batch in actor.batches], [2, 1])
+		sink.stop()
+
+	def test_drop(self):
+		actor = RecordingActor()
+		sink = LogSink(actor=actor, size=1)
+		sink.put(level=logging.INFO, origin="test", message="kept")
+		sink.put(level=logging.INFO, origin="test", message="dropped")
+		self.assertEqual(sink.dropped, 1)
+		sink.stop()
+		self.assertEqual(actor.messages(), ["kept", "Dropped 1 log messages, the log buffer was full"])
+		self.assertEqual(sink.dropped, 0)
+
+	def test_drop_unicode_policy(self):
+		sink = LogSink(actor=RecordingActor(), size=1, policy=u"drop")
+		sink.put(level=logging.INFO, origin="test", message="kept")
+		sink.put(level=logging.INFO, origin="test", message="dropped")
+		self.assertEqual(sink.dropped, 1)
+
+	def test_block(self):
+		actor = RecordingActor()
+		sink = LogSink(actor=actor, size=1, policy=LogSink.BLOCK)
+		sink.put(level=logging.INFO, origin="test", message="first")
+		blocked = gevent.spawn(sink.put, level=logging.INFO, origin="test", message="second")
+		gevent.sleep(.01)
+		self.assertFalse(blocked.ready())
+		sink.start()
+		blocked.join(timeout=.5)
+		gevent.sleep(.01)
+		self.assertEqual(actor.messages(), ["first", "second"])
+		sink.stop()
+
+	def test_failed_writes(self):
+		actor = RecordingActor(batched=True)
+		sink = LogSink(actor=actor)
+		actor.failing = True
+		sink.put(level=logging.INFO, origin="test", message="lost")
+		sink.put(level=logging.INFO, origin="test", message="lost")
+		sink.stop()
+		self.assertEqual(sink.failed, 2)
+		actor.failing = False
+		sink.put(level=logging.INFO, origin="test", message="written")
+		sink.stop()
+		self.assertEqual(actor.messages(), ["written", "Failed to write 2 log messages"])
+		self.assertEqual(sink.failed, 0)
+
+	def test_invalid_policy(self):
+		with self.assertRaises(ValueError):
+			LogSink(actor=RecordingActor(), policy="wait")
@@ -0,0 +1,44 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.metrics import Histogram, ActorMetrics
+from pypes.util.queue import QueuePool
+
+class TestHistogram(BaseUnitTest):
+
+	def test_empty(self):
+		histogram = Histogram(buckets=(1, 2, 3))
+		self.assertEqual(histogram.percentile(50), 0.0)
+		self.assertEqual(histogram.mean, 0.0)
+
+	def test_record(self):
+		histogram = Histogram(buckets=(1, 2, 3))
+		for value in (0.5, 1.5, 1.5, 2.5):
+			histogram.record(value)
+		self.assertEqual(histogram.counts, [1, 2, 1, 0])
+		self.assertEqual(histogram.count, 4)
+		self.assertEqual(histogram.max, 2.5)
+		self.assertEqual(histogram.mean, 1.5)
+
+	def test_percentile(self):
+		histogram = Histogram(buckets=(1, 2, 3))
+		for value in [0.5] * 90 + [2.5] * 9 + [10]:
+			histogram.record(value)
+		self.assertEqual(histogram.percentile(50), 1)
+		self.assertEqual(histogram.percentile(95), 3)
+		self.assertEqual(histogram.percentile(100), 10)
+
+class TestActorMetrics(BaseUnitTest):
+
+	def test_snapshot(self):
+		pool = QueuePool()
+		queue = pool.inbound.add(name="inbox")
+		queue.put(1)
+		queue.put(2)
+		queue.get()
+		metrics = ActorMetrics(pool=pool)
+		metrics.consumed += 1
+		snapshot = metrics.snapshot()
+		self.assertEqual(snapshot["consumed"], 1)
+		self.assertEqual(snapshot["errored"], 0)
+		self.assertEqual(snapshot["queue_depth"], {"inbox": 1})
+		self.assertEqual(snapshot["queue_high_watermark"], {"inbox": 2})
+		self.assertEqual(snapshot["latency"]["count"], 0)
@@ -0,0 +1,100 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.offload import InlineOffloader, ProcessOffloader, ThreadOffloader, PerThread, create_offloader
+from pypes.util.errors import PypesException
+import gevent
+from gevent.monkey import get_original
+import os
+
+def square(value):
+	return value * value
+
+def pid():
+	return os.getpid()
+
+def fail(message):
+	raise ValueError(message)
+
+def exit():
+	os._exit(1)
+
+def slow(value):
+	#time is patched by gevent, which must not run in the worker
+	get_original("time", "sleep")(.2)
+	return value
+
+class TestOffloader(BaseUnitTest):
+
+	def test_create(self):
+		self.assertIsInstance(create_offloader(), InlineOffloader)
+		self.assertIsInstance(create_offloader(mode="process", size=1), ProcessOffloader)
+		with self.assertRaises(ValueError):
+			create_offloader(mode="unknown")
+
+	def test_inline(self):
+		offloader = InlineOffloader()
+		self.assertEqual(offloader.run(square, 3), 9)
+		self.assertEqual(offloader.run(pid), os.getpid())
+
+class TestProcessOffloader(BaseUnitTest):
+
+	def setUp(self):
+		self.offloader = ProcessOffloader(size=2)
+
+	def tearDown(self):
+		self.offloader.close()
+
+	def test_run(self):
+		self.assertEqual(self.offloader.run(square, value=4), 16)
+		self.assertNotEqual(self.offloader.run(pid), os.getpid())
+
+	def test_error(self):
+		with self.assertRaises(ValueError):
+			self.offloader.run(fail, "invalid")
+		self.assertEqual(self.offloader.run(square, 2), 4)
+
+	def test_concurrent(self):
+		greenlets = [gevent.spawn(self.offloader.run, square, index) for index in range(10)]
+		gevent.joinall(greenlets)
+		self.assertEqual([greenlet.value for greenlet in greenlets], [index * index for index in range(10)])
+
+	def test_worker_exit(self):
+		with self.assertRaises(PypesException):
+			self.offloader.run(exit)
+		self.assertEqual(self.offloader.run(square, 5), 25)
+
+	def test_killed_caller(self):
+		offloader = ProcessOffloader(size=1)
+		try:
+			greenlet = gevent.spawn(offloader.run, slow, "stale")
+			gevent.sleep(.05)
+			greenlet.kill()
+			self.assertEqual(offloader.run(square, 3), 9)
+			with self.assertRaises(gevent.Timeout):
+				with gevent.Timeout(.05):
+					offloader.run(slow, "stale")
+			self.assertEqual(offloader.run(square, 4), 16)
+		finally:
+			offloader.close()
+
+class TestThreadOffloader(BaseUnitTest):
+
+	def setUp(self):
+		self.offloader = ThreadOffloader(size=2)
+
+	def tearDown(self):
+		self.offloader.close()
+
+	def test_run(self):
+		self.assertEqual(self.offloader.run(square, value=4), 16)
+		self.assertEqual(self.offloader.run(pid), os.getpid())
+		self.assertIsInstance(create_offloader(mode="thread"), ThreadOffloader)
+
+	def test_error(self):
+		with self.assertRaises(ValueError):
+			self.offloader.run(fail, "invalid")
+
+	def test_per_thread(self):
+		per_thread = PerThread(factory=object)
+		local = per_thread.get()
+		self.assertIs(gevent.spawn(per_thread.get).get(), local)
+		self.assertIsNot(self.offloader.run(per_thread.get), local)
@@ -0,0 +1,90 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.process import QueueSender, QueueReceiver, queue_endpoint
+from pypes.util.queue import Queue, RingQueue, QueuePool
+from pypes.util.logger import Logger
+from pypes.util.errors import EventCodecError
+from pypes.util.codec import EventCodec
+from pypes.event import Event
+import gevent
+import zmq.green as zmq
+import shutil
+import tempfile
+
+class RecordingActor(object):
+
+	def __init__(self):
+		self.pool = QueuePool()
+		self.logs = self.pool.logs.add(name="logs")
+		self.logger = Logger("bridge", self.pool.logs)
+		self.errors = []
+
+	def send_error(self, event):
+		self.errors.append(event)
+
+class TestQueueBridge(BaseUnitTest):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+		self.bridges = []
+
+	def tearDown(self):
+		for bridge in self.bridges:
+			bridge.stop()
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def bridge(self, source, destinations, actor=None):
+		endpoints = [queue_endpoint(directory=self.directory, queue=source, process=index) for index in range(len(destinations))]
+		self.bridges += [QueueReceiver(queue=destination, endpoint=endpoint) for destination, endpoint in zip(destinations, endpoints)]
+		self.bridges.append(QueueSender(queue=source, endpoints=endpoints, actor=actor))
+		for bridge in self.bridges:
+			bridge.start()
+
+	def test_endpoint(self):
+		queue = Queue("test")
+		self.assertEqual(queue_endpoint(directory="/tmp", queue=queue, process="0.1"), "ipc:///tmp/{0}.0.1".format(id(queue)))
+
+	def test_transfer(self):
+		source, destination = Queue("source"), RingQueue("destination")
+		self.bridge(source=source, destinations=[destination])
+		source.put(Event(data="bridged"))
+		self.assertEqual(destination.get(block=True, timeout=1).data, "bridged")
+		self.assertEqual(source.qsize(), 0)
+
+	def test_round_robin(self):
+		source, destinations = RingQueue("source"), [RingQueue("first"), RingQueue("second")]
+		self.bridge(source=source, destinations=destinations)
+		gevent.sleep(.1)
+		for index in range(4):
+			source.put(Event(data=str(index)))
+		received = destinations[0].get_batch(max_size=4, timeout=.5) + destinations[1].get_batch(max_size=4, timeout=.5)
+		self.assertEqual(sorted(event.data for event in received), ["0", "1", "2", "3"])
+
+	def test_unencodable_event(self):
+		actor = RecordingActor()
+		source, destination = RingQueue("source"), RingQueue("destination")
+		self.bridge(source=source, destinations=[destination], actor=actor)
+		unencodable = Event(data={"key": object()})
+		source.put(unencodable)
+		source.put(Event(data="bridged"))
+		self.assertEqual(destination.get(block=True, timeout=1).data, "bridged")
+		self.assertEqual(source.qsize(), 0)
+		self.assertEqual(self.bridges[-1].failed, 1)
+		self.assertEqual(actor.errors, [unencodable])
+		self.assertIsInstance(unencodable.error, EventCodecError)
+		self.assertIn("Unable to bridge queue 'source'", actor.logs.get().log_message)
+
+	def test_undecodable_message(self):
+		destination = RingQueue("destination")
+		endpoint = queue_endpoint(directory=self.directory, queue=destination, process=0)
+		receiver = QueueReceiver(queue=destination, endpoint=endpoint)
+		self.bridges.append(receiver)
+		receiver.start()
+		socket = receiver.context.socket(zmq.PUSH)
+		socket.connect(endpoint)
+		try:
+			socket.send_multipart(["garbage"])
+			socket.send_multipart(EventCodec().encode_frames(event=Event(data="bridged")))
+			self.assertEqual(destination.get(block=True, timeout=1).data, "bridged")
+			self.assertEqual(receiver.failed, 1)
+		finally:
+			socket.close(linger=0)
@@ -0,0 +1,331 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.queue import Queue, QueuePool, RingQueue, SpillQueue, PersistentQueue, QUEUE_EMPTY
+from pypes.util.errors import QueueEmpty, QueueFull
+from pypes.util.async import timestamp
+from pypes.event import Event
+import gevent
+import os
+import shutil
+import tempfile
+
+class TestQueue(BaseUnitTest):
+
+	def test_get_batch_max_size(self):
+		queue = Queue("test")
+		for index in range(5):
+			queue.put(index)
+		self.assertEqual(queue.get_batch(max_size=3), [0, 1, 2])
+		self.assertEqual(queue.get_batch(max_size=3), [3, 4])
+		self.assertEqual(queue.get_batch(max_size=3), [])
+
+	def test_get_batch_timeout(self):
+		queue = Queue("test")
+		queue.put(0)
+		gevent.spawn_later(.05, queue.put, 1)
+		start = timestamp()
+		self.assertEqual(queue.get_batch(max_size=10, timeout=.2), [0, 1])
+		self.assertGreater(timestamp() - start, .15)
+
+	def test_get_batch_clears_content(self):
+		queue = Queue("test")
+		queue.put(0)
+		queue.get_batch(max_size=10)
+		self.assertFalse(queue._Queue__has_content.is_set())
+
+	def test_wait_until_empty(self):
+		queue = Queue("test")
+		self.assertTrue(queue.wait_until_empty(timeout=0))
+		queue.put(0)
+		self.assertFalse(queue.wait_until_empty(timeout=.05))
+		gevent.spawn_later(.05, queue.get)
+		self.assertTrue(queue.wait_until_empty(timeout=.5))
+
+	def test_wait_until_free(self):
+		queue = Queue("test", maxsize=1)
+		self.assertTrue(queue.wait_until_free(timeout=0))
+		queue.put(0)
+		self.assertFalse(queue.wait_until_free(timeout=.05))
+		gevent.spawn_later(.05, queue.get)
+		self.assertTrue(queue.wait_until_free(timeout=.5))
+
+	def test_wait_until_free_unbounded(self):
+		queue = Queue("test")
+		for index in range(10):
+			queue.put(index)
+		self.assertTrue(queue.wait_until_free(timeout=0))
+
+	def test_put_full(self):
+		queue = Queue("test", maxsize=1)
+		queue.put(0)
+		with self.assertRaises(QueueFull):
+			queue.put(1, block=True, timeout=.05)
+
+	def test_try_get_put(self):
+		queue = Queue("test", maxsize=1)
+		self.assertIs(queue.try_get(), QUEUE_EMPTY)
+		self.assertTrue(queue.try_put(0))
+		self.assertFalse(queue.try_put(1))
+		self.assertEqual(queue.try_get(), 0)
+
+class TestQueuePool(BaseUnitTest):
+
+	def test_join(self):
+		pool = QueuePool()
+		queue = pool.inbound.add(name="inbox")
+		queue.put(0)
+		gevent.spawn_later(.05, queue.get)
+		start = timestamp()
+		pool.join(timeout=.5)
+		self.assertEqual(queue.qsize(), 0)
+		self.assertLess(timestamp() - start, .4)
+
+class TestRingQueue(BaseUnitTest):
+
+	def test_fifo(self):
+		queue = RingQueue("test")
+		for index in range(5):
+			queue.put(index)
+		self.assertEqual(queue.qsize(), 5)
+		self.assertEqual([queue.get() for index in range(5)], range(5))
+		self.assertEqual(queue.high_watermark, 5)
+
+	def test_try_get_put(self):
+		queue = RingQueue("test", maxsize=1)
+		self.assertIs(queue.try_get(), QUEUE_EMPTY)
+		self.assertTrue(queue.try_put(None))
+		self.assertFalse(queue.try_put(1))
+		self.assertIs(queue.try_get(), None)
+
+	def test_get_empty(self):
+		queue = RingQueue("test")
+		with self.assertRaises(QueueEmpty):
+			queue.get()
+		with self.assertRaises(QueueEmpty):
+			queue.get(block=True, timeout=.05)
+
+	def test_get_blocking(self):
+		queue = RingQueue("test")
+		gevent.spawn_later(.05, queue.put, 0)
+		self.assertEqual(queue.get(block=True, timeout=.5), 0)
+
+	def test_put_full(self):
+		queue = RingQueue("test", maxsize=1)
+		queue.put(0)
+		with self.assertRaises(QueueFull):
+			queue.put(1, block=False)
+		gevent.spawn_later(.05, queue.get)
+		queue.put(1, timeout=.5)
+		self.assertEqual(queue.get(), 1)
+
+	def test_get_batch(self):
+		queue = RingQueue("test")
+		queue.put(0)
+		gevent.spawn_later(.05, queue.put, 1)
+		self.assertEqual(queue.get_batch(max_size=2, timeout=.5), [0, 1])
+		self.assertEqual(queue.get_batch(max_size=2), [])
+
+	def test_waits(self):
+		queue = RingQueue("test", maxsize=1)
+		self.assertFalse(queue.wait_until_content(timeout=0))
+		self.assertTrue(queue.wait_until_empty(timeout=0))
+		queue.put(0)
+		self.assertFalse(queue.wait_until_free(timeout=.05))
+		gevent.spawn_later(.05, queue.get)
+		self.assertTrue(queue.wait_until_free(timeout=.5))
+		self.assertTrue(queue.wait_until_empty(timeout=0))
+
+	def test_dump(self):
+		queue, other_queue = RingQueue("test"), Queue("other")
+		queue.put(0)
+		queue.put(1)
+		queue.dump(other_queue)
+		self.assertEqual(queue.qsize(), 0)
+		self.assertEqual(other_queue.get_batch(max_size=5), [0, 1])
+
+	def test_pool(self):
+		pool = QueuePool(size=5, queue_class=RingQueue)
+		queue = pool.inbound.add(name="inbox")
+		self.assertIsInstance(queue, RingQueue)
+		self.assertEqual(queue.maxsize, 5)
+
+class TestSpillQueue(BaseUnitTest):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_spill_fifo(self):
+		queue = SpillQueue("test", maxsize=2, directory=self.directory, segment_size=16)
+		for index in range(10):
+			queue.put(index)
+		self.assertEqual(queue.qsize(), 10)
+		self.assertEqual(queue.spilled, 8)
+		self.assertEqual([queue.get() for index in range(10)], range(10))
+		self.assertEqual(queue.spilled, 0)
+		self.assertEqual(queue.high_watermark, 2)
+
+	def test_interleaved(self):
+		queue = SpillQueue("test", maxsize=1, directory=self.directory)
+		queue.put(0)
+		queue.put(1)
+		self.assertEqual(queue.get(), 0)
+		queue.put(2)
+		self.assertEqual(queue.get_batch(max_size=5), [1, 2])
+
+	def test_event_roundtrip(self):
+		queue = SpillQueue("test", maxsize=1, directory=self.directory)
+		first, second = Event(data="first"), Event(data="second")
+		queue.put(first)
+		queue.put(second)
+		queue.get()
+		spilled = queue.get()
+		self.assertEqual(spilled.event_id, second.event_id)
+		self.assertEqual(spilled.data, "second")
+
+	def test_close(self):
+		queue = SpillQueue("test", maxsize=1, directory=self.directory)
+		queue.put(0)
+		queue.put(1)
+		queue.close()
+		queue.close()
+		self.assertEqual(os.listdir(self.directory), [])
+		self.assertEqual(queue.qsize(), 1)
+
+	def test_pool(self):
+		pool = QueuePool(size=5, queue_class=SpillQueue)
+		queue = pool.inbound.add(name="inbox")
+		self.assertIsInstance(queue, SpillQueue)
+		self.assertTrue(queue.wait_until_free(timeout=0))
+
+class TestPersistentQueue(BaseUnitTest):
+
+	def setUp(self):
+		self.directory = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, ignore_errors=True)
+
+	def test_requires_directory(self):
+		with self.assertRaises(ValueError):
+			PersistentQueue("test")
+
+	def test_replay_unacked(self):
+		queue = PersistentQueue("test", directory=self.directory)
+		for index in range(4):
+			queue.put(index)
+		queue.ack(queue.get())
+		queue.get()
+		queue.close()
+		queue = PersistentQueue("test", directory=self.directory)
+		self.assertEqual(queue.qsize(), 3)
+		self.assertEqual(queue.unacked, 3)
+		self.assertEqual([queue.get() for index in range(3)], [1, 2, 3])
+
+	def test_dropped_element(self):
+		queue = PersistentQueue("test", directory=self.directory)
+		queue.put(Event(data="dropped"))
+		queue.get()
+		for index in range(10):
+			queue.put(Event(data=str(index)))
+			queue.ack(queue.get())
+		queue.close()
+		replayed = PersistentQueue("test", directory=self.directory)
+		self.assertEqual(replayed.qsize(), 1)
+		self.assertEqual(replayed.get().data, "dropped")
+
+	def test_put_is_durable_before_close(self):
+		queue = PersistentQueue("test", directory=self.directory, commit_interval=.01)
+		queue.put(Event(data="durable"))
+		replayed = PersistentQueue("test", directory=self.directory)
+		self.assertEqual(replayed.get().data, "durable")
+
+	def test_group_commit(self):
+		queue = PersistentQueue("test", directory=self.directory, commit_interval=.01, commit_size=2)
+		self.assertTrue(queue.try_put(0))
+		scheduled = queue._PersistentQueue__scheduled
+		self.assertIsNotNone(scheduled)
+		self.assertTrue(queue.try_put(1))
+		self.assertIsNone(queue._PersistentQueue__scheduled)
+		self.assertEqual(queue._PersistentQueue__synced, 2)
+		gevent.sleep(0)
+		self.assertTrue(scheduled.dead)
+		self.assertIsInstance(scheduled.value, gevent.GreenletExit)
+
+	def test_rollover_synced(self):
+		synced, fsync = [], os.fsync
+		def record(fd):
+			synced.append(os.readlink("/proc/self/fd/{0}".format(fd)))
+			fsync(fd)
+		queue = PersistentQueue("test", directory=self.directory, segment_size=16, commit_interval=60, commit_size=100)
+		os.fsync = record
+		try:
+			for index in range(4):
+				queue.try_put(index)
+			segments = sorted(os.listdir(self.directory))
+			self.assertGreater(len(segments), 1)
+			queue.commit()
+		finally:
+			os.fsync = fsync
+			queue.close()
+		self.assertEqual(set(synced), set([os.path.join(self.directory, segment) for segment in segments] + [self.directory]))
+
+	def test_segments_compacted(self):
+		queue = PersistentQueue("test", directory=self.directory, segment_size=16)
+		for index in range(10):
+			queue.put(index)
+		self.assertGreater(len(os.listdir(self.directory)), 1)
+		for index in range(10):
+			queue.ack(queue.get())
+		self.assertEqual(len(os.listdir(self.directory)), 1)
+		queue.close()
+		self.assertEqual(PersistentQueue("test", directory=self.directory).qsize(), 0)
+
+	def test_torn_tail(self):
+		queue = PersistentQueue("test", directory=self.directory)
+		for index in range(3):
+			queue.put(index)
+		queue.close()
+		path = os.path.join(self.directory, os.listdir(self.directory)[0])
+		size = os.path.getsize(path)
+		with open(path, "r+b") as segment:
+			segment.truncate(size - 1)
+		queue = PersistentQueue("test", directory=self.directory)
+		self.assertEqual(queue.qsize(), 2)
+		queue.put(3)
+		queue.close()
+		queue = PersistentQueue("test", directory=self.directory)
+		self.assertEqual([queue.get() for index in range(3)], [0, 1, 3])
+
+	def test_corrupt_record(self):
+		queue = PersistentQueue("test", directory=self.directory, segment_size=16)
+		for index in range(4):
+			queue.put(index)
+		queue.close()
+		segments = sorted(os.listdir(self.directory))
+		self.assertGreater(len(segments), 2)
+		path = os.path.join(self.directory, segments[1])
+		with open(path, "r+b") as segment:
+			segment.seek(-1, os.SEEK_END)
+			last = segment.read(1)
+			segment.seek(-1, os.SEEK_END)
+			segment.write(chr(ord(last) ^ 0xff))
+		queue = PersistentQueue("test", directory=self.directory)
+		self.assertEqual(queue.qsize(), 1)
+		self.assertEqual(sorted(os.listdir(self.directory)), segments[:2])
+		self.assertEqual(queue.get(), 0)
+
+	def test_close_commits_acks(self):
+		queue = PersistentQueue("test", directory=self.directory, commit_interval=60)
+		queue.try_put(0)
+		queue.ack(queue.get())
+		queue.close()
+		queue.close()
+		self.assertEqual(PersistentQueue("test", directory=self.directory).qsize(), 0)
+
+	def test_not_fused(self):
+		queue = PersistentQueue("test", directory=self.directory)
+		self.assertTrue(queue.DURABLE)
+		self.assertFalse(RingQueue("test").DURABLE)
+
@@ -0,0 +1,82 @@
+from pypes.testutils import BaseUnitTest
+from pypes.actors.util.records import detach_json_records, assemble_json_records, detach_xml_records, assemble_xml_records, ExpiredParents
+from pypes.event import XMLEvent, JSONEvent
+from pypes.util.errors import MalformedEventData
+from lxml import etree
+import io
+
+class TestJSONRecords(BaseUnitTest):
+
+	def test_round_trip(self):
+		event = JSONEvent(data={"batch": {"id": 1, "records": [{"value": 0}, {"value": 1}]}})
+		records = list(detach_json_records(event=event, key_chain=["batch", "records"]))
+		self.assertEqual(records, [{"value": 0}, {"value": 1}])
+		self.assertEqual(event.data["batch"]["records"], [])
+		data = assemble_json_records(parent=event, records=records, key_chain=["batch", "records"])
+		self.assertEqual(data, {"batch": {"id": 1, "records": [{"value": 0}, {"value": 1}]}})
+
+	def test_empty_key_chain(self):
+		event = JSONEvent(data=[1, 2, 3])
+		records = list(detach_json_records(event=event, key_chain=[]))
+		self.assertEqual(records, [1, 2, 3])
+		self.assertEqual(event.data, [])
+		self.assertEqual(assemble_json_records(parent=event, records=records, key_chain=[]), [1, 2, 3])
+
+	def test_no_parent(self):
+		data = assemble_json_records(parent=None, records=[1], key_chain=["batch", "records"])
+		self.assertEqual(data, {"batch": {"records": [1]}})
+
+	def test_malformed(self):
+		event = JSONEvent(data={"batch": {"records": {"value": 0}}})
+		with self.assertRaises(MalformedEventData):
+			detach_json_records(event=event, key_chain=["batch", "missing"])
+		with self.assertRaises(MalformedEventData):
+			detach_json_records(event=event, key_chain=["batch", "records"])
+
+class TestXMLRecords(BaseUnitTest):
+
+	def setUp(self):
+		self.document = '<batch id="1"><head/><body>' + "".join('<record><value>%d</value></record>' % index for index in range(3)) + '</body></batch>'
+
+	def test_xpath_round_trip(self):
+		event = XMLEvent(data=etree.fromstring(self.document))
+		records = list(detach_xml_records(event=event, xpath=etree.XPath("//record")))
+		self.assertEqual([record.findtext("value") for record in records], ["0", "1", "2"])
+		self.assertEqual(event.record_container, "/batch/body")
+		self.assertEqual(len(event.data.find("body")), 0)
+		root = assemble_xml_records(parent=event, records=records, root_tag="batch")
+		self.assertEqual(etree.tostring(root), self.document)
+
+	def test_root_record(self):
+		event = XMLEvent(data=etree.fromstring(self.document))
+		with self.assertRaises(MalformedEventData):
+			detach_xml_records(event=event, xpath=etree.XPath("/batch"))
+
+	def test_no_parent(self):
+		root = assemble_xml_records(parent=None, records=[etree.Element("record")], root_tag="batch")
+		self.assertEqual(etree.tostring(root), "<batch><record/></batch>")
+
+	def test_stream_round_trip(self):
+		event = XMLEvent(data=io.BytesIO(self.document))
+		records = list(detach_xml_records(event=event, record_tag="record"))
+		self.assertEqual([record.findtext("value") for record in records], ["0", "1", "2"])
+		self.assertEqual(event.record_container, "/batch/body")
+		self.assertEqual(etree.tostring(event.data), '<batch id="1"><body/></batch>')
+		root = assemble_xml_records(parent=event, records=records, root_tag="batch")
+		self.assertEqual([record.findtext("value") for record in root.iter("record")], ["0", "1", "2"])
+
+	def test_stream_without_records(self):
+		event = XMLEvent(data=self.document)
+		self.assertEqual(list(detach_xml_records(event=event, record_tag="missing")), [])
+		self.assertEqual(event.data.tag, "batch")
+
+class TestExpiredParents(BaseUnitTest):
+
+	def test_bounded(self):
+		expired = ExpiredParents(size=2)
+		for parent_id in ["a", "b", "c"]:
+			expired.add(parent_id)
+		self.assertEqual(len(expired), 2)
+		self.assertFalse("a" in expired)
+		self.assertTrue("b" in expired)
+		self.assertTrue("c" in expired)
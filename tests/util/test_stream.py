@@ -0,0 +1,72 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.stream import XMLStream
+from pypes.util.codec import EventCodec
+from pypes.event import XMLEvent, JSONEvent
+from pypes.util.event import XMLType
+from lxml import etree
+import cPickle as pickle
+import io
+
+class TestXMLStream(BaseUnitTest):
+
+	def setUp(self):
+		self.document = '<batch id="1"><head/>' + "".join('<record><value>%d</value></record>' % index for index in range(5)) + '</batch>'
+
+	def test_records(self):
+		stream = XMLStream(source=io.BytesIO(self.document))
+		values = [record.findtext("value") for record in stream.records(tag="record")]
+		self.assertEqual(values, ["0", "1", "2", "3", "4"])
+		self.assertEqual(stream.root.get("id"), "1")
+
+	def test_records_cleared(self):
+		stream = XMLStream(source=self.document)
+		preceding = [len(list(record.itersiblings(preceding=True))) for record in stream.records(tag="record")]
+		self.assertEqual(preceding, [1, 1, 1, 1, 1])
+		self.assertEqual(len(stream.root), 1)
+
+	def test_root_without_records(self):
+		stream = XMLStream(source=self.document)
+		self.assertEqual(list(stream.records(tag="missing")), [])
+		self.assertEqual(stream.root.tag, "batch")
+
+	def test_element_source(self):
+		element = etree.fromstring(self.document)
+		stream = XMLStream(source=element)
+		self.assertEqual(len(list(stream.records(tag="record"))), 5)
+		self.assertEqual(len(element), 6)
+		self.assertIs(stream.parse(), element)
+
+	def test_read_and_parse(self):
+		stream = XMLStream(source=io.BytesIO(self.document))
+		self.assertEqual(stream.read(), self.document)
+		self.assertEqual(etree.tostring(stream.parse()), self.document)
+
+	def test_pickle(self):
+		stream = pickle.loads(pickle.dumps(XMLStream(source=io.BytesIO(self.document))))
+		self.assertEqual(stream.read(), self.document)
+
+	def test_event_data(self):
+		stream = XMLStream(source=io.BytesIO(self.document))
+		event = XMLEvent(data=stream)
+		self.assertIs(event.data_stream, stream)
+		self.assertEqual(event.data_string, self.document)
+		self.assertEqual(event.data.tag, "batch")
+		self.assertIsNot(event.data_stream, stream)
+
+	def test_event_string_streamed(self):
+		event = XMLEvent(data=self.document)
+		stream = event.data_stream
+		self.assertIs(stream.source, self.document)
+		self.assertEqual([record.findtext("value") for record in stream.records(tag="record")], ["0", "1", "2", "3", "4"])
+		self.assertIsNone(event._data.cached(XMLType))
+		event.data.append(etree.Element("tail"))
+		self.assertIsInstance(event.data_stream.source, etree._Element)
+
+	def test_event_conversion(self):
+		event = JSONEvent(data=XMLStream(source="<root><key>value</key></root>"))
+		self.assertEqual(event.data, {"root": {"key": "value"}})
+
+	def test_codec(self):
+		codec = EventCodec()
+		event = codec.decode(codec.encode(XMLEvent(data=XMLStream(source=io.BytesIO(self.document)))))
+		self.assertEqual(event.data_string, self.document)
@@ -0,0 +1,73 @@
+from pypes.testutils import BaseUnitTest
+from pypes.util.xmljson import XMLJSONConverter
+from pypes.globals.event import get_event_manager
+from pypes.event import XMLEvent, JSONEvent
+from lxml import etree
+import collections
+import json
+
+class TestXMLJSONConverter(BaseUnitTest):
+
+	def setUp(self):
+		self.converter = XMLJSONConverter()
+
+	def to_json(self, xml):
+		return json.loads(json.dumps(self.converter.to_json(data=etree.fromstring(xml))))
+
+	def to_xml(self, data):
+		return etree.tostring(self.converter.to_xml(data=data))
+
+	def test_single_root(self):
+		self.assertEqual(self.to_json("<foo>bar</foo>"), {"foo": "bar"})
+
+	def test_nested(self):
+		self.assertEqual(self.to_json("<root><foo><bar>value</bar></foo><fubar>barfu</fubar></root>"), {"root": {"foo": {"bar": "value"}, "fubar": "barfu"}})
+
+	def test_repeated_elements(self):
+		self.assertEqual(self.to_json("<root><foo>bar</foo><foo/></root>"), {"root": {"foo": ["bar", None]}})
+
+	def test_attributes_and_text(self):
+		self.assertEqual(self.to_json('<root a="1">text<child/>tail</root>'), {"root": {"@a": "1", "child": None, "#text": "texttail"}})
+
+	def test_document_order(self):
+		self.assertEqual(self.converter.to_json(data=etree.fromstring("<r><b/><a/><c/></r>"))["r"].keys(), ["b", "a", "c"])
+
+	def test_namespaces(self):
+		data = self.to_json('<a:root xmlns:a="urn:a"><a:child a:key="1">v</a:child></a:root>')
+		self.assertEqual(data, {"a:root": {"@xmlns:a": "urn:a", "a:child": {"@a:key": "1", "#text": "v"}}})
+		self.assertEqual(self.to_xml(data), '<a:root xmlns:a="urn:a"><a:child a:key="1">v</a:child></a:root>')
+
+	def test_json_types(self):
+		data = self.to_json('<r><l pypes_json_type="list">1</l><e pypes_json_type="list"/><s pypes_json_type="string"><a>1</a></s><d pypes_json_type="dict"/><n pypes_json_type="null">x</n></r>')
+		self.assertEqual(data, {"r": {"l": ["1"], "e": [], "s": '{"a": "1"}', "d": {}, "n": None}})
+
+	def test_json_type_repeated_list(self):
+		self.assertEqual(self.to_json('<r><m pypes_json_type="list">1</m><m pypes_json_type="list">2</m></r>'), {"r": {"m": ["1", "2"]}})
+
+	def test_to_xml_values(self):
+		value = collections.OrderedDict([("@a", 1), ("b", True), ("c", None), ("d", 2.5), ("#text", "t")])
+		self.assertEqual(self.to_xml({"root": value}), '<root a="1"><b>true</b><c/><d>2.5</d>t</root>')
+
+	def test_wrapper(self):
+		self.assertEqual(self.to_xml({"a": "1", "b": "2"}), "<pypes_conversion_wrapper><a>1</a><b>2</b></pypes_conversion_wrapper>")
+		self.assertEqual(self.to_json("<pypes_conversion_wrapper><a>1</a><b>2</b></pypes_conversion_wrapper>"), {"a": "1", "b": "2"})
+
+	def test_wrapper_roundtrip(self):
+		for data in ({}, {"k": ["1", "2"]}, ["1", {"x": "2"}]):
+			self.assertEqual(json.loads(json.dumps(self.converter.to_json(data=self.converter.to_xml(data=data)))), data)
+
+	def test_empty_lists(self):
+		self.assertEqual(self.to_xml({"k": []}), "<pypes_conversion_wrapper/>")
+		self.assertEqual(self.to_xml({"a": {"k": [], "b": "1"}}), "<a><b>1</b></a>")
+		self.assertEqual(self.to_xml([]), '<pypes_conversion_wrapper pypes_json_type="list"/>')
+		self.assertEqual(self.converter.to_json(data=self.converter.to_xml(data=[])), [])
+
+	def test_undeclared_prefix(self):
+		with self.assertRaises(ValueError):
+			self.converter.to_xml(data={"a:root": "value"})
+
+	def test_event_conversion(self):
+		event = XMLEvent(data="<root><foo>bar</foo><foo>bar</foo></root>")
+		converted = get_event_manager().convert(event=event, convert_to=JSONEvent)
+		self.assertEqual(converted.data, {"root": {"foo": ["bar", "bar"]}})
+		self.assertEqual(get_event_manager().convert(event=converted, convert_to=XMLEvent).data_string, "<root><foo>bar</foo><foo>bar</foo></root>")